@@ -5,7 +5,7 @@ import json
 import logging
 from typing import Any, Dict, List, Optional
 
-from app.services.nl_to_sql import _call_gemini_text
+from app.services.nl_to_sql import _acall_gemini_text, _call_gemini_text
 from app.state.agent_state import AgentState
 
 logger = logging.getLogger("db_assistant.eda_agent")
@@ -116,54 +116,70 @@ class EDAAgent:
     """
 
     def run(self, state: AgentState) -> AgentState:
+        try:
+            profile_prompt = self._prompt(state)
+            if profile_prompt is None:
+                return state
+            raw = _call_gemini_text(SYSTEM_PROMPT, profile_prompt, label="eda")
+            self._apply(state, raw)
+        except Exception as e:
+            logger.warning("EDAAgent: Gemini call failed (%s), keeping existing summary", e)
+            # Non-fatal — profiling data still available in state.profile
+        return state
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """run() for the async pipeline — the Gemini call is awaited."""
+        try:
+            profile_prompt = self._prompt(state)
+            if profile_prompt is None:
+                return state
+            raw = await _acall_gemini_text(SYSTEM_PROMPT, profile_prompt, label="eda")
+            self._apply(state, raw)
+        except Exception as e:
+            logger.warning("EDAAgent: Gemini call failed (%s), keeping existing summary", e)
+        return state
+
+    def _prompt(self, state: AgentState) -> Optional[str]:
         profile = getattr(state, "profile", None)
 
         if not profile or not profile.get("columns"):
             logger.info("EDAAgent: no profile data, skipping")
-            return state
+            return None
 
         rows = getattr(state, "results", None) or []
         row_count = len(rows)
 
         if row_count == 0:
-            return state
-
-        try:
-            profile_prompt = _build_profile_prompt(
-                profile,
-                state.user_question,
-                row_count,
-            )
-
-            raw = _call_gemini_text(SYSTEM_PROMPT, profile_prompt)
-
-            # Strip markdown fences if present
-            clean = raw.strip()
-            if clean.startswith("```"):
-                clean = clean.split("\n", 1)[-1]
-                clean = clean.rsplit("```", 1)[0]
-            clean = clean.strip()
-
-            insights = json.loads(clean)
-
-            # Store structured insights in state
-            state.eda_insights = insights
-
-            # Also update summary with headline + findings for Charts tab
-            headline = insights.get("headline", "")
-            findings = insights.get("key_findings", [])
-            if headline:
-                summary_parts = [headline]
-                summary_parts.extend(findings[:3])
-                state.summary = " | ".join(summary_parts)
-
-            logger.info(
-                "EDAAgent: generated insights — headline: %s",
-                headline[:60] if headline else "none",
-            )
-
-        except Exception as e:
-            logger.warning("EDAAgent: Gemini call failed (%s), keeping existing summary", e)
-            # Non-fatal — profiling data still available in state.profile
-
-        return state
\ No newline at end of file
+            return None
+
+        return _build_profile_prompt(
+            profile,
+            state.user_question,
+            row_count,
+        )
+
+    def _apply(self, state: AgentState, raw: str) -> None:
+        # Strip markdown fences if present
+        clean = raw.strip()
+        if clean.startswith("```"):
+            clean = clean.split("\n", 1)[-1]
+            clean = clean.rsplit("```", 1)[0]
+        clean = clean.strip()
+
+        insights = json.loads(clean)
+
+        # Store structured insights in state
+        state.eda_insights = insights
+
+        # Also update summary with headline + findings for Charts tab
+        headline = insights.get("headline", "")
+        findings = insights.get("key_findings", [])
+        if headline:
+            summary_parts = [headline]
+            summary_parts.extend(findings[:3])
+            state.summary = " | ".join(summary_parts)
+
+        logger.info(
+            "EDAAgent: generated insights — headline: %s",
+            headline[:60] if headline else "none",
+        )
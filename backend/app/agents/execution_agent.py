@@ -6,6 +6,8 @@ import time
 from typing import Optional
 
 from app.db import get_conn
+from app.services.result_cache import result_cache
+from app.services.result_fetch import fetch_capped
 from app.core.sql_guard import SQLGuard, SQLGuardError
 
 
@@ -16,6 +18,9 @@ class ExecutionAgent:
     Supports a special placeholder in SQL:
       - "{table}" will be replaced with the real fully-qualified table name
         for the FIRST selected dataset (looked up from dataset_registry).
+
+    Results are served from services/result_cache while the dataset tables
+    are unchanged; the upload / delete routes invalidate them.
     """
 
     def _resolve_table_fqn(self, user_id: str, dataset_id: str) -> Optional[str]:
@@ -148,12 +153,13 @@ class ExecutionAgent:
         t0 = time.time()
         conn = get_conn()
         try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                rows = cur.fetchall()
-                colnames = [d.name for d in cur.description] if cur.description else []
-
-            state.results = [dict(zip(colnames, row)) for row in rows]
+            cached = result_cache.lookup(conn, "internal", sql)
+            fetched = cached.fetched or fetch_capped(conn, sql)
+            result_cache.store(cached, fetched)
+            state.results = fetched.rows
+            state.columns = list(fetched.columns)
+            state.metrics["fetch"] = {**fetched.as_metrics(), "cache": cached.status}
+            state.metrics["result_cache"] = cached.as_metrics()
             state.execution_time_ms = int((time.time() - t0) * 1000)
 
         except Exception as e:
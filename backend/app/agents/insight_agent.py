@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import numbers
+from app.services.columnar import as_table
 from app.state.agent_state import AgentState
 
 
@@ -63,6 +64,7 @@ class InsightAgent:
         return state
 
     def _from_profile(self, rows, profile, total_rows) -> str:
+        table = as_table(rows)
         col_profiles = profile["columns"]
         numeric_cols = [p for p in col_profiles if p.get("type") == "numeric"]
         text_cols    = [p for p in col_profiles if p.get("type") == "text"]
@@ -81,8 +83,13 @@ class InsightAgent:
                 continue
 
             try:
-                top_row = max(rows, key=lambda r, c=col: float(r.get(c) or 0))
-                bot_row = min(rows, key=lambda r, c=col: float(r.get(c) or 0))
+                arr = table.numeric(col)
+                if arr is not None:
+                    top_row = table[int(arr.argmax())]
+                    bot_row = table[int(arr.argmin())]
+                else:
+                    top_row = max(table, key=lambda r, c=col: float(r.get(c) or 0))
+                    bot_row = min(table, key=lambda r, c=col: float(r.get(c) or 0))
                 top_label = _label_for_row(top_row, col)
                 bot_label = _label_for_row(bot_row, col)
 
@@ -3,17 +3,13 @@
 from __future__ import annotations
 
 import re
-from itertools import combinations
 from typing import Dict, List
 
-from app.services.nl_to_sql import generate_sql
+from app.services.join_graph import JoinGraph
+from app.services.nl_to_sql import agenerate_sql, generate_sql
 from app.state.agent_state import AgentState
 
 
-def _norm(s: str) -> str:
-    return (s or "").strip().lower()
-
-
 def _has_limit(sql: str) -> bool:
     """
     Robust LIMIT detection:
@@ -48,36 +44,18 @@ def _remove_trailing_limit(sql: str) -> str:
 
 def _common_join_hints(tables: Dict[str, dict]) -> List[str]:
     """
-    Heuristic join hints:
-    - finds common column names across tables, prioritizing *_id
+    Join hints between the selected datasets, from the join graph
+    (key-like shared columns, <x>_id → x.id) along the shortest join paths.
     Returns hint strings like:
-      T1."customer_id" = T2."customer_id"
+      T1."customer_id" = T3."customer_id"
     """
-    cols_map: Dict[str, Dict[str, str]] = {}
-    for dsid, info in tables.items():
-        cols = info.get("columns", []) or []
-        d = {}
-        for c in cols:
-            name = c.get("name") or c.get("column_name") or ""
-            if name:
-                d[_norm(name)] = name
-        cols_map[dsid] = d
+    labels = {dsid: f"T{i}" for i, dsid in enumerate(tables, start=1)}
+    graph = JoinGraph.build({dsid: info.get("columns", []) or [] for dsid, info in tables.items()})
 
     hints: List[str] = []
-    dsids = list(tables.keys())
-
-    for a, b in combinations(dsids, 2):
-        common = set(cols_map[a].keys()) & set(cols_map[b].keys())
-        key_like = [c for c in common if c.endswith("_id")]
-
-        # Prefer *_id joins; otherwise take one shared column if any
-        chosen = sorted(key_like)[:2] if key_like else (sorted(list(common))[:1] if common else [])
-
-        for c in chosen:
-            ca = cols_map[a][c]
-            cb = cols_map[b][c]
-            hints.append(f'T1."{ca}" = T2."{cb}"')
-
+    for e in graph.paths_between(tables):
+        for ca, cb in zip(e.left_cols, e.right_cols):
+            hints.append(f'{labels[e.left]}."{ca}" = {labels[e.right]}."{cb}"')
     return hints
 
 
@@ -163,7 +141,19 @@ class NLToSQLAgent:
 
         # Call your repo's Gemini SQL generator
         sql = generate_sql(schema_prompt=schema_prompt, user_question=user_question)
+        return self._finish(state, sql)
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """run() for the async pipeline — the Gemini call is awaited."""
+        user_question = getattr(state, "user_question", None)
+        if not user_question:
+            raise ValueError("Missing user_question in AgentState")
+
+        schema_prompt = _build_multi_table_schema_prompt(state)
+        sql = await agenerate_sql(schema_prompt=schema_prompt, user_question=user_question)
+        return self._finish(state, sql)
 
+    def _finish(self, state: AgentState, sql: str) -> AgentState:
         # Clean up any accidental double LIMIT at end (best effort)
         sql = _remove_trailing_limit(sql)
 
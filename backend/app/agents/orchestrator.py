@@ -1,6 +1,8 @@
 # backend/app/agents/orchestrator.py
 from __future__ import annotations
+import asyncio
 import logging
+from typing import Any, AsyncIterator, Iterator, Tuple
 from app.state.agent_state import AgentState
 
 # PostgreSQL pipeline agents
@@ -40,6 +42,12 @@ class Orchestrator:
       1. run_pg_query()      — PostgreSQL NL query via pg_uri
       2. run_mongo_query()   — MongoDB NL query via mongo_uri
       3. run_dataset_query() — Uploaded dataset query via dataset_registry
+
+    arun_pg_query() / arun_dataset_query() / arun_post_processing() are the
+    same pipelines for async routes: Gemini calls go through llm.agenerate and
+    pg_uri queries through asyncpg, so a request waiting on I/O holds no
+    thread. Steps still on psycopg2 (system DB, schema introspection on a
+    cache miss) run in worker threads.
     """
 
     def __init__(self):
@@ -72,7 +80,7 @@ class Orchestrator:
     def run_pg_query(self, state: AgentState) -> AgentState:
         """
         Full agentic PostgreSQL query pipeline:
-        SchemaAgent → NLToSQLAgent → SafetyAgent → ExecutionAgent
+        SchemaAgent → SchemaRetrievalAgent → NLToSQLAgent → SafetyAgent → ExecutionAgent
         → InsightAgent → VisualizationAgent
         """
         logger.info("Orchestrator: starting PostgreSQL pipeline for: %s", state.user_question)
@@ -105,6 +113,30 @@ class Orchestrator:
         )
         return state
 
+    async def arun_pg_query(self, state: AgentState) -> AgentState:
+        """run_pg_query() for async routes."""
+        state = await self.arun_pg_execution(state)
+        if state.execution_error:
+            return state
+
+        state = await self.arun_post_processing(state)
+
+        logger.info(
+            "Orchestrator: PostgreSQL pipeline complete — %d rows, %dms",
+            len(state.results), state.execution_time_ms or 0
+        )
+        return state
+
+    async def arun_pg_execution(self, state: AgentState) -> AgentState:
+        """arun_pg_query() up to executed results — streaming routes post-process themselves."""
+        logger.info("Orchestrator: starting async PostgreSQL pipeline for: %s", state.user_question)
+
+        state = await self.pg_schema_agent.arun(state)
+        if state.execution_error:
+            return state
+
+        return await self.react_agent.arun(state)
+
     # ──────────────────────────────────────────────────────────
     # Pipeline 2: MongoDB NL Query (single collection)
     # ──────────────────────────────────────────────────────────
@@ -183,6 +215,29 @@ class Orchestrator:
 
         return state
 
+    async def arun_dataset_query(self, state: AgentState) -> AgentState:
+        """run_dataset_query() for async routes."""
+        logger.info("Orchestrator: starting async dataset pipeline for: %s", state.user_question)
+
+        # Schema and execution read the system DB (psycopg2 pool)
+        state = await asyncio.to_thread(self.schema_agent.run, state)
+        if state.execution_error:
+            return state
+
+        state = await self.nl_to_sql_agent.arun(state)
+        if state.execution_error:
+            return state
+
+        state = self.safety_agent.run(state)
+        if state.execution_error:
+            return state
+
+        state = await asyncio.to_thread(self.execution_agent.run, state)
+        if state.execution_error:
+            return state
+
+        return await self.arun_post_processing(state)
+
     def run_dataset_query_attempt(self, state: AgentState) -> AgentState:
         """Single NLToSQL + Safety + Execution attempt — used by the ReAct loop
         in the dataset endpoint. Schema must already be loaded in state."""
@@ -207,4 +262,46 @@ class Orchestrator:
         state = self.eda_agent.run(state)
         state = self.insight_agent.run(state)
         state = self.visualization_agent.run(state)
-        return state
\ No newline at end of file
+        return state
+
+    async def arun_post_processing(self, state: AgentState) -> AgentState:
+        """
+        run_post_processing() for async routes. EDAAgent awaits Gemini; the
+        CPU-bound local agents run in a worker thread so the event loop
+        keeps serving other requests.
+        """
+        state = await asyncio.to_thread(self.profiling_agent.run, state)
+        state = await self.eda_agent.arun(state)
+        state = await asyncio.to_thread(self.insight_agent.run, state)
+        state = await asyncio.to_thread(self.visualization_agent.run, state)
+        return state
+
+    def iter_post_processing(self, state: AgentState) -> Iterator[Tuple[str, Any]]:
+        """
+        run_post_processing() for streaming routes: yields (field, value) as
+        each artifact is ready. The local agents run first so profile,
+        summary and viz do not wait on the EDAAgent's Gemini call.
+        """
+        state = self.profiling_agent.run(state)
+        yield "profile", state.profile
+        state = self.insight_agent.run(state)
+        yield "summary", state.summary
+        state = self.visualization_agent.run(state)
+        yield "viz", state.viz
+        summary = state.summary
+        state = self.eda_agent.run(state)
+        state.summary = summary   # InsightAgent's summary wins, as in run_post_processing()
+        yield "eda_insights", state.eda_insights
+
+    async def aiter_post_processing(self, state: AgentState) -> AsyncIterator[Tuple[str, Any]]:
+        """iter_post_processing() for async routes (local agents in a worker thread)."""
+        state = await asyncio.to_thread(self.profiling_agent.run, state)
+        yield "profile", state.profile
+        state = await asyncio.to_thread(self.insight_agent.run, state)
+        yield "summary", state.summary
+        state = await asyncio.to_thread(self.visualization_agent.run, state)
+        yield "viz", state.viz
+        summary = state.summary
+        state = await self.eda_agent.arun(state)
+        state.summary = summary   # InsightAgent's summary wins, as in run_post_processing()
+        yield "eda_insights", state.eda_insights
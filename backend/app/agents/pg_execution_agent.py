@@ -1,14 +1,22 @@
 # backend/app/agents/pg_execution_agent.py
 from __future__ import annotations
 
+import asyncio
 import logging
 import re
 import time
+from typing import Optional
 
+import asyncpg
 import psycopg2
 import psycopg2.extras
 from fastapi import HTTPException
 
+from app.core.pg_pool import dsn_key
+from app.db import get_uri_aconn, get_uri_conn
+from app.services.result_cache import result_cache
+from app.services.result_fetch import FetchResult, afetch_capped, fetch_capped
+from app.services.sql_validator import sql_error
 from app.state.agent_state import AgentState
 
 logger = logging.getLogger("db_assistant.pg_execution_agent")
@@ -16,10 +24,7 @@ logger = logging.getLogger("db_assistant.pg_execution_agent")
 
 def _get_conn(pg_uri: str):
     try:
-        return psycopg2.connect(
-            pg_uri, connect_timeout=8,
-            cursor_factory=psycopg2.extras.RealDictCursor
-        )
+        return get_uri_conn(pg_uri, cursor_factory=psycopg2.extras.RealDictCursor)
     except Exception as exc:
         raise HTTPException(503, detail=f"Cannot connect to PostgreSQL: {exc}")
 
@@ -30,10 +35,66 @@ class PgExecutionAgent:
 
     Reads from:  state.pg_uri, state.generated_sql, state.safety_passed
     Writes to:   state.results, state.columns, state.tables_used,
-                 state.execution_time_ms, state.execution_error
+                 state.execution_time_ms, state.execution_error,
+                 state.metrics["fetch"] — {rows, bytes, batches, truncated, reason, cache},
+                 state.metrics["result_cache"] — {status, tables, reason}
+
+    Rows are read through a server-side cursor within RESULT_MAX_ROWS /
+    RESULT_MAX_BYTES (services/result_fetch). A result cached for the same
+    normalized SQL and unchanged table data versions is served without
+    running the SQL (services/result_cache).
     """
 
     def run(self, state: AgentState) -> AgentState:
+        sql = self._precheck(state)
+        if sql is None:
+            return state
+
+        conn = _get_conn(state.pg_uri)
+        try:
+            t0 = time.time()
+            cached = result_cache.lookup(conn, dsn_key(state.pg_uri), sql)
+            fetched = cached.fetched or fetch_capped(conn, sql)
+            result_cache.store(cached, fetched)
+            self._finish(state, sql, fetched, t0, cached.status)
+            state.metrics["result_cache"] = cached.as_metrics()
+
+        except Exception as e:
+            logger.error("PgExecutionAgent SQL failed:\n%s\n%s", sql, str(e))
+            state.sql_error = sql_error(e)
+            state.execution_error = f"Query execution failed: {e}\nSQL was: {sql[:400]}"
+        finally:
+            conn.close()
+
+        return state
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """run() for the async pipeline — executes on the asyncpg pool for state.pg_uri."""
+        sql = self._precheck(state)
+        if sql is None:
+            return state
+
+        try:
+            async with get_uri_aconn(state.pg_uri) as conn:
+                t0 = time.time()
+                cached = await result_cache.alookup(conn, dsn_key(state.pg_uri), sql)
+                fetched = cached.fetched or await afetch_capped(conn, sql)
+
+            result_cache.store(cached, fetched)
+            self._finish(state, sql, fetched, t0, cached.status)
+            state.metrics["result_cache"] = cached.as_metrics()
+
+        except (OSError, asyncio.TimeoutError, asyncpg.InterfaceError) as exc:
+            raise HTTPException(503, detail=f"Cannot connect to PostgreSQL: {exc}")
+        except Exception as e:
+            logger.error("PgExecutionAgent SQL failed:\n%s\n%s", sql, str(e))
+            state.sql_error = sql_error(e)
+            state.execution_error = f"Query execution failed: {e}\nSQL was: {sql[:400]}"
+
+        return state
+
+    def _precheck(self, state: AgentState) -> Optional[str]:
+        """SQL to execute, or None with state.execution_error set."""
         state.results = []
         state.columns = []
         state.execution_error = None
@@ -41,44 +102,35 @@ class PgExecutionAgent:
 
         if not state.safety_passed:
             state.execution_error = "ExecutionAgent: SQL did not pass safety check — not executing."
-            return state
+            return None
 
         sql = state.generated_sql
         if not sql:
             state.execution_error = "ExecutionAgent: No SQL to execute."
-            return state
+            return None
 
         if not state.pg_uri:
             state.execution_error = "ExecutionAgent: pg_uri is missing."
-            return state
-
-        conn = _get_conn(state.pg_uri)
-        try:
-            t0 = time.time()
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                raw = cur.fetchall()
-                cols = [d.name for d in cur.description] if cur.description else []
-
-            state.results = [dict(r) for r in raw]
-            state.columns = cols
-            state.execution_time_ms = int((time.time() - t0) * 1000)
-
-            # Detect which tables were actually used
-            state.tables_used = [
-                fqn for fqn in state.tables_schema
-                if fqn.split(".")[-1].lower() in sql.lower()
-            ]
-
-            logger.info(
-                "PgExecutionAgent: %d rows in %dms, tables: %s",
-                len(raw), state.execution_time_ms, state.tables_used
-            )
-
-        except Exception as e:
-            logger.error("PgExecutionAgent SQL failed:\n%s\n%s", sql, str(e))
-            state.execution_error = f"Query execution failed: {e}\nSQL was: {sql[:400]}"
-        finally:
-            conn.close()
-
-        return state
\ No newline at end of file
+            return None
+        return sql
+
+    def _finish(self, state: AgentState, sql: str, fetched: FetchResult, t0: float,
+                cache: str = "bypass") -> None:
+        state.results = fetched.rows
+        state.columns = list(fetched.columns)
+        state.execution_time_ms = int((time.time() - t0) * 1000)
+        state.metrics["fetch"] = {**fetched.as_metrics(), "cache": cache}
+        if fetched.truncated:
+            logger.warning("PgExecutionAgent: result truncated at %d rows / %d bytes (%s)",
+                           len(fetched.rows), fetched.bytes, fetched.truncated)
+
+        # Detect which tables were actually used
+        state.tables_used = [
+            fqn for fqn in state.tables_schema
+            if fqn.split(".")[-1].lower() in sql.lower()
+        ]
+
+        logger.info(
+            "PgExecutionAgent: %d rows in %dms (cache %s), tables: %s",
+            len(fetched.rows), state.execution_time_ms, cache, state.tables_used
+        )
@@ -1,38 +1,106 @@
 # backend/app/agents/pg_nl_to_sql_agent.py
 from __future__ import annotations
 import logging
-from app.services.nl_to_sql import generate_sql
+from typing import List, Optional, Tuple
+from app.services.nl_to_sql import agenerate_sql, generate_sql
+from app.services.schema_retrieval import SCHEMA_PROMPT_MAX_TOKENS, estimate_tokens
+from app.services.sql_repair import from_items
+from app.services.value_index import VALUE_LINKING
 from app.state.agent_state import AgentState
 logger = logging.getLogger("db_assistant.pg_nl_to_sql_agent")
 
 
-def _build_schema_prompt(state: AgentState) -> str:
+def _prompt_tables(state: AgentState) -> List[str]:
+    """Retrieved tables (most relevant first) or the whole schema."""
+    names = state.relevant_tables or list(state.tables_schema)
+    return [fqn for fqn in names if fqn in state.tables_schema]
+
+
+def _retry_tables(state: AgentState) -> List[str]:
+    """
+    Schema slice for a retry: the tables the failed SQL referenced plus their
+    foreign-key neighbours (declared, or inferred key joins in the join graph).
+    Empty when the SQL referenced no known table — the full prompt is used.
+    """
+    sql = (state.retry_feedback or {}).get("sql") or ""
+    used = list(dict.fromkeys(fqn for fqn, _ in from_items(sql, state.tables_schema)))
+    neighbours: List[str] = []
+    for fqn in used:
+        if state.join_graph is not None:
+            neighbours += [t for t, e in state.join_graph.adj.get(fqn, {}).items()
+                           if e.kind in ("fk", "key")]
+        else:
+            neighbours += [fk["ref_table"] for fk in state.foreign_keys if fk["table"] == fqn]
+            neighbours += [fk["table"] for fk in state.foreign_keys if fk["ref_table"] == fqn]
+    return [t for t in dict.fromkeys(used + neighbours) if t in state.tables_schema]
+
+
+def _build_schema_prompt(state: AgentState,
+                         names: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+    """Schema text within SCHEMA_PROMPT_MAX_TOKENS, and the tables it covers."""
     prompt = "You have access to the following PostgreSQL tables:\n\n"
-    for fqn, cols in state.tables_schema.items():
-        prompt += f"Table: {fqn}\nColumns:\n"
-        for c in cols:
+    budget = SCHEMA_PROMPT_MAX_TOKENS
+    included: List[str] = []
+    for fqn in names or _prompt_tables(state):
+        block = f"Table: {fqn}\nColumns:\n"
+        for c in state.tables_schema[fqn]:
             col_line = f"  - {c['name']} ({c['pg_type']})"
-            # Add sample values if available — critical for non-English data
-            if c.get("sample_values"):
+            # Sample values (legacy) — with value linking, only the values the
+            # question refers to are sent, in the context block
+            if c.get("sample_values") and not VALUE_LINKING:
                 samples = [str(v) for v in c["sample_values"][:4]]
                 col_line += f"  [e.g. {', '.join(samples)}]"
-            prompt += col_line + "\n"
-        prompt += "\n"
-    return prompt
+            block += col_line + "\n"
+        block += "\n"
+        # Token cap — always keep the most relevant table
+        cost = estimate_tokens(block)
+        if included and cost > budget:
+            break
+        prompt += block
+        budget -= cost
+        included.append(fqn)
+    return prompt, included
+
 
+def _build_retry_block(state: AgentState) -> str:
+    """The failed attempt to correct — its SQL and the (structured) error only."""
+    fb = state.retry_feedback or {}
+    lines = ["[CORRECTION NEEDED] The previous SQL failed:", fb.get("sql") or "(no SQL)",
+             f"Error: {fb.get('error') or 'unknown'}"]
+    err = fb.get("sql_error") or {}
+    if err.get("kind"):
+        lines.append(f"Error kind: {err['kind']}" +
+                     (f" — {err['identifier']}" if err.get("identifier") else ""))
+    if fb.get("hint"):
+        lines.append(f"Fix: {fb['hint']}")
+    lines.append("Rewrite the SQL — use only the tables and columns listed in the schema.")
+    return "\n".join(lines)
 
-def _build_context_block(state: AgentState) -> str:
+
+def _build_context_block(state: AgentState, tables: List[str], retry: bool = False) -> str:
     blocks = []
 
     # JOIN hints
-    if state.join_hints:
+    join_hints = state.join_hints
+    if retry and state.join_graph is not None:
+        join_hints = state.join_graph.hints(tables=tables)
+    if join_hints:
         blocks.append("JOIN keys (use these when joining tables):\n" +
-                      "\n".join(state.join_hints))
+                      "\n".join(join_hints))
 
     # Enum values — CRITICAL for correct WHERE filters
-    if state.enum_values:
-        lines = [f"  - {key}: {', '.join(vals)}"
-                 for key, vals in state.enum_values.items()]
+    in_prompt = set(tables)
+    values = state.value_links if VALUE_LINKING else state.enum_values
+    lines = [f"  - {key}: {', '.join(vals)}"
+             for key, vals in values.items()
+             if key.rsplit(".", 1)[0] in in_prompt]
+    if lines and VALUE_LINKING:
+        blocks.append(
+            "CRITICAL — values mentioned in the question, as stored in the data "
+            "(use these exact strings in WHERE filters, never translate or re-case them):\n" +
+            "\n".join(lines)
+        )
+    elif lines:
         blocks.append(
             "CRITICAL — actual data values "
             "(use ONLY these exact strings in WHERE filters, never invent others):\n" +
@@ -60,44 +128,89 @@ def _build_context_block(state: AgentState) -> str:
 class PgNLToSQLAgent:
     """
     Agent 2 (PostgreSQL) — Natural Language to SQL.
-    Reads from:  state.tables_schema, state.enum_values,
-                 state.join_hints, state.user_question, state.limit
-    Writes to:   state.generated_sql
+    Reads from:  state.tables_schema, state.relevant_tables, state.value_links
+                 (state.enum_values with VALUE_LINKING=off), state.join_hints, state.user_question, state.limit
+    Writes to:   state.generated_sql, state.metrics["prompt"], state.metrics["prompts"]
+
+    With state.retry_feedback set (ReAct retry), the prompt carries only the
+    failed SQL, its error and the schema slice around the tables it used;
+    state.user_question itself is never modified.
     """
     def run(self, state: AgentState) -> AgentState:
+        prompt = self._prepare(state)
+        if prompt is None:
+            return state
+        try:
+            sql = generate_sql(*prompt, metrics=state.metrics, use_cache=state.use_sql_cache)
+            self._finish(state, sql)
+        except Exception as e:
+            state.execution_error = f"SQL generation failed: {e}"
+        return state
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """run() for the async pipeline — the Gemini call is awaited."""
+        prompt = self._prepare(state)
+        if prompt is None:
+            return state
+        try:
+            sql = await agenerate_sql(*prompt, metrics=state.metrics, use_cache=state.use_sql_cache)
+            self._finish(state, sql)
+        except Exception as e:
+            state.execution_error = f"SQL generation failed: {e}"
+        return state
+
+    def _prepare(self, state: AgentState) -> Optional[Tuple[str, str]]:
+        """(schema_prompt, question with context), or None with execution_error set."""
         if not state.user_question:
             state.execution_error = "PgNLToSQLAgent: user_question is missing."
-            return state
+            return None
         if not state.tables_schema:
             state.execution_error = "PgNLToSQLAgent: tables_schema is empty. Run PgSchemaAgent first."
-            return state
+            return None
 
-        schema_prompt = _build_schema_prompt(state)
-        context_block = _build_context_block(state)
-        full_question = f"{state.user_question}\n\n{context_block}"
+        sliced = _retry_tables(state) if state.retry_feedback else []
+        schema_prompt, tables = _build_schema_prompt(state, sliced)
+        context_block = _build_context_block(state, tables, retry=bool(sliced))
+        parts = [state.user_question]
+        if state.retry_feedback:
+            parts.append(_build_retry_block(state))
+        parts.append(context_block)
+        full_question = "\n\n".join(parts)
+        state.metrics["prompt"] = {
+            "attempt":    state.react_attempts,
+            "retry":      state.retry_feedback is not None,
+            "tables":     len(tables),
+            "truncated":  len(tables) < len(sliced or _prompt_tables(state)),
+            "chars":      len(schema_prompt) + len(full_question),
+            "tokens_est": estimate_tokens(schema_prompt) + estimate_tokens(full_question),
+        }
+        state.metrics.setdefault("prompts", []).append(state.metrics["prompt"])
+        return schema_prompt, full_question
 
-        try:
-            sql = generate_sql(schema_prompt, full_question)
-            sql = sql.strip().rstrip(";")
-            # Remove duplicate LIMIT clauses (e.g. LIMIT 1 LIMIT 200)
-            import re as _re
-            limit_matches = list(_re.finditer(r'\bLIMIT\s+\d+', sql, _re.IGNORECASE))
-            if len(limit_matches) > 1:
-                last_limit = limit_matches[-1]
-                for m in reversed(limit_matches[:-1]):
-                    sql = sql[:m.start()] + sql[m.end():]
-            # Fix alias mixing: if query uses AS T1/T2 aliases, replace benchmark_tmp.table.col with alias.col
-            alias_map = {}
-            for m in _re.finditer(r'benchmark_tmp\.\w+\s+AS\s+(\w+)', sql, _re.IGNORECASE):
-                tname = _re.search(r'benchmark_tmp\.(\w+)\s+AS', m.group(0), _re.IGNORECASE).group(1)
-                alias_map[tname.lower()] = m.group(1)
-            for tname, alias in alias_map.items():
-                sql = _re.sub(rf'benchmark_tmp\.{tname}\.', f'{alias}.', sql, flags=_re.IGNORECASE)
-            # Ensure LIMIT is present
-            if "limit" not in sql.lower():
-                sql += f" LIMIT {state.limit}"
-            state.generated_sql = sql
-            logger.info("PgNLToSQLAgent: SQL generated (%d chars)", len(sql))
-        except Exception as e:
-            state.execution_error = f"SQL generation failed: {e}"
-        return state
\ No newline at end of file
+    def _finish(self, state: AgentState, sql: str) -> None:
+        sql = self.clean_sql(sql, state.limit)
+        state.generated_sql = sql
+        logger.info("PgNLToSQLAgent: SQL generated (%d chars)", len(sql))
+
+    @staticmethod
+    def clean_sql(sql: str, limit: int) -> str:
+        """Post-process model SQL: single LIMIT, alias fixes, default LIMIT."""
+        sql = sql.strip().rstrip(";")
+        # Remove duplicate LIMIT clauses (e.g. LIMIT 1 LIMIT 200)
+        import re as _re
+        limit_matches = list(_re.finditer(r'\bLIMIT\s+\d+', sql, _re.IGNORECASE))
+        if len(limit_matches) > 1:
+            last_limit = limit_matches[-1]
+            for m in reversed(limit_matches[:-1]):
+                sql = sql[:m.start()] + sql[m.end():]
+        # Fix alias mixing: if query uses AS T1/T2 aliases, replace benchmark_tmp.table.col with alias.col
+        alias_map = {}
+        for m in _re.finditer(r'benchmark_tmp\.\w+\s+AS\s+(\w+)', sql, _re.IGNORECASE):
+            tname = _re.search(r'benchmark_tmp\.(\w+)\s+AS', m.group(0), _re.IGNORECASE).group(1)
+            alias_map[tname.lower()] = m.group(1)
+        for tname, alias in alias_map.items():
+            sql = _re.sub(rf'benchmark_tmp\.{tname}\.', f'{alias}.', sql, flags=_re.IGNORECASE)
+        # Ensure LIMIT is present
+        if "limit" not in sql.lower():
+            sql += f" LIMIT {limit}"
+        return sql
@@ -0,0 +1,121 @@
+# backend/app/agents/pg_repair_agent.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+from fastapi import HTTPException
+
+from app.agents.pg_execution_agent import _get_conn
+from app.agents.pg_safety_agent import PgSafetyAgent
+from app.db import get_uri_aconn
+from app.services.sql_repair import repair_sql
+from app.services.sql_validator import Validation, aexplain, explain
+from app.state.agent_state import AgentState
+
+logger = logging.getLogger("db_assistant.pg_repair_agent")
+
+SQL_REPAIR           = os.getenv("SQL_REPAIR", "1").lower() not in ("0", "false", "off", "no")
+SQL_REPAIR_MAX_STEPS = int(os.getenv("SQL_REPAIR_MAX_STEPS", "3"))
+
+
+class PgRepairAgent:
+    """
+    Agent 3c (PostgreSQL) — rule-based SQL repair (services/sql_repair).
+
+    Runs after a failed validation or execution: rewrites the SQL from the
+    structured error and the schema, re-validates each rewrite with EXPLAIN,
+    and only hands the error back to the LLM when no rule gets it to plan.
+
+    Reads from:  state.execution_error, state.sql_error, state.generated_sql,
+                 state.tables_schema, state.pg_uri, state.limit
+    Writes to:   state.generated_sql, state.safety_passed   (on success)
+                 state.execution_error, state.sql_error      (cleared on success)
+                 state.metrics["repair"] — {attempts, llm_calls_saved, rules}
+    """
+
+    def __init__(self):
+        self.safety_agent = PgSafetyAgent()
+
+    def run(self, state: AgentState) -> AgentState:
+        if not self._applies(state):
+            return state
+        rules: List[str] = []
+        sql = self._rewrite(state, state.generated_sql, state.sql_error, rules)
+        if sql is None:
+            return self._unrepaired(state, rules)
+        conn = _get_conn(state.pg_uri)
+        try:
+            for _ in range(SQL_REPAIR_MAX_STEPS):
+                v = explain(conn, sql, state.limit)
+                if v.ok:
+                    return self._repaired(state, v, rules)
+                sql = self._rewrite(state, sql, v.error, rules)
+                if sql is None:
+                    break
+        finally:
+            conn.close()
+        return self._unrepaired(state, rules)
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """run() for the async pipeline."""
+        if not self._applies(state):
+            return state
+        rules: List[str] = []
+        sql = self._rewrite(state, state.generated_sql, state.sql_error, rules)
+        if sql is None:
+            return self._unrepaired(state, rules)
+        try:
+            async with get_uri_aconn(state.pg_uri) as conn:
+                for _ in range(SQL_REPAIR_MAX_STEPS):
+                    v = await aexplain(conn, sql, state.limit)
+                    if v.ok:
+                        return self._repaired(state, v, rules)
+                    sql = self._rewrite(state, sql, v.error, rules)
+                    if sql is None:
+                        break
+        except (OSError, asyncio.TimeoutError, asyncpg.InterfaceError) as exc:
+            raise HTTPException(503, detail=f"Cannot connect to PostgreSQL: {exc}")
+        return self._unrepaired(state, rules)
+
+    def _applies(self, state: AgentState) -> bool:
+        return (SQL_REPAIR and bool(state.execution_error) and bool(state.sql_error)
+                and bool(state.generated_sql) and bool(state.pg_uri) and bool(state.tables_schema))
+
+    def _rewrite(self, state: AgentState, sql: str, err: Optional[Dict[str, Any]],
+                 rules: List[str]) -> Optional[str]:
+        """Next candidate SQL that passes the safety check, or None."""
+        fixed = repair_sql(sql, err, state.tables_schema)
+        if fixed is None:
+            return None
+        check = self.safety_agent.run(AgentState(generated_sql=fixed[0]))
+        if not check.safety_passed:
+            return None
+        rules.append(fixed[1])
+        return fixed[0]
+
+    def _metrics(self, state: AgentState) -> Dict[str, Any]:
+        return state.metrics.setdefault(
+            "repair", {"attempts": 0, "llm_calls_saved": 0, "rules": []})
+
+    def _repaired(self, state: AgentState, v: Validation, rules: List[str]) -> AgentState:
+        m = self._metrics(state)
+        m["attempts"] += 1
+        m["llm_calls_saved"] += 1
+        m["rules"].extend(rules)
+        logger.info("PgRepairAgent: repaired locally (%s)", ", ".join(rules))
+        state.generated_sql   = v.sql
+        state.safety_passed   = True
+        state.execution_error = None
+        state.sql_error       = None
+        state.metrics.setdefault("explain", []).append(v.as_metrics())
+        return state
+
+    def _unrepaired(self, state: AgentState, rules: List[str]) -> AgentState:
+        self._metrics(state)["attempts"] += 1
+        logger.info("PgRepairAgent: no local repair for %s (tried: %s)",
+                    state.sql_error.get("kind"), ", ".join(rules) or "none")
+        return state
@@ -1,19 +1,34 @@
 # backend/app/agents/pg_schema_agent.py
 from __future__ import annotations
 
+import asyncio
+import copy
 import logging
+import time
 from typing import Dict, List
 
 import psycopg2
 import psycopg2.extras
 from fastapi import HTTPException
 
+from app.core.pg_pool import dsn_key
+from app.db import get_uri_aconn, get_uri_conn
+from app.services.enum_discovery import discover_enum_values
+from app.services.join_graph import JoinGraph
+from app.services.pg_catalog import load_catalog, table_stats_of, tables_schema_of
+from app.services.schema_cache import (
+    SchemaSnapshot, aschema_fingerprint, schema_cache, schema_fingerprint,
+)
+from app.services.schema_retrieval import SchemaIndex
+from app.services.single_flight import SingleFlight
+from app.services.value_index import ValueIndex
 from app.state.agent_state import AgentState
 
 logger = logging.getLogger("db_assistant.pg_schema_agent")
 
-# Columns whose distinct values we fetch and inject into the prompt
-# so Gemini never guesses wrong filter values
+# Columns whose distinct values we always fetch and inject into the prompt
+# so Gemini never guesses wrong filter values (other low-cardinality columns
+# are detected from pg_stats by services/enum_discovery)
 ENUM_COLS = {
     "status", "tier", "region", "category", "subcategory",
     "payment_method", "method", "type", "country", "brand", "db_type",
@@ -23,58 +38,24 @@ ENUM_COLS = {
 
 def _get_conn(pg_uri: str):
     try:
-        return psycopg2.connect(
-            pg_uri, connect_timeout=8,
-            cursor_factory=psycopg2.extras.RealDictCursor
-        )
+        return get_uri_conn(pg_uri, cursor_factory=psycopg2.extras.RealDictCursor)
     except Exception as exc:
         raise HTTPException(503, detail=f"Cannot connect to PostgreSQL: {exc}")
 
 
+# Cap on schema-wide join hints; per-question paths come from state.join_graph
+JOIN_HINTS_MAX = 40
+
+# Concurrent cache misses for one database (pg_nl_query_multi's sub-questions,
+# parallel users after an invalidation) share one introspection
+_discoveries = SingleFlight()
+
 # Internal app tables that should never be exposed to Gemini
 _INTERNAL_TABLES = {
     "users", "user_connections", "user_api_keys", "query_audit_log",
     "user_uploads", "dataset_registry", "dataset_columns",
 }
 
-def _fetch_all_tables(conn) -> List[Dict]:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT t.table_schema, t.table_name
-            FROM information_schema.tables t
-            WHERE t.table_type='BASE TABLE'
-              AND t.table_schema NOT IN ('pg_catalog','information_schema','pg_toast')
-            ORDER BY t.table_schema, t.table_name
-        """)
-        return [
-            dict(r) for r in cur.fetchall()
-            if dict(r)["table_name"] not in _INTERNAL_TABLES
-        ]
-
-
-def _fetch_columns(conn, schema: str, table: str) -> List[Dict]:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT column_name, data_type
-            FROM information_schema.columns
-            WHERE table_schema=%s AND table_name=%s
-            ORDER BY ordinal_position
-        """, (schema, table))
-        return [{"name": dict(r)["column_name"], "pg_type": dict(r)["data_type"]}
-                for r in cur.fetchall()]
-
-
-def _fetch_enum_values(conn, fqn: str, col_name: str) -> List[str]:
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                f'SELECT DISTINCT "{col_name}" FROM {fqn} '
-                f'WHERE "{col_name}" IS NOT NULL LIMIT 20'
-            )
-            return [str(r[col_name]) for r in cur.fetchall() if r[col_name] is not None]
-    except Exception:
-        return []
-
 
 class PgSchemaAgent:
     """
@@ -83,7 +64,16 @@ class PgSchemaAgent:
     Reads from:  state.pg_uri
     Writes to:   state.tables_schema     — {fqn: [{name, pg_type}]}
                  state.enum_values        — {"fqn.col": ["val1","val2"]}
-                 state.join_hints         — ["t1 and t2 share: col1, col2"]
+                 state.join_hints         — ["  - t1.col = t2.col  (foreign key)"]
+                 state.join_graph         — JoinGraph for per-question join paths
+                 state.schema_index       — SchemaIndex for PgSchemaRetrievalAgent
+                 state.value_index        — ValueIndex (value → column) for value linking
+                 state.foreign_keys       — [{table, columns, ref_table, ref_columns}]
+                 state.table_stats        — {fqn: {approx_rows, primary_key, comment}}
+                 state.metrics["schema_cache"] — hit / miss, build time
+
+    Results are cached per database (see services/schema_cache); a hit
+    costs one fingerprint query instead of a full introspection.
     """
 
     def run(self, state: AgentState) -> AgentState:
@@ -91,54 +81,139 @@ class PgSchemaAgent:
             state.execution_error = "PgSchemaAgent: pg_uri is missing in state."
             return state
 
+        t0 = time.perf_counter()
         conn = _get_conn(state.pg_uri)
         try:
-            # 1. Discover all tables
-            all_tables = _fetch_all_tables(conn)
-            if not all_tables:
-                state.execution_error = "No tables found in this database."
+            # 0. Serve from cache while the catalog is unchanged
+            cache_key = dsn_key(state.pg_uri)
+            fingerprint = schema_fingerprint(conn)
+            snap = schema_cache.get(cache_key, fingerprint)
+            if snap is not None:
+                self._apply_snapshot(state, snap, t0)
                 return state
 
-            # 2. Fetch columns for each table
-            tables_schema: Dict[str, List[Dict]] = {}
-            for t in all_tables:
-                fqn = f"{t['table_schema']}.{t['table_name']}"
-                cols = _fetch_columns(conn, t["table_schema"], t["table_name"])
-                if cols:
-                    tables_schema[fqn] = cols
-            state.tables_schema = tables_schema
-
-            # 3. Fetch actual enum values for categorical columns
-            enum_values: Dict[str, List[str]] = {}
-            for fqn, cols in tables_schema.items():
-                for c in cols:
-                    if c["name"] in ENUM_COLS:
-                        vals = _fetch_enum_values(conn, fqn, c["name"])
-                        if vals:
-                            enum_values[f"{fqn}.{c['name']}"] = vals
-            state.enum_values = enum_values
-
-            # 4. Detect JOIN hints from shared column names
-            col_sets = {fqn: {c["name"] for c in cols}
-                        for fqn, cols in tables_schema.items()}
-            table_list = list(col_sets.keys())
-            join_hints = []
-            for i in range(len(table_list)):
-                for j in range(i + 1, len(table_list)):
-                    t1, t2 = table_list[i], table_list[j]
-                    common = col_sets[t1] & col_sets[t2] - {""}
-                    if common:
-                        join_hints.append(
-                            f"  - {t1} and {t2} share: {', '.join(sorted(common)[:5])}"
-                        )
-            state.join_hints = join_hints
-
-            logger.info(
-                "PgSchemaAgent: %d tables, %d enum columns, %d join hints",
-                len(tables_schema), len(enum_values), len(join_hints)
-            )
+            self._discover(conn, state, cache_key, fingerprint, t0)
+        finally:
+            conn.close()
+
+        return state
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """
+        run() for the async pipeline. The cache check (one fingerprint query)
+        is awaited on asyncpg; a miss runs the full psycopg2 introspection in
+        a worker thread, since it is rare and already bounded by the cache;
+        concurrent misses for the same database wait for one introspection.
+        """
+        if not state.pg_uri:
+            state.execution_error = "PgSchemaAgent: pg_uri is missing in state."
+            return state
+
+        t0 = time.perf_counter()
+        cache_key = dsn_key(state.pg_uri)
+        try:
+            async with get_uri_aconn(state.pg_uri) as conn:
+                fingerprint = await aschema_fingerprint(conn)
+        except Exception as exc:
+            raise HTTPException(503, detail=f"Cannot connect to PostgreSQL: {exc}")
+
+        snap = schema_cache.get(cache_key, fingerprint)
+        if snap is not None:
+            self._apply_snapshot(state, snap, t0)
+            return state
 
+        await asyncio.to_thread(self._discover_sync, state, cache_key, fingerprint, t0)
+        return state
+
+    def _apply_snapshot(self, state: AgentState, snap: SchemaSnapshot, t0: float) -> None:
+        # deep copies: agents may edit columns / value lists in place, and the
+        # snapshot is shared by every later request for this database
+        state.tables_schema = copy.deepcopy(snap.tables_schema)
+        state.enum_values   = copy.deepcopy(snap.enum_values)
+        state.join_hints    = list(snap.join_hints)
+        state.foreign_keys  = copy.deepcopy(snap.extra.get("foreign_keys", []))
+        state.table_stats   = copy.deepcopy(snap.extra.get("table_stats", {}))
+        state.join_graph    = snap.extra.get("join_graph")
+        state.schema_index  = snap.extra.get("schema_index")
+        state.value_index   = snap.extra.get("value_index")
+        state.metrics["schema_cache"] = {
+            "hit": True,
+            "ms":  int((time.perf_counter() - t0) * 1000),
+            "age_s": int(time.monotonic() - snap.built_at),
+        }
+        logger.info("PgSchemaAgent: cache hit — %d tables", len(snap.tables_schema))
+
+    def _discover_sync(self, state: AgentState, cache_key: str, fingerprint: str, t0: float) -> None:
+        _, shared = _discoveries.do(
+            cache_key, lambda: self._discover_on_new_conn(state, cache_key, fingerprint, t0))
+        if not shared:
+            return
+        snap = schema_cache.get(cache_key, fingerprint)
+        if snap is None:
+            # the leader found no tables or saw another catalog version
+            self._discover_on_new_conn(state, cache_key, fingerprint, t0)
+            return
+        self._apply_snapshot(state, snap, t0)
+        state.metrics["schema_cache"].update(hit=False, coalesced=True)
+
+    def _discover_on_new_conn(self, state: AgentState, cache_key: str, fingerprint: str,
+                              t0: float) -> None:
+        conn = _get_conn(state.pg_uri)
+        try:
+            self._discover(conn, state, cache_key, fingerprint, t0)
         finally:
             conn.close()
 
-        return state
\ No newline at end of file
+    def _discover(self, conn, state: AgentState, cache_key: str, fingerprint: str, t0: float) -> None:
+        """Full introspection on a psycopg2 connection; stores the snapshot in schema_cache."""
+        # 1-2. Tables, columns, keys and row estimates in one catalog pass
+        catalog = load_catalog(conn, exclude=_INTERNAL_TABLES)
+        if not catalog["tables"]:
+            state.execution_error = "No tables found in this database."
+            return
+
+        tables_schema: Dict[str, List[Dict]] = tables_schema_of(catalog)
+        state.tables_schema = tables_schema
+        state.foreign_keys  = catalog["foreign_keys"]
+        state.table_stats   = table_stats_of(catalog)
+
+        # 3. Categorical values — from pg_stats where possible, else sampled
+        enum_values, enum_metrics = discover_enum_values(
+            conn, state.pg_uri, tables_schema, state.table_stats, name_hints=ENUM_COLS,
+        )
+        state.enum_values = enum_values
+        state.metrics["enum_discovery"] = enum_metrics
+
+        # 4. JOIN hints from foreign keys + selective shared key columns
+        join_graph = JoinGraph.build(
+            tables_schema,
+            foreign_keys=state.foreign_keys,
+            primary_keys={fqn: st["primary_key"] for fqn, st in state.table_stats.items()},
+        )
+        join_hints = join_graph.hints(limit=JOIN_HINTS_MAX)
+        state.join_graph = join_graph
+        state.join_hints = join_hints
+
+        # 5. Retrieval indexes for per-question schema pruning / value linking
+        state.schema_index = SchemaIndex.build(tables_schema, state.table_stats, enum_values)
+        state.value_index  = ValueIndex.build(enum_values)
+
+        build_ms = int((time.perf_counter() - t0) * 1000)
+        schema_cache.put(cache_key, SchemaSnapshot(
+            fingerprint   = fingerprint,
+            tables_schema = copy.deepcopy(tables_schema),
+            enum_values   = copy.deepcopy(enum_values),
+            join_hints    = list(join_hints),
+            extra         = {"foreign_keys": copy.deepcopy(state.foreign_keys),
+                             "table_stats":  copy.deepcopy(state.table_stats),
+                             "join_graph":   join_graph,
+                             "schema_index": state.schema_index,
+                             "value_index":  state.value_index},
+            build_ms      = build_ms,
+        ))
+        state.metrics["schema_cache"] = {"hit": False, "ms": build_ms}
+
+        logger.info(
+            "PgSchemaAgent: %d tables, %d enum columns, %d join hints",
+            len(tables_schema), len(enum_values), len(join_hints)
+        )
@@ -0,0 +1,65 @@
+# backend/app/agents/pg_schema_retrieval_agent.py
+from __future__ import annotations
+import logging
+import time
+from app.services.schema_retrieval import SCHEMA_RETRIEVAL_TOP_K, SchemaIndex, select_tables
+from app.services.value_index import VALUE_LINKING, ValueIndex
+from app.state.agent_state import AgentState
+logger = logging.getLogger("db_assistant.pg_schema_retrieval_agent")
+
+
+class PgSchemaRetrievalAgent:
+    """
+    Agent 1b (PostgreSQL) — Question-relevant schema pruning + value linking.
+    Reads from:  state.tables_schema, state.schema_index, state.value_index,
+                 state.join_graph, state.user_question
+    Writes to:   state.value_links      — {"fqn.col": [values the question mentions]}
+                 state.relevant_tables  — tables for the prompt, most relevant first
+                 state.join_hints       — narrowed to joins between those tables
+                 state.metrics["value_linking"], state.metrics["schema_retrieval"]
+
+    Small schemas (≤ SCHEMA_RETRIEVAL_TOP_K tables) are passed through.
+    """
+    def run(self, state: AgentState) -> AgentState:
+        tables = list(state.tables_schema)
+        if not state.user_question:
+            return state
+
+        # 1. Link literals in the question to stored column values
+        if VALUE_LINKING:
+            t0 = time.perf_counter()
+            if state.value_index is None:
+                state.value_index = ValueIndex.build(state.enum_values, state.tables_schema)
+            state.value_links = state.value_index.link(state.user_question, tables=tables)
+            state.metrics["value_linking"] = {
+                "indexed_values": len(state.value_index),
+                "columns":        len(state.value_links),
+                "values":         sum(len(v) for v in state.value_links.values()),
+                "ms":             round((time.perf_counter() - t0) * 1000, 2),
+            }
+
+        # 2. Rank tables and expand along the join graph
+        t0 = time.perf_counter()
+        metrics = {"tables_total": len(tables), "pruned": False}
+        if len(tables) > SCHEMA_RETRIEVAL_TOP_K:
+            if state.schema_index is None:
+                state.schema_index = SchemaIndex.build(
+                    state.tables_schema, state.table_stats, state.enum_values)
+            linked_tables = [key.rsplit(".", 1)[0] for key in state.value_links]
+            selected, info = select_tables(
+                state.schema_index, state.user_question, tables, state.join_graph,
+                pinned=linked_tables)
+            metrics.update(info)
+            if selected:
+                state.relevant_tables = selected
+                metrics["pruned"] = True
+                if state.join_graph is not None:
+                    state.join_hints = state.join_graph.hints(tables=selected)
+
+        metrics["tables_selected"] = len(state.relevant_tables or tables)
+        metrics["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        state.metrics["schema_retrieval"] = metrics
+        logger.info("PgSchemaRetrievalAgent: %d/%d tables, %d linked values in %.1fms",
+                    metrics["tables_selected"], len(tables),
+                    sum(len(v) for v in state.value_links.values()), metrics["ms"])
+        return state
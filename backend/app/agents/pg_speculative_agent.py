@@ -0,0 +1,181 @@
+# backend/app/agents/pg_speculative_agent.py
+"""
+Speculative first attempt for the async ReAct loop.
+
+The serial loop pays one full Gemini round trip per failed attempt. With
+state.react_speculative = N (> 1), attempt 1 instead asks for N candidate
+SQLs concurrently (temperature variants of the same prompt) and races them:
+
+  candidate i:  generate → PgSafetyAgent → EXPLAIN (sql_validator) → execute
+                (through result_cache, like PgExecutionAgent)
+
+The first candidate that executes and returns rows wins; the others are
+cancelled, including their in-flight Gemini calls and queries. If every
+candidate executes but returns no rows, the first clean one wins (an empty
+answer can be correct). If none executes, their errors feed the regular
+ReAct retries.
+
+Candidate 0 uses the model's default temperature, so it shares its cache
+entry with the serial path; failed candidates are dropped from sql_cache.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.agents.pg_execution_agent import PgExecutionAgent
+from app.agents.pg_nl_to_sql_agent import PgNLToSQLAgent
+from app.agents.pg_safety_agent import PgSafetyAgent
+from app.core.pg_pool import dsn_key
+from app.db import get_uri_aconn
+from app.services.nl_to_sql import agenerate_sql
+from app.services.result_cache import result_cache
+from app.services.result_fetch import afetch_capped
+from app.services.sql_validator import SQL_EXPLAIN, aexplain, format_sql_error, sql_error
+from app.services.sql_cache import sql_cache
+from app.state.agent_state import AgentState
+
+logger = logging.getLogger("db_assistant.pg_speculative_agent")
+
+SPECULATIVE_MAX = int(os.getenv("SPECULATIVE_MAX", "4"))
+
+# Candidate i uses _TEMPERATURES[i] (the last value repeats); None = model default
+_TEMPERATURES: List[Optional[float]] = [None, 0.4, 0.8, 1.0]
+
+
+class PgSpeculativeAgent:
+    """
+    Reads from:  state.react_speculative, state.pg_uri, state.use_sql_cache,
+                 plus everything PgNLToSQLAgent reads
+    Writes to:   state.generated_sql, state.safety_passed, state.results, state.columns,
+                 state.execution_time_ms, state.tables_used, state.previous_sql_errors,
+                 state.sql_error, state.metrics["speculative"], state.metrics["sql_cache"],
+                 state.metrics["result_cache"], state.metrics["llm"]
+    """
+
+    def __init__(self, nl_to_sql_agent: PgNLToSQLAgent, safety_agent: PgSafetyAgent,
+                 execution_agent: PgExecutionAgent):
+        self.nl_to_sql_agent = nl_to_sql_agent
+        self.safety_agent    = safety_agent
+        self.execution_agent = execution_agent
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """state.safety_passed is True when a candidate won."""
+        state.safety_passed = False
+        n = max(2, min(state.react_speculative, SPECULATIVE_MAX))
+        prompt = self.nl_to_sql_agent._prepare(state)
+        if prompt is None:
+            return state
+
+        t0 = time.perf_counter()
+        cand_metrics: List[Dict[str, Any]] = [{} for _ in range(n)]
+        tasks = [asyncio.create_task(self._candidate(state, prompt, i, cand_metrics[i]))
+                 for i in range(n)]
+        finished: List[Dict[str, Any]] = []
+        winner: Optional[Dict[str, Any]] = None
+        try:
+            for fut in asyncio.as_completed(tasks):
+                cand = await fut
+                finished.append(cand)
+                if cand["error"] is None and cand["rows"]:
+                    winner = cand
+                    break
+        finally:
+            pending = [t for t in tasks if not t.done()]
+            for t in pending:
+                t.cancel()
+            # Let cancelled candidates release their pooled connections
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if winner is None:
+            winner = next((c for c in finished if c["error"] is None), None)
+
+        self._merge_metrics(state, cand_metrics, finished, winner)
+        state.metrics["speculative"] = {
+            "candidates": n,
+            "completed":  len(finished),
+            "failed":     sum(1 for c in finished if c["error"] is not None),
+            "cancelled":  len(pending),
+            "winner":     winner["index"] if winner else None,
+            "temperature": winner["temperature"] if winner else None,
+            "ms":         int((time.perf_counter() - t0) * 1000),
+        }
+
+        if winner is None:
+            for c in finished:
+                state.previous_sql_errors.append(c["error"])
+            state.sql_error = next((c["sql_error"] for c in finished if c["sql_error"]), None)
+            logger.warning("PgSpeculativeAgent: all %d candidates failed", n)
+            return state
+
+        state.generated_sql = winner["sql"]
+        state.safety_passed = True
+        state.execution_error = None
+        self.execution_agent._finish(state, winner["sql"], winner["fetched"], winner["t0"],
+                                     winner["cached"].status)
+        state.execution_time_ms = winner["ms"]
+        state.metrics["result_cache"] = winner["cached"].as_metrics()
+        logger.info("PgSpeculativeAgent: candidate %d of %d won (%d rows, %d cancelled)",
+                    winner["index"], n, len(winner["rows"]), len(pending))
+        return state
+
+    async def _candidate(self, state: AgentState, prompt: Tuple[str, str], index: int,
+                         metrics: Dict[str, Any]) -> Dict[str, Any]:
+        temperature = _TEMPERATURES[min(index, len(_TEMPERATURES) - 1)]
+        cand: Dict[str, Any] = {"index": index, "temperature": temperature, "sql": None,
+                                "rows": [], "fetched": None, "cached": None, "ms": 0, "t0": 0.0,
+                                "error": None, "sql_error": None}
+        try:
+            raw = await agenerate_sql(*prompt, metrics=metrics, use_cache=state.use_sql_cache,
+                                      temperature=temperature)
+        except Exception as e:
+            cand["error"] = f"SQL generation failed: {e}"
+            return cand
+
+        sql = PgNLToSQLAgent.clean_sql(raw, state.limit)
+        cand["sql"] = sql
+        check = self.safety_agent.run(AgentState(generated_sql=sql))
+        if not check.safety_passed:
+            cand["error"] = check.execution_error
+            return cand
+
+        try:
+            async with get_uri_aconn(state.pg_uri) as conn:
+                # Plan only — binding errors surface before any data is read
+                if SQL_EXPLAIN:
+                    v = await aexplain(conn, sql, state.limit)
+                    if not v.ok:
+                        cand["sql_error"] = v.error
+                        cand["error"] = (f"Validation failed: {format_sql_error(v.error)}\n"
+                                         f"SQL was: {sql[:400]}")
+                        return cand
+                    sql = cand["sql"] = v.sql
+                cand["t0"] = time.time()
+                cached = await result_cache.alookup(conn, dsn_key(state.pg_uri), sql)
+                cand["cached"] = cached
+                cand["fetched"] = cached.fetched or await afetch_capped(conn, sql)
+                cand["rows"] = cand["fetched"].rows
+                cand["ms"] = int((time.time() - cand["t0"]) * 1000)
+            result_cache.store(cached, cand["fetched"])
+        except Exception as e:
+            cand["sql_error"] = sql_error(e)
+            cand["error"] = f"Query execution failed: {e}\nSQL was: {sql[:400]}"
+        return cand
+
+    def _merge_metrics(self, state: AgentState, cand_metrics: List[Dict[str, Any]],
+                       finished: List[Dict[str, Any]], winner: Optional[Dict[str, Any]]) -> None:
+        llm = state.metrics.setdefault("llm", {"calls": 0, "retries": 0, "ms": 0,
+                                               "prompt_tokens": 0, "output_tokens": 0})
+        for m in cand_metrics:
+            for k, v in (m.get("llm") or {}).items():
+                llm[k] = llm.get(k, 0) + v
+
+        for c in finished:
+            cache = cand_metrics[c["index"]].get("sql_cache") or {}
+            if c["error"] is not None and c["sql"] and cache.get("key"):
+                sql_cache.invalidate(cache["key"])
+        if winner is not None:
+            state.metrics["sql_cache"] = cand_metrics[winner["index"]].get("sql_cache", {})
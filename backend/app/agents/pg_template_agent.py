@@ -0,0 +1,156 @@
+# backend/app/agents/pg_template_agent.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import asyncpg
+from fastapi import HTTPException
+
+from app.agents.pg_execution_agent import _get_conn
+from app.agents.pg_nl_to_sql_agent import PgNLToSQLAgent
+from app.agents.pg_safety_agent import PgSafetyAgent
+from app.db import get_conn, get_uri_aconn, is_system_uri
+from app.services.sql_templates import SQL_TEMPLATES, TemplateMatch, template_cache, template_scope
+from app.services.sql_validator import Validation, aexplain, explain
+from app.state.agent_state import AgentState
+
+logger = logging.getLogger("db_assistant.pg_template_agent")
+
+
+class PgTemplateAgent:
+    """
+    Agent 2a (PostgreSQL) — SQL template cache (services/sql_templates).
+
+    Before any LLM call: match the question against templates mined from
+    query history, fill the slots and validate the SQL with EXPLAIN. The
+    caller executes it and reports back with accept() / reject().
+
+    Reads from:  state.user_question, state.tables_schema, state.value_links,
+                 state.pg_uri, state.user_id, state.limit, state.use_sql_cache
+                 (templates are scoped to pg_uri + user_id)
+    Writes to:   state.generated_sql, state.safety_passed   (on a match)
+                 state.metrics["template"] — {hit, id, score, ms[, saved_ms, rejected, empty]}
+    """
+
+    def __init__(self):
+        self.safety_agent = PgSafetyAgent()
+
+    def run(self, state: AgentState) -> AgentState:
+        if not self._applies(state):
+            return state
+        self._ensure_loaded(state)
+        t0 = time.perf_counter()
+        m = self._match(state)
+        if m is None:
+            return self._miss(state, t0)
+        conn = _get_conn(state.pg_uri)
+        try:
+            v = explain(conn, m.sql, state.limit)
+        finally:
+            conn.close()
+        return self._apply(state, m, v, t0)
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """run() for the async pipeline (history is mined on a worker thread)."""
+        if not self._applies(state):
+            return state
+        if not template_cache.loaded(self._scope(state)):
+            await asyncio.to_thread(self._ensure_loaded, state)
+        t0 = time.perf_counter()
+        m = self._match(state)
+        if m is None:
+            return self._miss(state, t0)
+        try:
+            async with get_uri_aconn(state.pg_uri) as conn:
+                v = await aexplain(conn, m.sql, state.limit)
+        except (OSError, asyncio.TimeoutError, asyncpg.InterfaceError) as exc:
+            raise HTTPException(503, detail=f"Cannot connect to PostgreSQL: {exc}")
+        return self._apply(state, m, v, t0)
+
+    def accept(self, state: AgentState) -> None:
+        """The template's SQL executed and returned rows."""
+        info = state.metrics["template"]
+        info["saved_ms"] = template_cache.hit(info["id"])
+        logger.info("PgTemplateAgent: served template %s (~%dms of LLM time saved)",
+                    info["id"], info["saved_ms"])
+
+    def reject(self, state: AgentState) -> AgentState:
+        """
+        The template's SQL failed or returned nothing — reset for the LLM.
+
+        Only an execution error drops the template; an empty result can be a
+        correct answer, so the template stays and the LLM gets a second look.
+        """
+        info = state.metrics["template"]
+        if state.execution_error:
+            template_cache.reject(info["id"], self._scope(state))
+            info["rejected"] = True
+        else:
+            info["empty"] = True
+        info["hit"] = False
+        state.generated_sql   = None
+        state.safety_passed   = False
+        state.execution_error = None
+        state.sql_error       = None
+        state.results         = []
+        state.columns         = []
+        return state
+
+    def learn(self, state: AgentState) -> None:
+        """Remember a successful LLM answer as a template."""
+        if not SQL_TEMPLATES or not state.results or state.execution_error or not state.generated_sql:
+            return
+        if (state.metrics.get("template") or {}).get("hit"):
+            return
+        llm_ms = (state.metrics.get("llm") or {}).get("ms")
+        template_cache.learn(state.user_question, state.generated_sql, self._scope(state),
+                             state.tables_schema, llm_ms=llm_ms)
+
+    def _applies(self, state: AgentState) -> bool:
+        # use_sql_cache=False means "ask the model" — templates are a cache too
+        return (SQL_TEMPLATES and state.use_sql_cache and bool(state.user_question)
+                and bool(state.tables_schema) and bool(state.pg_uri))
+
+    @staticmethod
+    def _scope(state: AgentState) -> str:
+        return template_scope(state.pg_uri, state.user_id)
+
+    def _ensure_loaded(self, state: AgentState) -> None:
+        template_cache.ensure_loaded(get_conn, state.pg_uri, state.user_id, state.tables_schema,
+                                     system=is_system_uri(state.pg_uri))
+
+    def _match(self, state: AgentState) -> Optional[TemplateMatch]:
+        m = template_cache.match(state.user_question, self._scope(state), state.tables_schema,
+                                 state.value_links)
+        if m is None:
+            return None
+        m.sql = PgNLToSQLAgent.clean_sql(m.sql, state.limit)
+        if not self.safety_agent.run(AgentState(generated_sql=m.sql)).safety_passed:
+            template_cache.reject(m.template.id, m.template.scope)
+            return None
+        return m
+
+    def _miss(self, state: AgentState, t0: float) -> AgentState:
+        state.metrics["template"] = {"hit": False, "ms": round((time.perf_counter() - t0) * 1000, 2)}
+        return state
+
+    def _apply(self, state: AgentState, m: TemplateMatch, v: Validation, t0: float) -> AgentState:
+        state.metrics["template"] = {
+            "hit":   v.ok,
+            "id":    m.template.id,
+            "score": round(m.score, 3),
+            "ms":    round((time.perf_counter() - t0) * 1000, 2),
+        }
+        if not v.ok:
+            template_cache.reject(m.template.id, m.template.scope)
+            state.metrics["template"]["rejected"] = True
+            logger.info("PgTemplateAgent: template %s failed EXPLAIN (%s)",
+                        m.template.id, v.error.get("kind"))
+            return state
+        state.metrics.setdefault("explain", []).append(v.as_metrics())
+        state.generated_sql = v.sql
+        state.safety_passed = True
+        return state
@@ -0,0 +1,69 @@
+# backend/app/agents/pg_validation_agent.py
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import asyncpg
+from fastapi import HTTPException
+
+from app.agents.pg_execution_agent import _get_conn
+from app.db import get_uri_aconn
+from app.services.sql_validator import SQL_EXPLAIN, Validation, aexplain, explain, format_sql_error
+from app.state.agent_state import AgentState
+
+logger = logging.getLogger("db_assistant.pg_validation_agent")
+
+
+class PgValidationAgent:
+    """
+    Agent 3b (PostgreSQL) — EXPLAIN pre-validation (services/sql_validator).
+
+    Runs between SafetyAgent and ExecutionAgent: binding errors and
+    over-budget plans are caught before the query touches real data.
+
+    Reads from:  state.pg_uri, state.generated_sql, state.safety_passed, state.limit
+    Writes to:   state.generated_sql      (LIMIT pushed down when over budget)
+                 state.sql_error          (structured error, if the plan fails)
+                 state.execution_error    (if the plan fails)
+                 state.metrics["explain"] — one entry per validated attempt
+    """
+
+    def run(self, state: AgentState) -> AgentState:
+        if not self._applies(state):
+            return state
+        conn = _get_conn(state.pg_uri)
+        try:
+            v = explain(conn, state.generated_sql, state.limit)
+        finally:
+            conn.close()
+        return self._apply(state, v)
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """run() for the async pipeline."""
+        if not self._applies(state):
+            return state
+        try:
+            async with get_uri_aconn(state.pg_uri) as conn:
+                v = await aexplain(conn, state.generated_sql, state.limit)
+        except (OSError, asyncio.TimeoutError, asyncpg.InterfaceError) as exc:
+            raise HTTPException(503, detail=f"Cannot connect to PostgreSQL: {exc}")
+        return self._apply(state, v)
+
+    def _applies(self, state: AgentState) -> bool:
+        return SQL_EXPLAIN and state.safety_passed and bool(state.generated_sql) and bool(state.pg_uri)
+
+    def _apply(self, state: AgentState, v: Validation) -> AgentState:
+        state.metrics.setdefault("explain", []).append(v.as_metrics())
+        if v.status == "limited":
+            logger.info("PgValidationAgent: cost over budget, LIMIT %d pushed down", state.limit)
+            state.generated_sql = v.sql
+        if v.ok:
+            return state
+
+        state.sql_error = v.error
+        state.execution_error = (
+            f"Validation failed: {format_sql_error(v.error)}\nSQL was: {state.generated_sql[:400]}"
+        )
+        logger.warning("PgValidationAgent: %s (%s)", v.error["kind"], v.error["message"])
+        return state
@@ -5,17 +5,28 @@ ReAct (Reasoning + Acting) Agent for PostgreSQL queries.
 Implements the ReAct loop:
   Think → Act → Observe → (retry if needed)
 
-Wraps the existing NLToSQL + Safety + Execution pipeline with
-self-correction logic — up to react_max_attempts retries.
+Wraps the existing NLToSQL + Safety + Validation (EXPLAIN) + Execution
+pipeline with self-correction logic — up to react_max_attempts retries.
+Mechanical errors (identifier case, typos, alias mixing, duplicate LIMIT)
+are repaired locally by PgRepairAgent before another LLM attempt, and a
+question matching a stored SQL template (PgTemplateAgent) skips the LLM.
+arun() is the same loop for the async pipeline.
 """
 from __future__ import annotations
 
 import logging
 from app.state.agent_state import AgentState
+from app.agents.pg_schema_retrieval_agent import PgSchemaRetrievalAgent
 from app.agents.pg_nl_to_sql_agent import PgNLToSQLAgent
 from app.agents.pg_safety_agent    import PgSafetyAgent
 from app.agents.pg_execution_agent import PgExecutionAgent
+from app.agents.pg_speculative_agent import PgSpeculativeAgent
+from app.agents.pg_validation_agent import PgValidationAgent
+from app.agents.pg_repair_agent import PgRepairAgent
+from app.agents.pg_template_agent import PgTemplateAgent
 from app.services.nl_to_sql        import generate_sql
+from app.services.sql_repair       import from_items
+from app.services.sql_cache        import sql_cache
 
 logger = logging.getLogger("db_assistant.react_agent")
 
@@ -25,117 +36,333 @@ class ReActAgent:
     ReAct loop agent for PostgreSQL queries.
 
     Reads from:  state.tables_schema, state.enum_values,
-                 state.join_hints, state.user_question
-    Writes to:   state.generated_sql, state.results, state.columns,
+                 state.join_hints, state.user_question (never modified)
+    Writes to:   state.relevant_tables, state.generated_sql, state.results, state.columns,
+                 state.retry_feedback,
                  state.react_thoughts, state.react_actions,
-                 state.react_observations, state.react_attempts
+                 state.react_observations, state.react_attempts,
+                 state.metrics["explain"] (PgValidationAgent),
+                 state.metrics["repair"] (PgRepairAgent),
+                 state.metrics["template"] (PgTemplateAgent)
     """
 
     def __init__(self):
+        self.retrieval_agent = PgSchemaRetrievalAgent()
+        self.template_agent  = PgTemplateAgent()
         self.nl_to_sql_agent = PgNLToSQLAgent()
         self.safety_agent    = PgSafetyAgent()
+        self.validation_agent = PgValidationAgent()
         self.execution_agent = PgExecutionAgent()
+        self.repair_agent    = PgRepairAgent()
+        self.speculative_agent = PgSpeculativeAgent(
+            self.nl_to_sql_agent, self.safety_agent, self.execution_agent)
 
     def run(self, state: AgentState) -> AgentState:
+        # Narrow the schema to the question once, before any SQL attempt
+        state = self.retrieval_agent.run(state)
+
+        # A stored template answers without any LLM call
+        state = self.template_agent.run(state)
+        if self._template_hit(state):
+            state = self.execution_agent.run(state)
+            if self._template_served(state):
+                return state
+
         if not state.react_enabled:
             # Fall back to single-pass pipeline
             state = self.nl_to_sql_agent.run(state)
             if state.execution_error:
                 return state
             state = self.safety_agent.run(state)
+            if not state.execution_error:
+                state = self._validate(state)
+            if not state.execution_error:
+                state = self._execute(state)
             if state.execution_error:
-                return state
-            return self.execution_agent.run(state)
+                self._drop_cached_sql(state)
+            self.template_agent.learn(state)
+            return state
 
         max_attempts = state.react_max_attempts
         state.react_attempts = 0
 
         for attempt in range(1, max_attempts + 1):
-            state.react_attempts = attempt
-            logger.info("ReActAgent: attempt %d/%d", attempt, max_attempts)
-
-            # ── THINK ──────────────────────────────────────────────────
-            thought = self._think(state, attempt)
-            state.react_thoughts.append(thought)
-            logger.info("ReActAgent THINK: %s", thought)
+            self._begin_attempt(state, attempt, max_attempts)
 
             # ── ACT: Generate SQL ───────────────────────────────────────
-            action = f"Attempt {attempt}: Generate SQL for: {state.user_question}"
-            state.react_actions.append(action)
-
-            # Clear previous errors before retry
-            state.execution_error = None
-            state.safety_passed   = False
-
-            # Inject error context into state for smarter regeneration
-            if state.previous_sql_errors:
-                state = self._inject_error_context(state)
-
             state = self.nl_to_sql_agent.run(state)
-
-            if state.execution_error:
-                observation = f"SQL generation failed: {state.execution_error}"
-                state.react_observations.append(observation)
-                state.previous_sql_errors.append(state.execution_error)
-                state.execution_error = None
-                logger.warning("ReActAgent: %s", observation)
+            if not self._sql_generated(state):
                 continue
 
-            action_detail = f"Generated SQL: {state.generated_sql[:200]}"
-            state.react_actions[-1] = action_detail
-
             # ── ACT: Safety check ───────────────────────────────────────
-            state = self.safety_agent.run(state)
+            if not self._passes_safety(state):
+                continue
 
-            if state.execution_error:
-                observation = f"Safety check failed: {state.execution_error}"
-                state.react_observations.append(observation)
-                state.previous_sql_errors.append(state.execution_error)
-                state.execution_error = None
-                logger.warning("ReActAgent: %s", observation)
+            # ── ACT: Validate (EXPLAIN, no data read) ───────────────────
+            state = self._validate(state)
+            if not self._passes_validation(state):
                 continue
 
             # ── ACT: Execute ────────────────────────────────────────────
-            state = self.execution_agent.run(state)
+            state = self._execute(state)
 
             # ── OBSERVE ─────────────────────────────────────────────────
-            observation = self._observe(state, attempt)
-            state.react_observations.append(observation)
-            logger.info("ReActAgent OBSERVE: %s", observation)
+            if self._observe_attempt(state, attempt, max_attempts):
+                break
 
+        self.template_agent.learn(state)
+        return state
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """
+        run() for the async pipeline: SQL generation and execution are
+        awaited; retrieval and safety are CPU-only and stay synchronous.
+        With state.react_speculative > 1, attempt 1 races that many SQL
+        candidates (PgSpeculativeAgent) instead of generating one.
+        """
+        state = self.retrieval_agent.run(state)
+
+        state = await self.template_agent.arun(state)
+        if self._template_hit(state):
+            state = await self.execution_agent.arun(state)
+            if self._template_served(state):
+                return state
+
+        if not state.react_enabled:
+            state = await self.nl_to_sql_agent.arun(state)
+            if state.execution_error:
+                return state
+            state = self.safety_agent.run(state)
+            if not state.execution_error:
+                state = await self._avalidate(state)
+            if not state.execution_error:
+                state = await self._aexecute(state)
             if state.execution_error:
-                # Execution failed — record error and retry
-                state.previous_sql_errors.append(state.execution_error)
-                state.execution_error = None
-                logger.warning("ReActAgent: execution failed on attempt %d, retrying", attempt)
+                self._drop_cached_sql(state)
+            self.template_agent.learn(state)
+            return state
+
+        max_attempts = state.react_max_attempts
+        state.react_attempts = 0
+        first = 1
+
+        if state.react_speculative > 1:
+            if await self._speculate(state, max_attempts) or state.execution_error:
+                self.template_agent.learn(state)
+                return state
+            first = 2
+
+        for attempt in range(first, max_attempts + 1):
+            self._begin_attempt(state, attempt, max_attempts)
+
+            state = await self.nl_to_sql_agent.arun(state)
+            if not self._sql_generated(state):
                 continue
 
-            if len(state.results) == 0 and attempt < max_attempts:
-                # Empty results — try a broader query
-                logger.info("ReActAgent: empty results on attempt %d, retrying with broader query", attempt)
-                state.previous_sql_errors.append("Query returned 0 rows — try a broader or different query")
+            if not self._passes_safety(state):
                 continue
 
-            # Success — exit the loop
-            logger.info(
-                "ReActAgent: success on attempt %d — %d rows returned",
-                attempt, len(state.results)
-            )
-            break
+            state = await self._avalidate(state)
+            if not self._passes_validation(state):
+                continue
+
+            state = await self._aexecute(state)
 
-        # If all attempts failed, restore last execution error
-        if state.execution_error is None and len(state.results) == 0 and state.previous_sql_errors:
-            # Do not raise error for empty results — that is valid
-            pass
+            if self._observe_attempt(state, attempt, max_attempts):
+                break
 
+        self.template_agent.learn(state)
         return state
 
+    async def _speculate(self, state: AgentState, max_attempts: int) -> bool:
+        """Speculative attempt 1; True when the loop is done."""
+        state.react_attempts = 1
+        thought = self._think(state, 1) + (
+            f" I will generate {state.react_speculative} SQL candidates in parallel "
+            f"and keep the first one that returns rows."
+        )
+        state.react_thoughts.append(thought)
+        logger.info("ReActAgent THINK: %s", thought)
+
+        state = await self.speculative_agent.arun(state)
+        spec = state.metrics.get("speculative")
+        if spec is None:
+            # Prompt could not be built — execution_error is set
+            return True
+
+        if spec["winner"] is None:
+            state.react_actions.append(
+                f"Attempt 1: Generated {spec['candidates']} SQL candidates in parallel")
+            observation = f"All {spec['candidates']} candidates failed"
+            state.react_observations.append(observation)
+            logger.warning("ReActAgent: %s", observation)
+            return False
+
+        state.react_actions.append(
+            f"Attempt 1: Candidate {spec['winner'] + 1} of {spec['candidates']} won "
+            f"({spec['failed']} failed, {spec['cancelled']} cancelled): "
+            f"{state.generated_sql[:200]}"
+        )
+        return self._observe_attempt(state, 1, max_attempts)
+
+    # ── Loop steps (shared by run / arun) ───────────────────────────────
+
+    def _template_hit(self, state: AgentState) -> bool:
+        return bool((state.metrics.get("template") or {}).get("hit"))
+
+    def _template_served(self, state: AgentState) -> bool:
+        """After executing a template's SQL: True (and traced) when it answered."""
+        if state.execution_error or not state.results:
+            self.template_agent.reject(state)
+            return False
+        self.template_agent.accept(state)
+        info = state.metrics["template"]
+        state.react_attempts = 1
+        state.react_thoughts.append(
+            f"I need to answer: '{state.user_question}'. A stored SQL template matches "
+            f"this question (confidence {info['score']}), so no SQL generation is needed.")
+        state.react_actions.append(f"Filled SQL template {info['id']}: {state.generated_sql[:200]}")
+        state.react_observations.append(self._observe(state, 1))
+        return True
+
+    def _begin_attempt(self, state: AgentState, attempt: int, max_attempts: int) -> None:
+        state.react_attempts = attempt
+        logger.info("ReActAgent: attempt %d/%d", attempt, max_attempts)
+
+        # ── THINK ──────────────────────────────────────────────────
+        thought = self._think(state, attempt)
+        state.react_thoughts.append(thought)
+        logger.info("ReActAgent THINK: %s", thought)
+
+        action = f"Attempt {attempt}: Generate SQL for: {state.user_question}"
+        state.react_actions.append(action)
+
+        # Clear previous errors before retry
+        state.execution_error = None
+        state.safety_passed   = False
+
+        # Inject error context into state for smarter regeneration
+        if state.previous_sql_errors:
+            self._inject_error_context(state)
+
+    def _sql_generated(self, state: AgentState) -> bool:
+        if state.execution_error:
+            observation = f"SQL generation failed: {state.execution_error}"
+            state.react_observations.append(observation)
+            state.previous_sql_errors.append(state.execution_error)
+            state.execution_error = None
+            logger.warning("ReActAgent: %s", observation)
+            return False
+
+        cache = state.metrics.get("sql_cache") or {}
+        source = " (from cache)" if cache.get("hit") else ""
+        action_detail = f"Generated SQL{source}: {state.generated_sql[:200]}"
+        state.react_actions[-1] = action_detail
+        return True
+
+    def _passes_safety(self, state: AgentState) -> bool:
+        self.safety_agent.run(state)
+
+        if state.execution_error:
+            self._drop_cached_sql(state)
+            observation = f"Safety check failed: {state.execution_error}"
+            state.react_observations.append(observation)
+            state.previous_sql_errors.append(state.execution_error)
+            state.execution_error = None
+            logger.warning("ReActAgent: %s", observation)
+            return False
+        return True
+
+    def _validate(self, state: AgentState) -> AgentState:
+        """EXPLAIN the SQL; a failing plan gets a local repair before the LLM."""
+        state = self.validation_agent.run(state)
+        if state.execution_error:
+            state = self.repair_agent.run(state)
+            self._note_repair(state)
+        return state
+
+    async def _avalidate(self, state: AgentState) -> AgentState:
+        state = await self.validation_agent.arun(state)
+        if state.execution_error:
+            state = await self.repair_agent.arun(state)
+            self._note_repair(state)
+        return state
+
+    def _execute(self, state: AgentState) -> AgentState:
+        """Execute; errors the plan could not catch also get a local repair."""
+        state = self.execution_agent.run(state)
+        if state.execution_error:
+            state = self.repair_agent.run(state)
+            if self._note_repair(state):
+                state = self.execution_agent.run(state)
+        return state
+
+    async def _aexecute(self, state: AgentState) -> AgentState:
+        state = await self.execution_agent.arun(state)
+        if state.execution_error:
+            state = await self.repair_agent.arun(state)
+            if self._note_repair(state):
+                state = await self.execution_agent.arun(state)
+        return state
+
+    def _note_repair(self, state: AgentState) -> bool:
+        """After PgRepairAgent: True (and traced) when the SQL was repaired locally."""
+        if state.execution_error:
+            return False
+        # The cached statement failed; keep its repaired form instead
+        cache = state.metrics.get("sql_cache") or {}
+        if cache.get("key"):
+            sql_cache.put(cache["key"], state.generated_sql)
+        rule = state.metrics["repair"]["rules"][-1]
+        observation = f"Repaired SQL locally ({rule}), no LLM retry: {state.generated_sql[:150]}"
+        state.react_observations.append(observation)
+        logger.info("ReActAgent: %s", observation)
+        return True
+
+    def _passes_validation(self, state: AgentState) -> bool:
+        if state.execution_error:
+            self._drop_cached_sql(state)
+            observation = state.execution_error.split("\n", 1)[0]
+            state.react_observations.append(observation)
+            state.previous_sql_errors.append(state.execution_error)
+            state.execution_error = None
+            logger.warning("ReActAgent: %s", observation)
+            return False
+        return True
+
+    def _observe_attempt(self, state: AgentState, attempt: int, max_attempts: int) -> bool:
+        """Record the observation; True when the loop is done."""
+        observation = self._observe(state, attempt)
+        state.react_observations.append(observation)
+        logger.info("ReActAgent OBSERVE: %s", observation)
+
+        if state.execution_error:
+            # Execution failed — record error and retry
+            self._drop_cached_sql(state)
+            state.previous_sql_errors.append(state.execution_error)
+            state.execution_error = None
+            logger.warning("ReActAgent: execution failed on attempt %d, retrying", attempt)
+            return False
+
+        if len(state.results) == 0 and attempt < max_attempts:
+            # Empty results — try a broader query
+            logger.info("ReActAgent: empty results on attempt %d, retrying with broader query", attempt)
+            state.previous_sql_errors.append("Query returned 0 rows — try a broader or different query")
+            return False
+
+        # Success — exit the loop
+        logger.info(
+            "ReActAgent: success on attempt %d — %d rows returned",
+            attempt, len(state.results)
+        )
+        return True
+
     # ── Private helpers ─────────────────────────────────────────────────
 
     def _think(self, state: AgentState, attempt: int) -> str:
         """Generate a thought based on current state."""
         if attempt == 1:
-            tables = list(state.tables_schema.keys())
+            tables = state.relevant_tables or list(state.tables_schema.keys())
             return (
                 f"I need to answer: '{state.user_question}'. "
                 f"Available tables: {', '.join(tables[:5])}. "
@@ -155,6 +382,12 @@ class ReActAgent:
                 f"'{state.user_question}'."
             )
 
+    def _drop_cached_sql(self, state: AgentState) -> None:
+        """Never serve a cached statement again once it has failed."""
+        cache = state.metrics.get("sql_cache") or {}
+        if cache.get("key"):
+            sql_cache.invalidate(cache["key"])
+
     def _observe(self, state: AgentState, attempt: int) -> str:
         """Describe what happened after execution."""
         if state.execution_error:
@@ -170,15 +403,43 @@ class ReActAgent:
 
     def _inject_error_context(self, state: AgentState) -> AgentState:
         """
-        Inject previous error context into the question so the
-        NLToSQL agent can generate a better SQL on retry.
+        Hand the failed attempt to the NLToSQL agent for the retry prompt:
+        the failing SQL, the last error (structured when Postgres gave one)
+        and a targeted fix. state.user_question is left unchanged, so the
+        prompt does not grow from one attempt to the next.
         """
-        error_summary = "; ".join(state.previous_sql_errors[-2:])
-        state.user_question = (
-            f"{state.user_question}\n\n"
-            f"[CORRECTION NEEDED] Previous attempt failed: {error_summary}. "
-            f"Fix the SQL — use only valid column names from the schema, "
-            f"use correct table names with schema prefix, "
-            f"and only use enum values listed in the schema."
-        )
-        return state
\ No newline at end of file
+        last_error = state.previous_sql_errors[-1]
+        error, _, shown_sql = last_error.partition("\nSQL was: ")
+        # Speculative candidates never became generated_sql; their SQL is in the error
+        sql = state.generated_sql or shown_sql or None
+        state.retry_feedback = {
+            "sql":       sql,
+            "error":     error.strip(),
+            "sql_error": state.sql_error,
+            "hint":      self._error_hint(state, sql or ""),
+        }
+        # Consumed — a later failure sets a fresh one
+        state.sql_error = None
+        return state
+
+    def _error_hint(self, state: AgentState, sql: str) -> str:
+        """Targeted fix instruction for the last structured SQL error, if any."""
+        err = state.sql_error
+        if not err:
+            return ""
+        kind, ident = err.get("kind"), err.get("identifier")
+        if kind == "undefined_column":
+            used = list(dict.fromkeys(fqn for fqn, _ in from_items(sql, state.tables_schema)))
+            where = f" in {', '.join(used)}" if used else ""
+            return (f"Column \"{ident or err.get('message')}\" does not exist{where} — "
+                    f"use a column listed for that table in the schema.")
+        if kind == "undefined_table":
+            tables = state.relevant_tables or list(state.tables_schema)
+            return f"Table \"{ident}\" does not exist. Use one of: {', '.join(tables[:10])}."
+        if kind in ("ambiguous_column", "ambiguous_alias"):
+            return (f"\"{ident}\" is ambiguous — qualify every column with its table alias "
+                    f"(alias.column).")
+        if kind == "cost_limit":
+            return (f"The query is too expensive ({err['message']}). "
+                    f"Add selective WHERE filters and join on key columns only.")
+        return ""
@@ -46,6 +46,7 @@ class SwarmOrchestrator:
         limit:          int = 50,
         max_subtasks:   int = MAX_SUBTASKS,
         allowed_tables: Optional[List[str]] = None,
+        user_id:        str = "",
     ) -> Dict[str, Any]:
         t0 = time.time()
         logger.info("SwarmOrchestrator [PG]: starting for: %s", question)
@@ -86,7 +87,12 @@ class SwarmOrchestrator:
                 "tables_schema": schema_state.tables_schema,
                 "enum_values":   schema_state.enum_values,
                 "join_hints":    schema_state.join_hints,
+                "join_graph":    schema_state.join_graph,
+                "table_stats":   schema_state.table_stats,
+                "schema_index":  schema_state.schema_index,
+                "value_index":   schema_state.value_index,
                 "limit":         limit,
+                "user_id":       user_id,
             },
         )
 
@@ -223,8 +229,14 @@ class SwarmOrchestrator:
         enum_values:   Dict,
         join_hints:    List,
         limit:         int,
+        join_graph:    Any = None,
+        table_stats:   Optional[Dict] = None,
+        schema_index:  Any = None,
+        value_index:   Any = None,
+        user_id:       str = "",
     ) -> Dict[str, Any]:
         state = AgentState(
+            user_id            = user_id,
             source             = "postgresql",
             pg_uri             = pg_uri,
             user_question      = question,
@@ -232,6 +244,10 @@ class SwarmOrchestrator:
             tables_schema      = tables_schema,
             enum_values        = enum_values,
             join_hints         = join_hints,
+            join_graph         = join_graph,
+            table_stats        = table_stats or {},
+            schema_index       = schema_index,
+            value_index        = value_index,
             react_enabled      = True,
             react_max_attempts = 2,
         )
@@ -240,7 +256,7 @@ class SwarmOrchestrator:
             "question":          question,
             "sql":               state.generated_sql,
             "columns":           state.columns,
-            "data":              state.results,
+            "data":              list(state.results),   # dict rows (ColumnarResult → list)
             "count":             len(state.results),
             "execution_time_ms": state.execution_time_ms,
             "tables_used":       state.tables_used,
@@ -53,7 +53,7 @@ def plan_subtasks(question: str, table_names: List[str]) -> List[str]:
     )
 
     try:
-        raw = _call_gemini_text(SYSTEM_PROMPT, prompt)
+        raw = _call_gemini_text(SYSTEM_PROMPT, prompt, label="swarm_planner")
         raw = raw.strip()
         # Strip markdown fences
         raw = re.sub(r"```json|```", "", raw).strip()
@@ -69,7 +69,7 @@ def summarize_swarm_results(
     context = "\n".join(context_parts)
 
     try:
-        raw = _call_gemini_text(SYSTEM_PROMPT, context)
+        raw = _call_gemini_text(SYSTEM_PROMPT, context, label="swarm_summary")
         raw = raw.strip()
         raw = re.sub(r"```json|```", "", raw).strip()
         summary = json.loads(raw)
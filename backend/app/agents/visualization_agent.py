@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import numbers
-from datetime import datetime
+from datetime import date, datetime
 from app.state.agent_state import AgentState
 
 
-def _looks_like_date(s: str) -> bool:
+def _looks_like_date(s) -> bool:
+    # date / datetime values (psycopg2, Mongo) as well as ISO-like strings
+    if isinstance(s, date):
+        return True
     if not isinstance(s, str):
         return False
     s = s.strip()
@@ -57,7 +60,7 @@ class VisualizationAgent:
             if c == value:
                 continue
             v = first.get(c)
-            if isinstance(v, str) and _looks_like_date(v):
+            if _looks_like_date(v):
                 time_col = c
                 break
 
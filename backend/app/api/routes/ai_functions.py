@@ -4,16 +4,14 @@
 from __future__ import annotations
 
 import json
-import os
 import logging
 from typing import Any, Dict, List
 
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from google import genai
-from google.genai import errors as genai_errors
 
 from app.api.routes.auth import get_current_user
+from app.services.llm_client import llm
 
 logger = logging.getLogger("db_assistant.ai_functions")
 router = APIRouter(prefix="/ai", tags=["ai-functions"])
@@ -21,20 +19,7 @@ router = APIRouter(prefix="/ai", tags=["ai-functions"])
 
 # ─── Gemini helper ────────────────────────────────────────────
 def _call_gemini(system: str, prompt: str) -> str:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY not set")
-    client = genai.Client(api_key=api_key)
-    try:
-        resp = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[system, prompt],
-        )
-        return (resp.text or "").strip()
-    except genai_errors.ClientError as e:
-        raise RuntimeError(f"Gemini API error: {e}")
-    except Exception as e:
-        raise RuntimeError(f"Gemini call failed: {e}")
+    return llm.generate([system, prompt], model="gemini-2.0-flash", label="ai_functions")
 
 
 # ─── Request models ───────────────────────────────────────────
@@ -41,6 +41,8 @@ from jose import JWTError, jwt
 import bcrypt
 from pydantic import BaseModel, EmailStr, Field
 
+from app.db import get_conn
+
 logger = logging.getLogger("db_assistant.auth")
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -66,18 +68,8 @@ oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 # System DB connection  (your Docker PostgreSQL)
 # ─────────────────────────────────────────────────────────────
 def _system_conn():
-    host = os.getenv('DB_HOST', '127.0.0.1')
-    port = os.getenv('DB_PORT', '5433')
-    user = os.getenv('DB_USER', 'da_user')
-    pwd  = os.getenv('DB_PASS') or os.getenv('DB_PASSWORD', 'da_pass')
-    name = os.getenv('DB_NAME', 'da_db')
-    if host.startswith('/'):
-        uri = f'postgresql://{user}:{pwd}@/{name}?host={host}'
-    else:
-        uri = f'postgresql://{user}:{pwd}@{host}:{port}/{name}' 
     try:
-        return psycopg2.connect(uri, connect_timeout=8,
-                                cursor_factory=psycopg2.extras.RealDictCursor)
+        return get_conn(cursor_factory=psycopg2.extras.RealDictCursor)
     except Exception as e:
         raise HTTPException(503, detail=f"System DB unavailable: {e}")
 
@@ -344,6 +336,10 @@ def log_query(
     """Write one row to query_audit_log. Non-blocking — errors are swallowed."""
     try:
         conn = _system_conn()
+    except Exception as e:
+        logger.warning("Audit log write failed (non-fatal): %s", e)
+        return
+    try:
         with conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO query_audit_log
@@ -354,9 +350,10 @@ def log_query(
                   table_names or [], question, sql_generated,
                   row_count, execution_ms, ip_address, status, error_detail))
         conn.commit()
-        conn.close()
     except Exception as e:
         logger.warning("Audit log write failed (non-fatal): %s", e)
+    finally:
+        conn.close()
 
 
 # ─────────────────────────────────────────────────────────────
@@ -2,10 +2,11 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Any, List, Dict
-from google import genai
 import os, json
 from datetime import datetime
 
+from app.services.llm_client import llm
+
 router = APIRouter(prefix="/genui", tags=["genui"])
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -346,8 +347,8 @@ def _clean_html(html: str) -> str:
 @router.post("/generate")
 def generate_ui(req: GenUIRequest):
     try:
-        api_key = os.environ["GEMINI_API_KEY"]
-        client  = genai.Client(api_key=api_key)
+        if not os.getenv("GEMINI_API_KEY"):
+            raise KeyError("GEMINI_API_KEY")
 
         current_date = datetime.now().strftime("%B %d, %Y %H:%M")
         data_preview = json.dumps(req.rows[:75], default=str)
@@ -405,15 +406,16 @@ Return ONLY the raw HTML enclosed in ```html ... ``` markers. Nothing else.
 
         for attempt in range(3):
             try:
-                resp = client.models.generate_content(
+                raw = llm.generate(
+                    [full_prompt],
                     model="gemini-2.0-flash",
-                    contents=[full_prompt],
                     config={
                         "temperature": 0.3,        # low = consistent, less random
                         "max_output_tokens": 4096, # limits length = faster
-                    }
+                    },
+                    retries=1,                     # this loop already retries
+                    label="genui",
                 )
-                raw = (resp.text or "").strip()
                 cleaned = _clean_html(raw)
 
                 if _is_valid_html(cleaned):
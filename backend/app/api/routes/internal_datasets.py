@@ -21,16 +21,28 @@ import logging
 import os
 import re
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 import pandas as pd
 import psycopg2
 import psycopg2.extras
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.api.routes.auth import get_current_user
+from app.core.config import DB_PORT
+from app.core.fast_json import FastJSONResponse
+from app.db import get_conn
+from app.services.columnar import response_data
 from app.services.nl_to_sql import generate_sql
+from app.services.enum_discovery import discover_enum_values
+from app.services.pg_catalog import load_catalog
+from app.services.result_cache import result_cache
+from app.services.result_fetch import response_fields
+from app.services.result_stream import NDJSON, event, row_events
+from app.services.value_index import VALUE_LINKING
 from app.agents.orchestrator import Orchestrator
 from app.state.agent_state import AgentState
 
@@ -44,7 +56,7 @@ def _sys_uri() -> str:
     user     = os.getenv("DB_USER", "da_user")
     password = os.getenv("DB_PASS", os.getenv("DB_PASSWORD", "da_pass"))
     host     = os.getenv("DB_HOST", "127.0.0.1")
-    port     = os.getenv("DB_PORT", "5432")
+    port     = DB_PORT
     dbname   = os.getenv("DB_NAME", "da_db")
     if host.startswith("/"):
         # Cloud SQL Auth Proxy unix socket — must use ?host= query param
@@ -52,12 +64,10 @@ def _sys_uri() -> str:
     return f"postgresql://{user}:{password}@{host}:{port}/{dbname}"
 
 
-def _conn():
+def _conn(statement_timeout_ms: Optional[int] = None):
     try:
-        return psycopg2.connect(
-            _sys_uri(), connect_timeout=8,
-            cursor_factory=psycopg2.extras.RealDictCursor
-        )
+        return get_conn(cursor_factory=psycopg2.extras.RealDictCursor,
+                        statement_timeout_ms=statement_timeout_ms)
     except Exception as e:
         raise HTTPException(503, detail=f"Internal DB unavailable: {e}")
 
@@ -114,22 +124,18 @@ def _get_columns(conn, user_id: int, table_name: str) -> List[Dict]:
                  "pg_type": dict(r)["data_type"]} for r in cur.fetchall()]
 
 
-def _get_columns_from_schema(conn, schema: str, table_name: str) -> List[Dict]:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT column_name, data_type
-            FROM information_schema.columns
-            WHERE table_schema = %s AND table_name = %s
-            ORDER BY ordinal_position
-        """, (schema, table_name))
-        return [{"name": dict(r)["column_name"],
-                 "pg_type": dict(r)["data_type"]} for r in cur.fetchall()]
+def _get_columns_bulk(conn, schema: str, table_names: List[str]) -> Dict[str, List[Dict]]:
+    """Columns for many tables of one schema in a single catalog query."""
+    catalog = load_catalog(conn, schemas=[schema], tables=table_names,
+                           with_foreign_keys=False)
+    return {t["table"]: t["columns"] for t in catalog["tables"].values()}
 
 
 class DatasetNLRequest(BaseModel):
     table_name: str
     question:   str
     limit:      int = 50
+    format:     Literal["rows", "columnar", "arrays"] = "rows"   # result layout (services/columnar)
 
 
 @router.post("/upload", status_code=201)
@@ -168,7 +174,8 @@ async def upload_dataset(
     tbl_fqn   = _table_fqn(user_id, safe_tbl)
     cols_meta = [{"name": c, "pg_type": _infer_type(df[c])} for c in df.columns]
 
-    conn = _conn()
+    # COPY of a large upload can legitimately outlast the default statement_timeout
+    conn = _conn(statement_timeout_ms=0)
     try:
         _ensure_user_schema(conn, user_id)
         with conn.cursor() as cur:
@@ -188,6 +195,8 @@ async def upload_dataset(
         raise HTTPException(500, detail=f"Upload failed: {exc}")
     finally:
         conn.close()
+    # results cached for a table of the same name describe the old data
+    result_cache.invalidate_table(f"{_user_schema(user_id)}.{safe_tbl}")
 
     import uuid as _uuid
     dataset_id = str(_uuid.uuid4())
@@ -277,26 +286,30 @@ def preview_dataset(table_name: str, limit: int = 10,
         conn.close()
 
 
-@router.post("/nl-query")
-def dataset_nl_query(req: DatasetNLRequest, user=Depends(get_current_user)):
-    user_id  = user["user_id"]
-    safe_tbl = _safe_name(req.table_name)
-
+def _resolve_dataset_id(user_id: str, safe_tbl: str, table_name: str) -> str:
     conn = _conn()
     try:
         cols = _get_columns(conn, user_id, safe_tbl)
         if not cols:
-            raise HTTPException(404, detail=f"Table '{req.table_name}' not found.")
+            raise HTTPException(404, detail=f"Table '{table_name}' not found.")
         with conn.cursor() as cur:
             cur.execute(
                 "SELECT dataset_id FROM dataset_registry WHERE user_id=%s AND table_name=%s LIMIT 1",
                 (user_id, safe_tbl)
             )
             row = cur.fetchone()
-        dataset_id = dict(row)["dataset_id"] if row else safe_tbl
+        return dict(row)["dataset_id"] if row else safe_tbl
     finally:
         conn.close()
 
+
+@router.post("/nl-query")
+async def dataset_nl_query(req: DatasetNLRequest, user=Depends(get_current_user)):
+    user_id  = user["user_id"]
+    safe_tbl = _safe_name(req.table_name)
+
+    dataset_id = await run_in_threadpool(_resolve_dataset_id, user_id, safe_tbl, req.table_name)
+
     state = AgentState(
         user_id           = user_id,
         workspace_id      = user_id,
@@ -305,25 +318,26 @@ def dataset_nl_query(req: DatasetNLRequest, user=Depends(get_current_user)):
         limit             = req.limit,
         selected_datasets = [dataset_id],
     )
-    state = _orchestrator.run_dataset_query(state)
+    state = await _orchestrator.arun_dataset_query(state)
 
     if state.execution_error:
         raise HTTPException(500, detail=state.execution_error)
 
-    return {
+    return FastJSONResponse({
         "source":            "internal",
         "table_name":        safe_tbl,
         "question":          req.question,
         "sql":               state.generated_sql,
         "count":             len(state.results),
         "columns":           state.columns,
-        "data":              state.results,
+        **response_data(state.results, req.format),
         "execution_time_ms": state.execution_time_ms,
+        **response_fields(state.metrics.get("fetch")),
         "summary":           state.summary,
         "viz":               state.viz,
         "profile":           state.profile,
         "eda_insights":      state.eda_insights,
-    }
+    })
 
 
 @router.get("/schema")
@@ -344,44 +358,23 @@ class DatasetJoinNLRequest(BaseModel):
     table_names: List[str]
     question:    str
     limit:       int = 50
+    format:      Literal["rows", "columnar", "arrays"] = "rows"
 
 
-@router.post("/nl-query-join")
-def dataset_nl_query_join(req: DatasetJoinNLRequest,
-                          user=Depends(get_current_user)):
-    if len(req.table_names) < 2:
-        raise HTTPException(400, detail="Provide at least 2 table names for a JOIN query.")
-
-    user_id = user["user_id"]
-    schema  = _user_schema(user_id)
-    conn    = _conn()
+def _load_join_datasets(user_id: str, schema: str, table_names: List[str]):
+    """({table: columns}, dataset_ids) for the tables of a join query."""
+    conn = _conn()
 
     try:
         all_schemas = {}
-        for tname in req.table_names:
-            safe = _safe_name(tname)
-            cols = _get_columns(conn, user_id, safe)
+        safe_names  = [_safe_name(t) for t in table_names]
+        cols_by_tbl = _get_columns_bulk(conn, schema, safe_names)
+        for tname, safe in zip(table_names, safe_names):
+            cols = cols_by_tbl.get(safe)
             if not cols:
                 raise HTTPException(404, detail=f"Table '{tname}' not found in your datasets.")
             all_schemas[safe] = cols
 
-        schema_prompt = ""
-        for tname, cols in all_schemas.items():
-            fqn = f'"{schema}"."{tname}"'
-            schema_prompt += f"Table: {fqn}\nColumns:\n"
-            for c in cols:
-                schema_prompt += f"  - {c['name']} ({c['pg_type']})\n"
-            schema_prompt += "\n"
-
-        col_sets = [set(c["name"] for c in cols) for cols in all_schemas.values()]
-        common   = set.intersection(*col_sets) - {""}
-        join_hint = ""
-        if common:
-            join_hint = (
-                f"\nHint: The following column(s) appear in ALL tables and are likely "
-                f"JOIN keys: {', '.join(sorted(common))}.\n"
-            )
-
         dataset_ids = []
         with conn.cursor() as cur:
             for tname in all_schemas:
@@ -398,6 +391,19 @@ def dataset_nl_query_join(req: DatasetJoinNLRequest,
         raise HTTPException(500, detail=f"Schema load failed: {exc}")
     finally:
         conn.close()
+    return all_schemas, dataset_ids
+
+
+@router.post("/nl-query-join")
+async def dataset_nl_query_join(req: DatasetJoinNLRequest,
+                                user=Depends(get_current_user)):
+    if len(req.table_names) < 2:
+        raise HTTPException(400, detail="Provide at least 2 table names for a JOIN query.")
+
+    user_id = user["user_id"]
+    schema  = _user_schema(user_id)
+    all_schemas, dataset_ids = await run_in_threadpool(
+        _load_join_datasets, user_id, schema, req.table_names)
 
     state = AgentState(
         user_id           = user_id,
@@ -407,36 +413,37 @@ def dataset_nl_query_join(req: DatasetJoinNLRequest,
         limit             = req.limit,
         selected_datasets = dataset_ids,
     )
-    state = _orchestrator.run_dataset_query(state)
+    state = await _orchestrator.arun_dataset_query(state)
 
     if state.execution_error:
         raise HTTPException(500, detail=state.execution_error)
 
-    return {
+    return FastJSONResponse({
         "source":            "internal_join",
         "table_names":       list(all_schemas.keys()),
         "question":          req.question,
         "sql":               state.generated_sql,
         "count":             len(state.results),
         "columns":           state.columns,
-        "data":              state.results,
+        **response_data(state.results, req.format),
         "execution_time_ms": state.execution_time_ms,
+        **response_fields(state.metrics.get("fetch")),
         "summary":           state.summary,
         "viz":               state.viz,
         "profile":           state.profile,
         "eda_insights":      state.eda_insights,
-    }
+    })
 
 
 class DatasetAutoNLRequest(BaseModel):
     all_table_names: List[str]
     question:        str
     limit:           int = 50
+    format:          Literal["rows", "columnar", "arrays"] = "rows"
 
 
-@router.post("/nl-query-auto")
-def dataset_nl_query_auto(req: DatasetAutoNLRequest,
-                          user=Depends(get_current_user)):
+def _dataset_auto_attempts(req: DatasetAutoNLRequest, user: Dict):
+    """Schema load + ReAct attempts of /nl-query-auto: (final_state, tables_used, react_trace)."""
     if not req.all_table_names:
         raise HTTPException(400, detail="No datasets found. Upload a file first.")
 
@@ -446,9 +453,10 @@ def dataset_nl_query_auto(req: DatasetAutoNLRequest,
 
     try:
         all_schemas = {}
-        for tname in req.all_table_names:
-            safe = _safe_name(tname)
-            cols = _get_columns(conn, user_id, safe)
+        safe_names  = [_safe_name(t) for t in req.all_table_names]
+        cols_by_tbl = _get_columns_bulk(conn, schema, safe_names)
+        for safe in safe_names:
+            cols = cols_by_tbl.get(safe)
             if cols:
                 all_schemas[safe] = cols
 
@@ -463,37 +471,6 @@ def dataset_nl_query_auto(req: DatasetAutoNLRequest,
                 schema_prompt += "  - " + c["name"] + " (" + c["pg_type"] + ")\n"
             schema_prompt += "\n"
 
-        col_sets = {t: {c["name"] for c in cols} for t, cols in all_schemas.items()}
-        join_hints = []
-        table_list = list(col_sets.keys())
-        for i in range(len(table_list)):
-            for j in range(i + 1, len(table_list)):
-                t1, t2 = table_list[i], table_list[j]
-                common = col_sets[t1] & col_sets[t2] - {""}
-                if common:
-                    join_hints.append(
-                        f'  - "{schema}"."{t1}" and "{schema}"."{t2}" '
-                        f'share: {", ".join(sorted(common)[:4])}'
-                    )
-
-        hint_block = ""
-        if join_hints:
-            hint_block = "Potential JOIN keys:\n" + "\n".join(join_hints) + "\n\n"
-
-        question_with_ctx = (
-            req.question + "\n\n"
-            + hint_block
-            + "Rules:\n"
-            + "- Use ONLY the tables listed above with their full schema-qualified names\n"
-            + "- If the question involves data from multiple tables, write a JOIN query\n"
-            + "- If the question is about one table only, write a simple SELECT\n"
-            + '- Always use the full qualified name: "' + schema + '"."tablename"\n'
-            + "- For string comparisons always use LOWER(column) = LOWER(value) or ILIKE\n"
-            + "- Never assume the exact capitalisation of string values in the data\n"
-            + "- Add LIMIT " + str(req.limit) + " at the end\n"
-            + "- Return ONLY SQL, no explanation"
-        )
-
         dataset_ids = []
         with conn.cursor() as cur:
             for tname in all_schemas:
@@ -571,14 +548,28 @@ def dataset_nl_query_auto(req: DatasetAutoNLRequest,
     if last_error:
         raise HTTPException(500, detail=last_error)
 
+    tables_used = [t for t in all_schemas if t.lower() in (final_state.generated_sql or "").lower()]
+    react_trace = {
+        "attempts":      len(thoughts),
+        "thoughts":      thoughts,
+        "actions":       actions,
+        "observations":  observations,
+        "self_corrected": len(thoughts) > 1 and not last_error,
+    }
+    return final_state, tables_used, react_trace
+
+
+@router.post("/nl-query-auto")
+def dataset_nl_query_auto(req: DatasetAutoNLRequest,
+                          user=Depends(get_current_user)):
+    final_state, tables_used, react_trace = _dataset_auto_attempts(req, user)
+
     # ── Step 3: Post-processing (profile, EDA, insights, viz) ─────────────
     final_state = _orchestrator.profiling_agent.run(final_state)
     final_state = _orchestrator.eda_agent.run(final_state)
     final_state = _orchestrator.insight_agent.run(final_state)
     final_state = _orchestrator.visualization_agent.run(final_state)
 
-    tables_used = [t for t in all_schemas if t.lower() in (final_state.generated_sql or "").lower()]
-
     response = {
         "source":            "internal_auto",
         "tables_used":       tables_used,
@@ -586,22 +577,43 @@ def dataset_nl_query_auto(req: DatasetAutoNLRequest,
         "sql":               final_state.generated_sql,
         "count":             len(final_state.results),
         "columns":           final_state.columns,
-        "data":              final_state.results,
+        **response_data(final_state.results, req.format),
         "execution_time_ms": final_state.execution_time_ms,
+        **response_fields(final_state.metrics.get("fetch")),
         "summary":           final_state.summary,
         "viz":               final_state.viz,
         "profile":           final_state.profile,
         "eda_insights":      final_state.eda_insights,
-        "react_trace": {
-            "attempts":      len(thoughts),
-            "thoughts":      thoughts,
-            "actions":       actions,
-            "observations":  observations,
-            "self_corrected": len(thoughts) > 1 and not last_error,
-        },
+        "react_trace":       react_trace,
     }
 
-    return response
+    return FastJSONResponse(response)
+
+
+@router.post("/nl-query-auto/stream")
+def dataset_nl_query_auto_stream(req: DatasetAutoNLRequest,
+                                 user=Depends(get_current_user)):
+    """/nl-query-auto as an NDJSON stream (services/result_stream)."""
+    t0 = time.time()
+    final_state, tables_used, react_trace = _dataset_auto_attempts(req, user)
+
+    def events():
+        yield event("sql", source="internal_auto", question=req.question,
+                    sql=final_state.generated_sql, tables_used=tables_used,
+                    react_trace=react_trace)
+        yield from row_events(final_state.results)
+        yield event("result", count=len(final_state.results),
+                    execution_time_ms=final_state.execution_time_ms,
+                    **response_fields(final_state.metrics.get("fetch")))
+        try:
+            for key, value in _orchestrator.iter_post_processing(final_state):
+                yield event(key, data=value)
+        except Exception as e:
+            yield event("error", detail=f"Post-processing failed: {e}")
+            return
+        yield event("done", total_ms=int((time.time() - t0) * 1000))
+
+    return StreamingResponse(events(), media_type=NDJSON)
 
 
 @router.delete("/{table_name}")
@@ -616,6 +628,7 @@ def delete_dataset(table_name: str, user=Depends(get_current_user)):
         conn.commit()
     finally:
         conn.close()
+    result_cache.invalidate_table(f"{_user_schema(user_id)}.{safe_tbl}")
     return {"message": f"Table '{safe_tbl}' deleted."}
 
 
@@ -628,6 +641,7 @@ class BenchmarkRequest(BaseModel):
     question:    str
     limit:       int = 200
     file_paths:  Dict[str, str] = {}   # table_name -> absolute file path (CSV/JSON)
+    cache:       bool = True            # False = bypass the generated-SQL cache
 
 
 @router.post("/benchmark-run")
@@ -640,15 +654,11 @@ def benchmark_run(req: BenchmarkRequest):
     """
     schema  = "benchmark_tmp"
     pg_uri  = _sys_uri()
-    conn    = _conn()
+    # Longer statement_timeout for large table operations (this checkout only)
+    conn    = _conn(statement_timeout_ms=120_000)
     uploaded = []  # list of (safe_name, tbl_fqn)
 
     try:
-        # Set longer timeouts for large table operations
-        with conn.cursor() as cur:
-            cur.execute("SET statement_timeout = '120s';")
-        conn.commit()
-
         # Create temp schema
         with conn.cursor() as cur:
             cur.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}";')
@@ -759,8 +769,9 @@ def benchmark_run(req: BenchmarkRequest):
         # Build tables_schema with sample data so agent sees actual values
         tables_schema = {}
         schema_context = []
+        cols_by_tbl = _get_columns_bulk(conn, schema, [safe for safe, _ in uploaded])
         for safe, tbl_fqn in uploaded:
-            cols = _get_columns_from_schema(conn, schema, safe)
+            cols = cols_by_tbl.get(safe, [])
             # Get sample rows to show actual data values (handles non-English data)
             try:
                 with conn.cursor() as cur:
@@ -783,9 +794,23 @@ def benchmark_run(req: BenchmarkRequest):
                 pass
             tables_schema[f"{schema}.{safe}"] = cols
 
+        # Categorical values from fresh statistics; with value linking only the
+        # values the question mentions reach the prompt (not raw sample rows)
+        enum_values = {}
+        if VALUE_LINKING:
+            try:
+                with conn.cursor() as cur:
+                    for _, tbl_fqn in uploaded:
+                        cur.execute(f'ANALYZE {tbl_fqn};')
+                conn.commit()
+                enum_values, _ = discover_enum_values(conn, pg_uri, tables_schema)
+            except Exception as exc:
+                conn.rollback()
+                logger.warning("benchmark enum discovery failed: %s", exc)
+
         # Build enhanced question with sample data context
         sample_data_hint = ""
-        if schema_context:
+        if schema_context and not VALUE_LINKING:
             sample_data_hint = (
                 "\n\n[ACTUAL DATA SAMPLES — use these EXACT values in WHERE clauses]\n" +
                 "\n\n".join(schema_context[:3])  # max 3 tables to avoid token overflow
@@ -795,7 +820,7 @@ def benchmark_run(req: BenchmarkRequest):
             req.question +
             sample_data_hint +
             "\n\n[SQL Rules]\n"
-            "- Use EXACT values from the sample data above — data may be in non-English languages\n"
+            "- Use EXACT stored values for string literals — data may be in non-English languages\n"
             "- Use the benchmark_tmp schema prefix: benchmark_tmp.tablename\n"
             "- For single-answer questions use LIMIT 1\n"
             "- For COUNT/AVG questions return just the number\n"
@@ -810,8 +835,10 @@ def benchmark_run(req: BenchmarkRequest):
             user_question      = enhanced_question,
             limit              = req.limit,
             tables_schema      = tables_schema,
+            enum_values        = enum_values,
             react_enabled      = True,
             react_max_attempts = 3,
+            use_sql_cache      = req.cache,
         )
         state = _orchestrator.react_agent.run(state)
 
@@ -825,6 +852,8 @@ def benchmark_run(req: BenchmarkRequest):
         except Exception:
             pass
         conn.close()
+        for safe, _ in uploaded:
+            result_cache.invalidate_table(f"{schema}.{safe}")
 
     if state.execution_error:
         return {
@@ -835,10 +864,11 @@ def benchmark_run(req: BenchmarkRequest):
         }
 
     return {
-        "data":              state.results,
+        **response_data(state.results),
         "columns":           state.columns,
         "sql":               state.generated_sql or "",
         "execution_time_ms": state.execution_time_ms,
+        **response_fields(state.metrics.get("fetch")),
         "react_trace": {
             "attempts":       state.react_attempts,
             "self_corrected": state.react_attempts > 1,
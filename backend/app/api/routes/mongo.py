@@ -9,18 +9,20 @@ import traceback
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-import pymongo
-
 from bson import ObjectId
 from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel, Field, field_validator
 
 from app.agents.mongo_query_agent import MongoQueryAgent
 from app.agents.orchestrator import Orchestrator
+from app.core.fast_json import FastJSONResponse
 from app.state.agent_state import AgentState
 
 # Shared orchestrator instance
 _orchestrator = Orchestrator()
+from app.services.mongo_clients import (
+    discard_client, get_mongo_client, get_motor_client, release_client,
+)
 from app.services.mongo_execute import run_query
 from app.services.mongo_query_validator import (
     enforce_date_filter,
@@ -157,18 +159,22 @@ class MongoPingRequest(BaseModel):
 @router.post("/ping-uri", tags=["mongo"])
 def ping_mongo_uri(req: MongoPingRequest):
     """Test a MongoDB connection URI — returns ok + list of databases."""
-    from pymongo import MongoClient
     from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+    client = None
     try:
-        client = MongoClient(req.mongo_uri, serverSelectionTimeoutMS=5000)
+        client = get_mongo_client(req.mongo_uri)
         client.admin.command("ping")
         dbs = client.list_database_names()
-        client.close()
         return {"status": "ok", "databases": dbs}
     except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+        discard_client(req.mongo_uri)
         raise HTTPException(400, detail=f"Cannot connect to MongoDB: {e}")
     except Exception as e:
+        discard_client(req.mongo_uri)
         raise HTTPException(400, detail=str(e))
+    finally:
+        if client is not None:
+            release_client(client)
 
 
 @router.get("/collections", tags=["mongo"])
@@ -242,10 +248,7 @@ async def mongo_query(req: MongoDirectQueryRequest):
     if req.projection:
         _check_blocked(req.projection, "projection")
 
-    import motor.motor_asyncio
-    client = motor.motor_asyncio.AsyncIOMotorClient(
-        req.mongo_uri, serverSelectionTimeoutMS=5000
-    )
+    client = get_motor_client(req.mongo_uri)
     try:
         cursor = client[req.db_name][req.collection].find(
             req.filter,
@@ -263,33 +266,33 @@ async def mongo_query(req: MongoDirectQueryRequest):
         )
         raise HTTPException(500, detail=f"MongoDB query error: {exc}")
     finally:
-        client.close()
+        release_client(client)
 
-    safe_data = [_json_safe(d) for d in raw]
-    cols = list(safe_data[0].keys()) if safe_data else []
+    docs = raw   # ObjectId / datetime are encoded by FastJSONResponse
+    cols = list(docs[0].keys()) if docs else []
 
     # Run post-processing for EDA profile + insights
     from app.state.agent_state import AgentState
     post = AgentState(
         user_question = f"Direct query on {req.collection}",
-        results       = safe_data,
+        results       = docs,
         columns       = cols,
     )
     post = _orchestrator.run_post_processing(post)
 
-    return {
+    return FastJSONResponse({
         "source":      "mongo",
         "db":          req.db_name,
         "collection":  req.collection,
         "filter":      req.filter,
         "count":       len(raw),
         "limit_applied": req.limit,
-        "data":        safe_data,
+        "data":        docs,
         "summary":     post.summary,
         "viz":         post.viz,
         "profile":     post.profile,
         "eda_insights": post.eda_insights,
-    }
+    })
 
 
 @router.post("/nl-query", tags=["mongo"])
@@ -401,22 +404,22 @@ def mongo_nl_query(req: MongoNLQRequest):
         raise HTTPException(500, detail=f"Query execution failed: {exc}")
 
     # 8) Serialise (handles ObjectId + datetime)
-    safe_data = [_json_safe(d) for d in data]
+    docs = data
     safe_spec = _json_safe(spec)
 
     # 9) Run InsightAgent + VisualizationAgent via Orchestrator
     post_state = AgentState(
         source        = "mongodb",
         user_question = req.question,
-        results       = safe_data,
-        columns       = list(safe_data[0].keys()) if safe_data else [],
+        results       = docs,
+        columns       = list(docs[0].keys()) if docs else [],
     )
     post_state = _orchestrator.run_post_processing(post_state)
 
     import json as _json2
     spec_str = _json2.dumps(safe_spec, indent=2)
 
-    return {
+    return FastJSONResponse({
         "source": "mongo",
         "db_name": req.db_name,
         "collection": req.collection,
@@ -424,11 +427,11 @@ def mongo_nl_query(req: MongoNLQRequest):
         "question": req.question,
         "spec": safe_spec,
         "sql": spec_str,
-        "count": len(safe_data),
-        "data": safe_data,
-        "columns": list(safe_data[0].keys()) if safe_data else [],
+        "count": len(docs),
+        "data": docs,
+        "columns": list(docs[0].keys()) if docs else [],
         "execution_time_ms": execution_time_ms,
-        "summary": post_state.summary or f"Returned {len(safe_data)} rows.",
+        "summary": post_state.summary or f"Returned {len(docs)} rows.",
         "viz": post_state.viz,
         "profile": post_state.profile,
         "eda_insights": post_state.eda_insights,
@@ -437,9 +440,9 @@ def mongo_nl_query(req: MongoNLQRequest):
             "self_corrected": False,
             "thoughts":  [f"Analyzing MongoDB collection '{req.collection}' to answer: {req.question}"],
             "actions":   [spec_str],
-            "observations": [f"Success — {len(safe_data)} document(s) returned"],
+            "observations": [f"Success — {len(docs)} document(s) returned"],
         },
-    }
+    })
 
 # ---------------------------------------------------------------------------
 # NL query with ReAct self-correction loop
@@ -540,13 +543,13 @@ def mongo_nl_query_auto(req: MongoNLQueryAutoRequest):
     if last_error and not data:
         raise HTTPException(500, detail=last_error)
 
-    safe_data = [_json_safe(d) for d in data]
-    cols = list(safe_data[0].keys()) if safe_data else []
+    docs = data
+    cols = list(docs[0].keys()) if docs else []
 
     post = AgentState(
         source="mongodb",
         user_question=req.question,
-        results=safe_data,
+        results=docs,
         columns=cols,
     )
     post = _orchestrator.run_post_processing(post)
@@ -558,8 +561,8 @@ def mongo_nl_query_auto(req: MongoNLQueryAutoRequest):
         "question":          req.question,
         "spec":              _json_safe(spec),
         "sql":               str(spec),        # ResultsPanel reads this field
-        "count":             len(safe_data),
-        "data":              safe_data,
+        "count":             len(docs),
+        "data":              docs,
         "columns":           cols,
         "execution_time_ms": elapsed,
         "summary":           post.summary,
@@ -577,7 +580,7 @@ def mongo_nl_query_auto(req: MongoNLQueryAutoRequest):
             "self_corrected": len(thoughts) > 1 and not last_error,
         }
 
-    return response
+    return FastJSONResponse(response)
 
 
 # ---------------------------------------------------------------------------
@@ -653,7 +656,7 @@ def mongo_nl_query_join(req: MongoJoinNLRequest):
 
     # Build actual field samples so Gemini knows the real join keys and enum values
     field_sample_lines = []
-    client_tmp = pymongo.MongoClient(uri, serverSelectionTimeoutMS=5000)
+    client_tmp = get_mongo_client(uri)
     db_tmp = client_tmp[req.db_name]
     coll_field_samples = {}
     # Collect distinct values for key categorical fields
@@ -681,7 +684,7 @@ def mongo_nl_query_join(req: MongoJoinNLRequest):
                             pass
         except Exception:
             pass
-    client_tmp.close()
+    release_client(client_tmp)
 
     # Auto-detect join keys by finding matching field values across collections
     join_key_hints = []
@@ -734,7 +737,8 @@ Rules:
 - No markdown, no extra explanation
 """
     try:
-        raw = _call_gemini_text(PIPELINE_PROMPT, schema_prompt + "\n\nQuestion:\n" + question_with_ctx)
+        raw = _call_gemini_text(PIPELINE_PROMPT, schema_prompt + "\n\nQuestion:\n" + question_with_ctx,
+                                label="mongo_pipeline")
     except Exception as exc:
         raise HTTPException(500, detail=f"Gemini call failed: {exc}")
 
@@ -789,7 +793,7 @@ Rules:
 
     # 7) Execute — try primary first, then all collections if 0 results
     t0 = time.perf_counter()
-    client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=5000)
+    client = get_mongo_client(uri)
     db = client[req.db_name]
 
     # First peek at actual values in the data to catch case issues
@@ -851,7 +855,7 @@ Rules:
             except Exception:
                 continue
 
-    client.close()
+    release_client(client)
     elapsed_ms = int((time.perf_counter() - t0) * 1000)
 
     # Flatten nested $lookup arrays into readable columns
@@ -888,22 +892,21 @@ Rules:
             if any(d.get(k) not in (None, "", "None") for d in flattened)
         ]
         flattened = [{k: d.get(k) for k in non_empty_keys} for d in flattened]
-    safe_data = [_json_safe(d) for d in flattened]
 
     # Run post-processing pipeline for EDA + insights
     from app.state.agent_state import AgentState as _AgentState
     join_post = _AgentState(
         source        = "mongodb",
         user_question = req.question,
-        results       = safe_data,
-        columns       = list(safe_data[0].keys()) if safe_data else [],
+        results       = flattened,
+        columns       = list(flattened[0].keys()) if flattened else [],
     )
     join_post = _orchestrator.run_post_processing(join_post)
 
     import json as _json
     pipeline_str = _json.dumps(_json_safe(pipeline), indent=2)
 
-    return {
+    return FastJSONResponse({
         "source":             "mongo_join",
         "db_name":            req.db_name,
         "primary_collection": winning_coll,
@@ -912,9 +915,9 @@ Rules:
         "pipeline":           _json_safe(pipeline),
         "sql":                pipeline_str,          # shown in SQL drawer
         "debug_sample":       _json_safe(debug_info),
-        "count":              len(safe_data),
-        "data":               safe_data,
-        "columns":            list(safe_data[0].keys()) if safe_data else [],
+        "count":              len(flattened),
+        "data":               flattened,
+        "columns":            list(flattened[0].keys()) if flattened else [],
         "execution_time_ms":  elapsed_ms,
         "summary":            join_post.summary,
         "viz":                join_post.viz,
@@ -930,8 +933,8 @@ Rules:
             ],
             "actions":       [pipeline_str],
             "observations":  [
-                f"Success — {len(safe_data)} document(s) returned "
+                f"Success — {len(flattened)} document(s) returned "
                 f"from primary collection '{winning_coll}'"
             ],
         },
-    }
\ No newline at end of file
+    })
@@ -415,13 +415,15 @@ def show_mysql_indexes(
             req.host, req.port, req.database,
             req.username, req.password
         )
-        cursor = conn.cursor(dictionary=True)
-        all_indexes = {}
-        for table in req.tables:
-            cursor.execute(f"SHOW INDEX FROM `{table}`")
-            all_indexes[table] = cursor.fetchall()
-        conn.close()
-        return {"indexes": all_indexes}
+        try:
+            cursor = conn.cursor(dictionary=True)
+            all_indexes = {}
+            for table in req.tables:
+                cursor.execute(f"SHOW INDEX FROM `{table}`")
+                all_indexes[table] = cursor.fetchall()
+            return {"indexes": all_indexes}
+        finally:
+            conn.close()
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -436,13 +438,15 @@ def show_create_table(
             req.host, req.port, req.database,
             req.username, req.password
         )
-        cursor = conn.cursor()
-        create_statements = {}
-        for table in req.tables:
-            cursor.execute(f"SHOW CREATE TABLE `{table}`")
-            row = cursor.fetchone()
-            create_statements[table] = row[1] if row else ""
-        conn.close()
-        return {"create_statements": create_statements}
+        try:
+            cursor = conn.cursor()
+            create_statements = {}
+            for table in req.tables:
+                cursor.execute(f"SHOW CREATE TABLE `{table}`")
+                row = cursor.fetchone()
+                create_statements[table] = row[1] if row else ""
+            return {"create_statements": create_statements}
+        finally:
+            conn.close()
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
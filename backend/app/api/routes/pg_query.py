@@ -2,20 +2,28 @@
 # Fully agentic — all NL queries go through the Orchestrator pipeline
 from __future__ import annotations
 
+import asyncio
 import io
 import logging
 import re
 import time
 import traceback
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 import pandas as pd
 import psycopg2
 import psycopg2.extras
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.agents.orchestrator import Orchestrator
+from app.core.fast_json import FastJSONResponse
+from app.db import get_uri_conn
+from app.services.columnar import response_data
+from app.services.pg_catalog import load_catalog
+from app.services.result_fetch import FetchResult, fetch_capped, iter_capped, response_fields
+from app.services.result_stream import NDJSON, arow_events, event, fetch_events
 from app.state.agent_state import AgentState
 from app.api.routes.auth import get_current_user, get_connection_uri
 
@@ -31,10 +39,7 @@ _orchestrator = Orchestrator()
 # ─────────────────────────────────────────────────────────────
 def _get_conn(pg_uri: str):
     try:
-        return psycopg2.connect(
-            pg_uri, connect_timeout=8,
-            cursor_factory=psycopg2.extras.RealDictCursor
-        )
+        return get_uri_conn(pg_uri, cursor_factory=psycopg2.extras.RealDictCursor)
     except Exception as exc:
         raise HTTPException(503, detail=f"Cannot connect to PostgreSQL: {exc}")
 
@@ -95,7 +100,22 @@ def _fetch_all_tables(pg_uri: str) -> dict:
     return {"total": len(all_tables), "schemas": schemas, "tables": all_tables}
 
 
-def _state_to_response(state: AgentState) -> Dict:
+def _react_trace(state: AgentState) -> Dict:
+    trace = {
+        "attempts":     state.react_attempts,
+        "thoughts":     state.react_thoughts,
+        "actions":      state.react_actions,
+        "observations": state.react_observations,
+        "self_corrected": state.react_attempts > 1,
+    }
+    if "speculative" in state.metrics:
+        trace["speculative"] = state.metrics["speculative"]
+    if "repair" in state.metrics:
+        trace["llm_calls_saved"] = state.metrics["repair"]["llm_calls_saved"]
+    return trace
+
+
+def _state_to_response(state: AgentState, fmt: str = "rows") -> Dict:
     """Convert AgentState to API response dict — includes ReAct trace."""
     response = {
         "source":            "postgresql_auto",
@@ -104,8 +124,9 @@ def _state_to_response(state: AgentState) -> Dict:
         "sql":               state.generated_sql,
         "count":             len(state.results),
         "columns":           state.columns,
-        "data":              state.results,
+        **response_data(state.results, fmt),
         "execution_time_ms": state.execution_time_ms,
+        **response_fields(state.metrics.get("fetch")),
         "summary":           state.summary,
         "viz":               state.viz,
         "profile":           state.profile,
@@ -114,13 +135,10 @@ def _state_to_response(state: AgentState) -> Dict:
 
     # Include ReAct trace if the loop ran
     if state.react_attempts > 0:
-        response["react_trace"] = {
-            "attempts":     state.react_attempts,
-            "thoughts":     state.react_thoughts,
-            "actions":      state.react_actions,
-            "observations": state.react_observations,
-            "self_corrected": state.react_attempts > 1,
-        }
+        response["react_trace"] = _react_trace(state)
+
+    if state.metrics:
+        response["metrics"] = state.metrics
 
     return response
 
@@ -155,10 +173,14 @@ class PgNLQueryAutoRequest(BaseModel):
     question:  str
     limit:     int  = Field(50, ge=1, le=500)
     react:     bool = True   # enable/disable ReAct loop per request
+    cache:     bool = True   # False = bypass the generated-SQL cache
+    speculative: int = Field(0, ge=0, le=8)   # >1 = race N SQL candidates on the first attempt
+    format:    Literal["rows", "columnar", "arrays"] = "rows"   # result layout (services/columnar)
 
 class PgDirectQueryRequest(BaseModel):
     pg_uri: str
     sql:    str
+    format: Literal["rows", "columnar", "arrays"] = "rows"
 
 
 # ─────────────────────────────────────────────────────────────
@@ -211,11 +233,20 @@ def get_multi_table_schema(req: PgMultiTableSchemaRequest):
     conn = _get_conn(req.pg_uri)
     result = {}
     try:
+        wanted = {}
         for fqn in req.tables:
             parts = fqn.replace('"', '').split(".")
             schema = parts[0] if len(parts) == 2 else "public"
-            table  = parts[-1]
-            result[fqn] = _get_table_columns(conn, schema, table)
+            wanted[fqn] = f"{schema}.{parts[-1]}"
+        catalog = load_catalog(
+            conn,
+            schemas={w.split(".", 1)[0] for w in wanted.values()},
+            tables={w.split(".", 1)[1] for w in wanted.values()},
+            with_foreign_keys=False,
+        )
+        for fqn, key in wanted.items():
+            t = catalog["tables"].get(key)
+            result[fqn] = t["columns"] if t else []
         return {"schemas": result}
     finally:
         conn.close()
@@ -312,7 +343,7 @@ async def upload_csv_to_pg(
 # ✅ AGENTIC: NL Query with ReAct loop
 # ─────────────────────────────────────────────────────────────
 @router.post("/nl-query-auto")
-def pg_nl_query_auto(req: PgNLQueryAutoRequest):
+async def pg_nl_query_auto(req: PgNLQueryAutoRequest):
     """
     Fully agentic NL query with ReAct self-correction loop:
     PgSchemaAgent → ReActAgent (NLToSQL + Safety + Execution, up to 3 retries)
@@ -325,24 +356,72 @@ def pg_nl_query_auto(req: PgNLQueryAutoRequest):
         limit          = req.limit,
         react_enabled  = req.react,
         react_max_attempts = 3,
+        react_speculative  = req.speculative,
+        use_sql_cache  = req.cache,
     )
 
-    state = _orchestrator.run_pg_query(state)
+    state = await _orchestrator.arun_pg_query(state)
 
     if state.execution_error:
         raise HTTPException(500, detail=state.execution_error)
 
-    return _state_to_response(state)
+    return FastJSONResponse(_state_to_response(state, req.format))
+
+
+@router.post("/nl-query-auto/stream")
+async def pg_nl_query_auto_stream(req: PgNLQueryAutoRequest):
+    """
+    /nl-query-auto as an NDJSON stream (services/result_stream): the SQL and
+    the rows go out once the ReAct loop has them, the post-processing
+    artifacts follow as each agent finishes.
+    """
+    t0 = time.time()
+    state = AgentState(
+        source         = "postgresql",
+        pg_uri         = req.pg_uri,
+        user_question  = req.question,
+        limit          = req.limit,
+        react_enabled  = req.react,
+        react_max_attempts = 3,
+        react_speculative  = req.speculative,
+        use_sql_cache  = req.cache,
+    )
+
+    state = await _orchestrator.arun_pg_execution(state)
+
+    if state.execution_error:
+        raise HTTPException(500, detail=state.execution_error)
+
+    async def events():
+        yield event("sql", source="postgresql_auto", question=state.user_question,
+                    sql=state.generated_sql, tables_used=state.tables_used,
+                    react_trace=_react_trace(state) if state.react_attempts > 0 else None)
+        async for line in arow_events(state.results):
+            yield line
+        yield event("result", count=len(state.results),
+                    execution_time_ms=state.execution_time_ms,
+                    **response_fields(state.metrics.get("fetch")))
+        try:
+            async for key, value in _orchestrator.aiter_post_processing(state):
+                yield event(key, data=value)
+        except Exception as e:
+            logger.error("nl-query-auto/stream post-processing failed: %s", e)
+            yield event("error", detail=f"Post-processing failed: {e}")
+            return
+        yield event("done", total_ms=int((time.time() - t0) * 1000), metrics=state.metrics)
+
+    return StreamingResponse(events(), media_type=NDJSON)
 
 
 # ─────────────────────────────────────────────────────────────
 # ✅ AGENTIC: Multi-question
 # ─────────────────────────────────────────────────────────────
 @router.post("/nl-query-multi")
-def pg_nl_query_multi(req: PgNLQueryAutoRequest):
+async def pg_nl_query_multi(req: PgNLQueryAutoRequest):
     """
     Multi-question mode — splits compound questions and runs a
-    separate Orchestrator pipeline (with ReAct) for each one.
+    separate Orchestrator pipeline (with ReAct) for each one,
+    concurrently.
     """
     import re as _re
 
@@ -373,17 +452,21 @@ def pg_nl_query_multi(req: PgNLQueryAutoRequest):
     results = []
     t0_total = time.time()
 
-    for q in questions[:5]:
-        state = AgentState(
+    states = await asyncio.gather(*(
+        _orchestrator.arun_pg_query(AgentState(
             source         = "postgresql",
             pg_uri         = req.pg_uri,
             user_question  = q,
             limit          = req.limit,
             react_enabled  = req.react,
             react_max_attempts = 3,
-        )
-        state = _orchestrator.run_pg_query(state)
+            react_speculative  = req.speculative,
+            use_sql_cache  = req.cache,
+        ))
+        for q in questions[:5]
+    ))
 
+    for q, state in zip(questions[:5], states):
         if state.execution_error:
             results.append({"question": q, "error": state.execution_error,
                              "count": 0, "data": []})
@@ -394,31 +477,26 @@ def pg_nl_query_multi(req: PgNLQueryAutoRequest):
                 "tables_used":       state.tables_used,
                 "count":             len(state.results),
                 "columns":           state.columns,
-                "data":              state.results,
+                **response_data(state.results, req.format),
                 "execution_time_ms": state.execution_time_ms,
+                **response_fields(state.metrics.get("fetch")),
                 "summary":           state.summary,
                 "viz":               state.viz,
                 "profile":           state.profile,
                 "eda_insights":      state.eda_insights,
             }
             if state.react_attempts > 0:
-                result["react_trace"] = {
-                    "attempts":       state.react_attempts,
-                    "self_corrected": state.react_attempts > 1,
-                    "thoughts":       state.react_thoughts,
-                    "actions":        state.react_actions,
-                    "observations":   state.react_observations,
-                }
+                result["react_trace"] = _react_trace(state)
             results.append(result)
 
-    return {
+    return FastJSONResponse({
         "source":        "postgresql_multi",
         "original":      req.question,
         "questions":     questions,
         "results":       results,
         "total_queries": len(results),
         "total_ms":      int((time.time() - t0_total) * 1000),
-    }
+    })
 
 
 # ─────────────────────────────────────────────────────────────
@@ -432,12 +510,9 @@ def pg_direct_query(req: PgDirectQueryRequest):
     conn = _get_conn(req.pg_uri)
     try:
         t0 = time.time()
-        with conn.cursor() as cur:
-            cur.execute(sql)
-            raw  = cur.fetchall()
-            cols = [d.name for d in cur.description] if cur.description else []
+        fetched = fetch_capped(conn, sql)
         ms = int((time.time() - t0) * 1000)
-        results = [dict(r) for r in raw]
+        results, cols = fetched.rows, fetched.columns
 
         post = AgentState(
             user_question = sql,
@@ -446,18 +521,58 @@ def pg_direct_query(req: PgDirectQueryRequest):
         )
         post = _orchestrator.run_post_processing(post)
 
-        return {
+        return FastJSONResponse({
             "sql":               sql,
             "count":             len(results),
             "columns":           cols,
-            "data":              results,
+            **response_data(results, req.format),
             "execution_time_ms": ms,
+            **response_fields(fetched.as_metrics()),
             "summary":           post.summary,
             "viz":               post.viz,
             "profile":           post.profile,
             "eda_insights":      post.eda_insights,
-        }
+        })
     except Exception as e:
         raise HTTPException(500, detail=f"Query failed: {e}")
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+@router.post("/direct-query/stream")
+def pg_direct_query_stream(req: PgDirectQueryRequest):
+    """/direct-query as an NDJSON stream: rows are sent as each cursor batch arrives."""
+    sql = req.sql.strip()
+    if not sql.lower().startswith("select"):
+        raise HTTPException(422, detail="Only SELECT statements allowed.")
+    conn = _get_conn(req.pg_uri)
+
+    def events():
+        t0 = time.time()
+        fetched = FetchResult()
+        try:
+            yield event("sql", sql=sql)
+            yield from fetch_events(iter_capped(conn, sql, result=fetched), fetched)
+        except Exception as e:
+            yield event("error", detail=f"Query failed: {e}")
+            return
+        finally:
+            conn.close()
+        yield event("result", count=len(fetched.rows),
+                    execution_time_ms=int((time.time() - t0) * 1000),
+                    **response_fields(fetched.as_metrics()))
+
+        post = AgentState(
+            user_question = sql,
+            results       = fetched.rows,
+            columns       = fetched.columns,
+        )
+        try:
+            for key, value in _orchestrator.iter_post_processing(post):
+                yield event(key, data=value)
+        except Exception as e:
+            yield event("error", detail=f"Post-processing failed: {e}")
+            return
+        yield event("done", total_ms=int((time.time() - t0) * 1000))
+
+    return StreamingResponse(events(), media_type=NDJSON)
@@ -10,8 +10,11 @@ from __future__ import annotations
 import uuid, json, time
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response, HTMLResponse, JSONResponse
 
+from app.services.llm_client import llm
+
 router = APIRouter(tags=["plugin"])
 
 # In-memory store for results and user connections
@@ -96,24 +99,19 @@ async def plugin_connect(request: Request):
     try:
         if db_type == "mysql":
             m = _parse_mysql_uri(connection_string)
-            import mysql.connector
-            conn = mysql.connector.connect(
-                host=m["host"], port=m["port"], database=m["database"],
-                user=m["username"], password=m["password"], connection_timeout=8
-            )
-            cur = conn.cursor()
-            cur.execute("SHOW TABLES")
-            tables = [row[0] for row in cur.fetchall()]
-            conn.close()
+            from app.services.mysql_service import get_mysql_tables
+            tables = get_mysql_tables(m["host"], m["port"], m["database"], m["username"], m["password"])
 
         elif db_type == "mongodb":
-            from pymongo import MongoClient
+            from app.services.mongo_clients import get_mongo_client, release_client
             from urllib.parse import urlparse
             p = urlparse(connection_string)
             db_name = p.path.lstrip("/").split("?")[0] or "test"
-            client = MongoClient(connection_string, serverSelectionTimeoutMS=5000)
-            db = client[db_name]
-            tables = db.list_collection_names()[:20]
+            client = get_mongo_client(connection_string)
+            try:
+                tables = client[db_name].list_collection_names()[:20]
+            finally:
+                release_client(client)
 
         else:
             # postgres / supabase / default
@@ -148,10 +146,6 @@ async def plugin_suggest_questions(request: Request):
     tables_schema = body.get("tables_schema", {})  # {table: [col, col, ...]}
     db_type = body.get("db_type", "demo")
 
-    import os, google.generativeai as genai
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel("gemini-2.5-flash")
-
     if not tables_schema:
         return {"questions": [
             "What is the total revenue per department?",
@@ -169,9 +163,8 @@ async def plugin_suggest_questions(request: Request):
         "a business analyst would ask. Return ONLY a JSON array of 3 strings. No explanation."
     )
     try:
-        response = model.generate_content(prompt)
+        raw = (await llm.agenerate(prompt, label="plugin")).strip("```json").strip("```").strip()
         import json
-        raw = response.text.strip().strip("```json").strip("```").strip()
         questions = json.loads(raw)
         if isinstance(questions, list) and len(questions) >= 3:
             return {"questions": questions[:3]}
@@ -206,25 +199,25 @@ async def plugin_query(request: Request):
         source = "uploaded"
         from app.api.routes.internal_datasets import benchmark_run, BenchmarkRequest
         req = BenchmarkRequest(tables=tables, question=question, limit=50)
-        result = benchmark_run(req)
+        result = await run_in_threadpool(benchmark_run, req)
 
     elif db_type == "mysql":
         source = "mysql"
         if not connection_string:
             raise HTTPException(400, detail="connection_string is required for MySQL")
-        result = _run_nl_query_mysql_uri(question, connection_string)
+        result = await run_in_threadpool(_run_nl_query_mysql_uri, question, connection_string)
 
     elif db_type == "mongodb":
         source = "mongodb"
         if not connection_string:
             raise HTTPException(400, detail="connection_string is required for MongoDB")
-        result = _run_nl_query_mongo_uri(question, connection_string)
+        result = await run_in_threadpool(_run_nl_query_mongo_uri, question, connection_string)
 
     elif db_type in ("postgres", "supabase"):
         source = db_type
         if not connection_string:
             raise HTTPException(400, detail="connection_string is required")
-        result = _run_nl_query_on_pg(question, connection_string)
+        result = await run_in_threadpool(_run_nl_query_on_pg, question, connection_string)
 
     elif connection_string or session_id:
         # Legacy: custom DB connection without explicit db_type
@@ -234,12 +227,12 @@ async def plugin_query(request: Request):
         if not conn_str:
             raise HTTPException(400, detail="No connection found for this session_id")
         source = "custom_db"
-        result = _run_nl_query_on_pg(question, conn_str)
+        result = await run_in_threadpool(_run_nl_query_on_pg, question, conn_str)
 
     else:
         # Demo Neon DB (default)
         source = "demo"
-        result = _run_nl_query_on_pg(question, DEMO_CONNECTION)
+        result = await run_in_threadpool(_run_nl_query_on_pg, question, DEMO_CONNECTION)
 
     # Store result and generate shareable URL
     result_id = str(uuid.uuid4())[:8]
@@ -265,6 +258,11 @@ async def plugin_query(request: Request):
         "result_url":  result_url,
         "message":     f"Query returned {len(rows)} rows. [View Full Results]({result_url})",
     }
+    if result.get("fetch", {}).get("truncated"):
+        response_body["truncated"]     = True
+        response_body["bytes_fetched"] = result["fetch"]["bytes"]
+        response_body["message"] = (f"Query returned the first {len(rows)} rows (result truncated). "
+                                    f"[View Full Results]({result_url})")
     if error:
         response_body["error"] = error
     return response_body
@@ -306,10 +304,11 @@ def _run_nl_query_mysql_uri(question: str, connection_string: str) -> Dict:
 
 def _run_nl_query_mongo_uri(question: str, connection_string: str) -> Dict:
     """Run NL->Mongo query using a connection URI."""
-    import logging, json, os
+    import logging, json
     logger = logging.getLogger("db_assistant.plugin")
+    from app.services.mongo_clients import get_mongo_client, release_client
+    client = None
     try:
-        from pymongo import MongoClient
         from urllib.parse import urlparse
         from bson import ObjectId
         from datetime import datetime
@@ -317,7 +316,7 @@ def _run_nl_query_mongo_uri(question: str, connection_string: str) -> Dict:
         p = urlparse(connection_string)
         db_name = p.path.lstrip("/").split("?")[0] or "test"
 
-        client = MongoClient(connection_string, serverSelectionTimeoutMS=5000)
+        client = get_mongo_client(connection_string)
         db = client[db_name]
         collections = db.list_collection_names()[:10]
         if not collections:
@@ -332,9 +331,6 @@ def _run_nl_query_mongo_uri(question: str, connection_string: str) -> Dict:
                 schema_parts.append(f"Collection '{coll}': {', '.join(keys)}")
         schema_str = "\n".join(schema_parts)
 
-        import google.generativeai as genai
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        model = genai.GenerativeModel("gemini-2.5-flash")
         prompt = (
             f"You are a MongoDB expert. Given this schema:\n{schema_str}\n\n"
             f"Question: {question}\n\n"
@@ -343,8 +339,7 @@ def _run_nl_query_mongo_uri(question: str, connection_string: str) -> Dict:
             '  "pipeline": [<MongoDB aggregation pipeline stages>]\n'
             "No explanation, no markdown."
         )
-        response = model.generate_content(prompt)
-        raw = response.text.strip().strip("```json").strip("```").strip()
+        raw = llm.generate(prompt, label="plugin").strip("```json").strip("```").strip()
         query_def = json.loads(raw)
 
         coll_name = query_def.get("collection", collections[0])
@@ -364,6 +359,9 @@ def _run_nl_query_mongo_uri(question: str, connection_string: str) -> Dict:
     except Exception as e:
         logger.error("_run_nl_query_mongo_uri failed: %s", e, exc_info=True)
         return {"sql": "", "data": [], "columns": [], "error": str(e)}
+    finally:
+        if client is not None:
+            release_client(client)
 
 
 def _strip_sql(text: str) -> str:
@@ -384,11 +382,16 @@ def _run_nl_query_on_pg(question: str, connection_string: str) -> Dict:
     import logging
     logger = logging.getLogger("db_assistant.plugin")
     try:
-        import psycopg2
         import psycopg2.extras
-        import os
+        from app.db import get_uri_conn
+        from app.services.result_fetch import fetch_capped
 
-        conn = psycopg2.connect(connection_string, cursor_factory=psycopg2.extras.RealDictCursor)
+        conn = get_uri_conn(connection_string, cursor_factory=psycopg2.extras.RealDictCursor)
+    except Exception as e:
+        logger.error("_run_nl_query_on_pg failed: %s", e, exc_info=True)
+        return {"sql": "", "data": [], "columns": [], "error": str(e)}
+
+    try:
         cur = conn.cursor()
 
         cur.execute("""
@@ -410,9 +413,6 @@ def _run_nl_query_on_pg(question: str, connection_string: str) -> Dict:
             f"Table {t}: {', '.join(cols)}" for t, cols in schema.items()
         )
 
-        import google.generativeai as genai
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        model = genai.GenerativeModel("gemini-2.5-flash")
 
         prompt = (
             "You are a PostgreSQL expert. Return ONLY a valid SQL query, no explanation, "
@@ -425,19 +425,18 @@ def _run_nl_query_on_pg(question: str, connection_string: str) -> Dict:
             "- Add LIMIT 100 unless the question asks for a count or aggregate\n"
             "- No markdown, no code fences, no explanation"
         )
-        response = model.generate_content(prompt)
-        sql = _strip_sql(response.text)
+        sql = _strip_sql(llm.generate(prompt, label="plugin"))
 
-        cur.execute(sql)
-        columns = [desc[0] for desc in cur.description] if cur.description else []
-        rows = [dict(r) for r in cur.fetchall()]
-        conn.close()
+        fetched = fetch_capped(conn, sql)
 
-        return {"sql": sql, "data": rows, "columns": columns, "error": ""}
+        return {"sql": sql, "data": fetched.rows, "columns": fetched.columns, "error": "",
+                "fetch": fetched.as_metrics()}
 
     except Exception as e:
         logger.error("_run_nl_query_on_pg failed: %s", e, exc_info=True)
         return {"sql": "", "data": [], "columns": [], "error": str(e)}
+    finally:
+        conn.close()
 
 
 def _esc(s: str) -> str:
@@ -58,6 +58,7 @@ def swarm_pg_query(req: SwarmPgRequest, user=Depends(get_current_user)):
             question     = req.question,
             limit        = req.limit,
             max_subtasks = req.max_subtasks,
+            user_id      = str(user["user_id"]),
         )
         if result.get("error"):
             raise HTTPException(500, detail=result["error"])
@@ -133,6 +134,7 @@ def swarm_dataset_query(req: SwarmDatasetRequest, user=Depends(get_current_user)
             limit          = req.limit,
             max_subtasks   = req.max_subtasks,
             allowed_tables = req.table_names,
+            user_id        = str(user["user_id"]),
         )
         if result.get("error"):
             raise HTTPException(500, detail=result["error"])
@@ -0,0 +1,96 @@
+# backend/app/core/fast_json.py
+"""
+orjson-backed JSON rendering for API responses.
+
+A route that returns a dict goes through FastAPI's jsonable_encoder, which
+rebuilds every row value by value in Python before the response class
+renders it — the dominant cost for large results. Returning
+FastJSONResponse(payload) skips that walk: orjson serializes the payload in
+one native pass and handles datetime / date / time, UUID, dataclasses,
+NumPy arrays and scalars itself, and writes NaN / ±Inf as null. Only the
+types it does not know reach _default():
+
+  Decimal                → int when integral, else float (as jsonable_encoder)
+  timedelta              → seconds
+  bytes / memoryview     → hex string (as the Mongo routes always sent them)
+  set / frozenset        → list
+  ColumnarResult         → dict rows
+  anything else          → str()   (bson ObjectId, inet, ranges, ...)
+
+Payloads orjson cannot encode (integers beyond 64 bits) fall back to the
+stdlib encoder, after NaN / ±Inf are replaced by null. The stdlib encoder
+knows none of orjson's native types either, so _default() also renders
+those the way orjson does — datetime / date / time as isoformat(), UUID
+as its canonical string, dataclasses as dicts — and one payload gives the
+same bytes on either path.
+
+main.py also makes it the app's default_response_class, so routes that
+still return dicts at least render through orjson.
+"""
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import decimal
+import json
+import math
+import uuid
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(v: Any) -> Any:
+    if isinstance(v, decimal.Decimal):
+        if not v.is_finite():
+            return None
+        return int(v) if v.as_tuple().exponent >= 0 else float(v)
+    if isinstance(v, datetime.timedelta):
+        return v.total_seconds()
+    # orjson-native types, reached on the stdlib fallback path only
+    if isinstance(v, (datetime.datetime, datetime.date, datetime.time)):
+        return v.isoformat()
+    if isinstance(v, uuid.UUID):
+        return str(v)
+    if dataclasses.is_dataclass(v) and not isinstance(v, type):
+        return _finite(dataclasses.asdict(v))
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return bytes(v).hex()
+    if isinstance(v, (set, frozenset)):
+        return list(v)
+    if hasattr(v, "to_dicts"):                 # services.columnar.ColumnarResult
+        return v.to_dicts()
+    if hasattr(v, "tolist"):                   # NumPy, on the stdlib fallback path
+        return _finite(v.tolist())
+    return str(v)
+
+
+def _finite(v: Any) -> Any:
+    """v with NaN / ±Inf floats replaced by None (stdlib fallback only)."""
+    if isinstance(v, float):
+        return v if math.isfinite(v) else None
+    if isinstance(v, dict):
+        return {k: _finite(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_finite(x) for x in v]
+    return v
+
+
+def dumps(content: Any) -> bytes:
+    """content as JSON bytes."""
+    try:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+    except orjson.JSONEncodeError:
+        # integers beyond 64 bits — the stdlib encoder has no such limit
+        return json.dumps(_finite(content), default=_default, ensure_ascii=False,
+                          allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
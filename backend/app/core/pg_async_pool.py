@@ -0,0 +1,232 @@
+# backend/app/core/pg_async_pool.py
+"""
+asyncpg pools for user-supplied PostgreSQL URIs (async pipeline).
+
+The sync PgPoolRegistry hands psycopg2 sockets to worker threads; the async
+pipeline (Orchestrator.arun_pg_query) awaits queries on asyncpg instead, so
+a request waiting on Postgres holds no thread at all.
+
+asyncpg pools are bound to the event loop that created them, so pools are
+keyed by (loop, dsn_key(dsn)). Like PgPoolRegistry the registry is an LRU
+with a per-target size cap; evicted pools are terminated. Every socket an
+asyncpg pool opens is also counted against a shared process-wide cap
+(reserve / unreserve, wired to PgPoolRegistry's max_sockets in app.db).
+
+DSNs are parsed with libpq's parser (normalize_dsn), so key=value strings and
+libpq-only URI parameters (channel_binding, connect_timeout, ...) that asyncpg
+would forward to the server as settings work the same as on the sync path.
+
+New connections get json / jsonb and inet / cidr codecs so rows decode the
+same as on the psycopg2 path (dicts and lists, text addresses).
+
+Statement caching is disabled: pg_uri targets are often behind PgBouncer
+in transaction mode (Supabase, Neon), which breaks named prepared statements.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from app.core.pg_pool import dsn_key, dsn_tag, normalize_dsn
+
+logger = logging.getLogger("db_assistant.pg_async_pool")
+
+_SSLMODES = {"disable", "allow", "prefer", "require", "verify-ca", "verify-full"}
+
+# returned as text (as psycopg2 does) instead of asyncpg's ipaddress objects
+_TEXT_TYPES = ("inet", "cidr")
+
+
+def _connect_kwargs(dsn: str) -> Dict[str, Any]:
+    """asyncpg.connect() keyword arguments for a libpq DSN."""
+    p = normalize_dsn(dsn)
+    kwargs: Dict[str, Any] = {
+        "host":     p.get("host") or None,
+        "port":     int(p.get("port", "5432")),
+        "user":     p.get("user") or None,
+        "password": p.get("password") or None,
+        "database": p.get("dbname") or None,
+    }
+    if p.get("sslmode") in _SSLMODES:
+        kwargs["ssl"] = p["sslmode"]
+    if p.get("application_name"):
+        kwargs["server_settings"] = {"application_name": p["application_name"]}
+    return kwargs
+
+
+class AsyncPgPoolRegistry:
+    """
+    LRU registry of asyncpg pools, one per (event loop, target).
+
+      max_pools     — distinct targets kept; the least recently used is closed
+      per_pool_max  — max connections per target
+      timeout       — seconds to wait for a free connection / to connect
+      idle_ttl      — idle connections are closed after this (asyncpg reaps them)
+      reserve / unreserve — optional hooks called as sockets are opened / closed;
+                            while reserve() returns False a new connection waits
+                            (up to timeout) instead of opening
+    """
+
+    def __init__(
+        self,
+        *,
+        max_pools: int = 32,
+        per_pool_max: int = 4,
+        timeout: float = 10.0,
+        idle_ttl: float = 300.0,
+        statement_timeout_ms: int = 0,
+        reserve: Optional[Callable[[], bool]] = None,
+        unreserve: Optional[Callable[[], None]] = None,
+    ):
+        self.max_pools            = max_pools
+        self.per_pool_max         = per_pool_max
+        self.timeout              = timeout
+        self.idle_ttl             = idle_ttl
+        self.statement_timeout_ms = statement_timeout_ms
+
+        self._reserve   = reserve or (lambda: True)
+        self._unreserve = unreserve or (lambda: None)
+        self._lock  = threading.Lock()
+        self._pools: "OrderedDict[Tuple[int, str], asyncpg.Pool]" = OrderedDict()
+        self._creating: Dict[Tuple[int, str], asyncio.Future] = {}
+
+        self._hits      = 0
+        self._misses    = 0
+        self._evictions = 0
+        self._cap_timeouts = 0
+
+    async def _count_socket(self, conn: asyncpg.Connection) -> None:
+        """Take a slot under the shared socket cap for a new connection."""
+        deadline = time.monotonic() + self.timeout
+        while not self._reserve():
+            if time.monotonic() >= deadline:
+                with self._lock:
+                    self._cap_timeouts += 1
+                raise asyncpg.exceptions.TooManyConnectionsError(
+                    f"process-wide Postgres socket cap reached for {self.timeout:.1f}s"
+                )
+            # sockets freed elsewhere do not notify us, so re-check periodically
+            await asyncio.sleep(0.05)
+        conn.add_termination_listener(lambda _conn: self._unreserve())
+
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        """
+        Pool init hook: socket accounting, then the type codecs that make
+        asyncpg rows look like the psycopg2 path's — json / jsonb decoded
+        to dicts and lists, inet / cidr as text instead of ipaddress objects.
+        """
+        await self._count_socket(conn)
+        for typename in ("json", "jsonb"):
+            await conn.set_type_codec(typename, encoder=json.dumps, decoder=json.loads,
+                                      schema="pg_catalog")
+        for typename in _TEXT_TYPES:
+            await conn.set_type_codec(typename, encoder=str, decoder=str,
+                                      schema="pg_catalog", format="text")
+
+    async def _pool_for(self, dsn: str) -> asyncpg.Pool:
+        loop = asyncio.get_running_loop()
+        key = (id(loop), dsn_key(dsn))
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is not None and not pool.is_closing():
+                self._pools.move_to_end(key)
+                self._hits += 1
+                return pool
+            pending = self._creating.get(key)
+            if pending is None:
+                pending = self._creating[key] = loop.create_future()
+                creator = True
+                self._misses += 1
+            else:
+                creator = False
+
+        if not creator:
+            return await asyncio.shield(pending)
+
+        try:
+            kwargs = _connect_kwargs(dsn)
+            settings = dict(kwargs.pop("server_settings", {}))
+            if self.statement_timeout_ms:
+                settings["statement_timeout"] = str(self.statement_timeout_ms)
+            pool = await asyncpg.create_pool(
+                **kwargs,
+                min_size=0,
+                max_size=self.per_pool_max,
+                timeout=self.timeout,
+                max_inactive_connection_lifetime=self.idle_ttl,
+                statement_cache_size=0,
+                server_settings=settings or None,
+                init=self._init_connection,
+            )
+        except BaseException as exc:
+            with self._lock:
+                self._creating.pop(key, None)
+            pending.set_exception(exc)
+            pending.exception()   # mark retrieved; concurrent waiters still raise it
+            raise
+
+        evicted: List[asyncpg.Pool] = []
+        with self._lock:
+            self._creating.pop(key, None)
+            self._pools[key] = pool
+            while len(self._pools) > self.max_pools:
+                _, old = self._pools.popitem(last=False)
+                self._evictions += 1
+                evicted.append(old)
+        pending.set_result(pool)
+        for old in evicted:
+            # Pools from another loop cannot be awaited here; terminate() is sync
+            old.terminate()
+        return pool
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, dsn: str,
+                      statement_timeout_ms: Optional[int] = None) -> AsyncIterator[asyncpg.Connection]:
+        """Pooled asyncpg connection; statement_timeout_ms applies to this checkout only."""
+        pool = await self._pool_for(dsn)
+        async with pool.acquire(timeout=self.timeout) as conn:
+            if statement_timeout_ms is not None:
+                await conn.execute(f"SET statement_timeout = {int(statement_timeout_ms)}")
+                try:
+                    yield conn
+                finally:
+                    await conn.execute("RESET statement_timeout")
+            else:
+                yield conn
+
+    async def close_loop_pools(self) -> None:
+        """Close the pools owned by the running loop (lifespan shutdown)."""
+        loop_id = id(asyncio.get_running_loop())
+        with self._lock:
+            keys = [k for k in self._pools if k[0] == loop_id]
+            pools = [self._pools.pop(k) for k in keys]
+        for pool in pools:
+            try:
+                await asyncio.wait_for(pool.close(), timeout=self.timeout)
+            except Exception:
+                pool.terminate()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pools":     len(self._pools),
+                "hits":      self._hits,
+                "misses":    self._misses,
+                "evictions": self._evictions,
+                "socket_cap_timeouts": self._cap_timeouts,
+                "targets": [
+                    {"target": dsn_tag(k[1]),
+                     "size":   p.get_size(),
+                     "idle":   p.get_idle_size(),
+                     "max":    p.get_max_size()}
+                    for k, p in self._pools.items()
+                ],
+            }
@@ -0,0 +1,624 @@
+# backend/app/core/pg_pool.py
+"""
+Thread-safe psycopg2 connection pool.
+
+Connections handed out by PgPool are wrapped in a PooledConnection proxy
+whose close() returns the socket to the pool instead of closing it, so the
+existing call-site pattern keeps working unchanged:
+
+    conn = get_conn()
+    try:
+        ...
+    finally:
+        conn.close()
+
+Every checkout runs one round trip that doubles as a health check and
+applies the per-checkout statement_timeout.
+
+PgPoolRegistry keeps one small PgPool per user-supplied connection string.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger("db_assistant.pg_pool")
+
+
+class PoolTimeout(RuntimeError):
+    """No connection became available within the pool's checkout timeout."""
+
+
+class PoolClosed(RuntimeError):
+    """The pool has been shut down."""
+
+
+class _Entry:
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw, created_at: float):
+        self.raw        = raw
+        self.created_at = created_at
+        self.last_used  = created_at
+
+
+class PooledConnection:
+    """
+    Proxy around a psycopg2 connection checked out from a PgPool.
+
+    Everything except close() is delegated to the underlying connection.
+    A proxy that is garbage-collected without close() returns its
+    connection to the pool, so a missed close() cannot leak a slot.
+    """
+
+    __slots__ = ("_pool", "_entry", "_released")
+
+    def __init__(self, pool: "PgPool", entry: _Entry):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_entry", entry)
+        object.__setattr__(self, "_released", False)
+
+    @property
+    def raw(self):
+        return self._entry.raw
+
+    def close(self) -> None:
+        """Return the connection to the pool (idempotent)."""
+        if not self._released:
+            object.__setattr__(self, "_released", True)
+            self._pool._release(self._entry)
+
+    def discard(self) -> None:
+        """Close the underlying socket instead of returning it to the pool."""
+        if not self._released:
+            object.__setattr__(self, "_released", True)
+            self._pool._release(self._entry, discard=True)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._entry.raw, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._entry.raw, name, value)
+
+    # psycopg2 semantics: `with conn:` wraps a transaction, it does not close
+    def __enter__(self):
+        self._entry.raw.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._entry.raw.__exit__(exc_type, exc, tb)
+
+    def __del__(self):
+        try:
+            if not self._released:
+                logger.warning("PgPool[%s]: connection garbage-collected without close()",
+                               self._pool.name)
+                self.close()
+        except Exception:
+            pass
+
+
+class PgPool:
+    """
+    Bounded pool of psycopg2 connections.
+
+      connect              — zero-arg factory returning a new psycopg2 connection
+      min_size / max_size  — warm connections kept open / hard cap on sockets
+      timeout              — seconds a checkout may wait for a free slot
+      statement_timeout_ms — default per-checkout statement_timeout (0 = none)
+      max_idle             — idle connections above min_size are closed after this
+      max_lifetime         — connections are recycled after this many seconds
+      reserve / unreserve  — optional hooks called as sockets are opened / closed;
+                             reserve() returning False blocks growth (used by
+                             PgPoolRegistry to enforce a process-wide socket cap)
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        *,
+        name: str = "pg",
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        statement_timeout_ms: int = 0,
+        max_idle: float = 300.0,
+        max_lifetime: float = 1800.0,
+        reserve: Optional[Callable[[], bool]] = None,
+        unreserve: Optional[Callable[[], None]] = None,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self.name                 = name
+        self.min_size             = max(0, min(min_size, max_size))
+        self.max_size             = max_size
+        self.timeout              = timeout
+        self.statement_timeout_ms = statement_timeout_ms
+        self.max_idle             = max_idle
+        self.max_lifetime         = max_lifetime
+
+        self._connect   = connect
+        self._reserve   = reserve or (lambda: True)
+        self._unreserve = unreserve or (lambda: None)
+        self._cond    = threading.Condition(threading.RLock())
+        self._idle: List[_Entry] = []   # LIFO — hottest connection on top
+        self._size    = 0               # open + being-opened connections
+        self._in_use  = 0
+        self._waiting = 0
+        self._closed  = False
+
+        # metrics
+        self._checkouts        = 0
+        self._created          = 0
+        self._discarded        = 0
+        self._health_failures  = 0
+        self._timeouts         = 0
+        self._wait_ms_total    = 0.0
+        self._wait_ms_max      = 0.0
+        self._last_used        = time.monotonic()
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def open(self) -> None:
+        """Pre-open min_size connections. Failures are logged, not raised."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size or not self._reserve():
+                    return
+                self._size += 1
+            try:
+                raw = self._connect()
+            except Exception as exc:
+                with self._cond:
+                    self._shrink_locked(1)
+                    self._cond.notify()
+                logger.warning("PgPool[%s]: warm-up connect failed: %s", self.name, exc)
+                return
+            now = time.monotonic()
+            with self._cond:
+                self._created += 1
+                self._idle.append(_Entry(raw, now))
+                self._cond.notify()
+
+    def close(self) -> None:
+        """Close idle connections and refuse new checkouts.
+        Connections still checked out are closed when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._shrink_locked(len(idle))
+            self._cond.notify_all()
+        for e in idle:
+            self._close_raw(e.raw)
+
+    # ── Checkout / release ────────────────────────────────────────────────
+    def getconn(
+        self,
+        cursor_factory=None,
+        statement_timeout_ms: Optional[int] = None,
+    ) -> PooledConnection:
+        """
+        Check out a connection. Blocks up to `timeout` seconds when the pool
+        is at max_size; raises PoolTimeout after that.
+        """
+        t0 = time.monotonic()
+        deadline = t0 + self.timeout
+        entry: Optional[_Entry] = None
+        to_close: List[_Entry] = []
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolClosed(f"PgPool[{self.name}] is closed")
+                to_close.extend(self._prune_idle_locked(time.monotonic()))
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                at_cap = self._size >= self.max_size
+                if not at_cap and self._reserve():
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"PgPool[{self.name}]: no connection available within "
+                        f"{self.timeout:.1f}s ({self._in_use}/{self.max_size} in use)"
+                    )
+                self._waiting += 1
+                try:
+                    # blocked by the external cap: sockets freed elsewhere do
+                    # not notify this pool, so re-check periodically
+                    self._cond.wait(remaining if at_cap else min(remaining, 0.05))
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        for e in to_close:
+            self._close_raw(e.raw)
+
+        try:
+            entry = self._ready(entry, statement_timeout_ms)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._shrink_locked(1)
+                self._cond.notify()
+            raise
+
+        entry.raw.cursor_factory = cursor_factory
+        waited_ms = (time.monotonic() - t0) * 1000
+        with self._cond:
+            self._checkouts     += 1
+            self._wait_ms_total += waited_ms
+            self._wait_ms_max    = max(self._wait_ms_max, waited_ms)
+            self._last_used      = time.monotonic()
+        return PooledConnection(self, entry)
+
+    def _ready(self, entry: Optional[_Entry], statement_timeout_ms: Optional[int]) -> _Entry:
+        """Health-check a reused connection (or open a new one) and apply
+        statement_timeout. A dead reused connection is replaced once."""
+        timeout = self.statement_timeout_ms if statement_timeout_ms is None else statement_timeout_ms
+        if entry is not None:
+            try:
+                self._apply_session(entry.raw, timeout)
+                return entry
+            except Exception as exc:
+                logger.info("PgPool[%s]: dropping dead connection (%s)", self.name, exc)
+                with self._cond:
+                    self._health_failures += 1
+                    self._discarded += 1
+                self._close_raw(entry.raw)
+
+        raw = self._connect()
+        with self._cond:
+            self._created += 1
+        entry = _Entry(raw, time.monotonic())
+        try:
+            self._apply_session(raw, timeout)
+        except Exception:
+            self._close_raw(raw)
+            raise
+        return entry
+
+    @staticmethod
+    def _apply_session(raw, statement_timeout_ms: int) -> None:
+        # autocommit so the setting sticks without an extra COMMIT round trip
+        raw.autocommit = True
+        try:
+            with raw.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute(
+                    "SELECT set_config('statement_timeout', %s, false)",
+                    (str(int(statement_timeout_ms or 0)),),
+                )
+        finally:
+            raw.autocommit = False
+
+    def _release(self, entry: _Entry, discard: bool = False) -> None:
+        raw = entry.raw
+        now = time.monotonic()
+        if not discard:
+            discard = (
+                self._closed
+                or raw.closed
+                or (self.max_lifetime and now - entry.created_at > self.max_lifetime)
+            )
+        if not discard:
+            try:
+                status = raw.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._shrink_locked(1)
+                self._discarded += 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+        if discard:
+            self._close_raw(raw)
+
+    def _shrink_locked(self, n: int) -> None:
+        self._size -= n
+        for _ in range(n):
+            self._unreserve()
+
+    def _prune_idle_locked(self, now: float, max_idle: Optional[float] = None) -> List[_Entry]:
+        """Drop idle connections beyond min_size that sat unused too long
+        (oldest sit at the bottom of the LIFO stack). Caller holds the lock."""
+        max_idle = self.max_idle if max_idle is None else max_idle
+        pruned: List[_Entry] = []
+        while self._idle and self._size > self.min_size:
+            oldest = self._idle[0]
+            if now - oldest.last_used <= max_idle:
+                break
+            pruned.append(self._idle.pop(0))
+            self._shrink_locked(1)
+            self._discarded += 1
+        return pruned
+
+    def reap_idle(self, max_idle: Optional[float] = None) -> int:
+        """Close idle connections unused for longer than max_idle (defaults
+        to the pool's setting; 0 closes every idle connection above min_size).
+        Returns how many were closed."""
+        with self._cond:
+            pruned = self._prune_idle_locked(time.monotonic(), max_idle)
+        for e in pruned:
+            self._close_raw(e.raw)
+        return len(pruned)
+
+    @staticmethod
+    def _close_raw(raw) -> None:
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    # ── Metrics ───────────────────────────────────────────────────────────
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    @property
+    def idle_seconds(self) -> float:
+        """Seconds since the last checkout (used for LRU decisions)."""
+        return time.monotonic() - self._last_used
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "name":                  self.name,
+                "min_size":              self.min_size,
+                "max_size":              self.max_size,
+                "size":                  self._size,
+                "in_use":                self._in_use,
+                "idle":                  len(self._idle),
+                "waiting":               self._waiting,
+                "checkouts":             checkouts,
+                "connections_created":   self._created,
+                "connections_discarded": self._discarded,
+                "health_check_failures": self._health_failures,
+                "checkout_timeouts":     self._timeouts,
+                "wait_ms_avg":           round(self._wait_ms_total / checkouts, 2) if checkouts else 0.0,
+                "wait_ms_max":           round(self._wait_ms_max, 2),
+                "statement_timeout_ms":  self.statement_timeout_ms,
+            }
+
+
+# ── Per-target pools ──────────────────────────────────────────────────────────
+def normalize_dsn(dsn: str) -> Dict[str, str]:
+    """
+    Parse a libpq URI or key=value DSN into a canonical dict so equivalent
+    spellings (postgres:// vs postgresql://, host case, implicit port,
+    parameter order) map to the same pool.
+    """
+    params = dict(psycopg2.extensions.parse_dsn(dsn))
+    if params.get("host"):
+        params["host"] = params["host"].lower()
+    params.setdefault("port", "5432")
+    return params
+
+
+def dsn_key(dsn: str) -> str:
+    """Credential-safe pool key: sha256 of the normalized DSN."""
+    params = normalize_dsn(dsn)
+    canonical = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def dsn_tag(key: str) -> str:
+    """Opaque target name for logs and metrics (dsn_key prefix — no host, user or db)."""
+    return f"target:{key[:12]}"
+
+
+class PgPoolRegistry:
+    """
+    LRU registry of small PgPools, one per user-supplied connection string.
+
+      max_pools     — distinct targets kept; the least recently used is closed
+      max_sockets   — process-wide cap on open connections across all pools
+      per_pool_max  — max connections per target
+      idle_ttl      — idle connections (and then empty pools) are reaped after this
+
+    Pools are keyed by dsn_key(), so raw credentials never sit in the
+    registry's keys, logs or metrics.
+    """
+
+    _REAP_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        *,
+        max_pools: int = 32,
+        max_sockets: int = 64,
+        per_pool_max: int = 4,
+        timeout: float = 10.0,
+        idle_ttl: float = 300.0,
+        statement_timeout_ms: int = 0,
+        connect_timeout: int = 8,
+    ):
+        self.max_pools            = max_pools
+        self.max_sockets          = max_sockets
+        self.per_pool_max         = per_pool_max
+        self.timeout              = timeout
+        self.idle_ttl             = idle_ttl
+        self.statement_timeout_ms = statement_timeout_ms
+        self.connect_timeout      = connect_timeout
+
+        self._lock    = threading.Lock()
+        self._pools: "OrderedDict[str, PgPool]" = OrderedDict()
+        self._sockets = 0
+        self._last_reap = time.monotonic()
+        self._closed  = False
+
+        self._hits      = 0
+        self._misses    = 0
+        self._evictions = 0
+
+    # ── socket accounting (called by pools under their own lock) ──────────
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._sockets >= self.max_sockets:
+                return False
+            self._sockets += 1
+            return True
+
+    def _unreserve(self) -> None:
+        with self._lock:
+            self._sockets -= 1
+
+    def reserve_socket(self) -> bool:
+        """
+        Count a socket opened outside this registry (the asyncpg pools)
+        against max_sockets; idle connections in the pools here are closed
+        to make room. release_socket() once that socket is closed.
+        """
+        if self._reserve():
+            return True
+        self._reclaim(exclude=None)
+        return self._reserve()
+
+    def release_socket(self) -> None:
+        self._unreserve()
+
+    # ── public API ────────────────────────────────────────────────────────
+    def getconn(
+        self,
+        dsn: str,
+        cursor_factory=None,
+        statement_timeout_ms: Optional[int] = None,
+    ) -> PooledConnection:
+        pool = self._pool_for(dsn)
+        self._maybe_reap()
+        if pool.idle_count == 0 and self._sockets >= self.max_sockets:
+            self._reclaim(exclude=pool)
+        return pool.getconn(cursor_factory=cursor_factory,
+                            statement_timeout_ms=statement_timeout_ms)
+
+    def free_slots(self, dsn: str) -> int:
+        """Connections to dsn that getconn() could hand out right now without waiting."""
+        with self._lock:
+            pool = self._pools.get(dsn_key(dsn))
+            sockets_free = max(0, self.max_sockets - self._sockets)
+        if pool is None or pool.closed:
+            return min(self.per_pool_max, sockets_free)
+        return pool.idle_count + max(0, min(pool.max_size - pool.size, sockets_free))
+
+    def _pool_for(self, dsn: str) -> PgPool:
+        key = dsn_key(dsn)
+        evicted: List[PgPool] = []
+        with self._lock:
+            if self._closed:
+                raise PoolClosed("PgPoolRegistry is closed")
+            pool = self._pools.get(key)
+            if pool is not None and not pool.closed:
+                self._pools.move_to_end(key)
+                self._hits += 1
+                return pool
+
+            self._misses += 1
+            timeout = self.connect_timeout
+            pool = PgPool(
+                lambda: psycopg2.connect(dsn, connect_timeout=timeout),
+                name=dsn_tag(key),
+                min_size=0,
+                max_size=self.per_pool_max,
+                timeout=self.timeout,
+                statement_timeout_ms=self.statement_timeout_ms,
+                max_idle=self.idle_ttl,
+                reserve=self._reserve,
+                unreserve=self._unreserve,
+            )
+            self._pools[key] = pool
+            while len(self._pools) > self.max_pools:
+                _, old = self._pools.popitem(last=False)
+                self._evictions += 1
+                evicted.append(old)
+
+        for old in evicted:
+            logger.info("PgPoolRegistry: evicting LRU pool %s", old.name)
+            old.close()
+        return pool
+
+    def _reclaim(self, exclude: Optional[PgPool]) -> None:
+        """At the socket cap: close idle connections in other pools, least
+        recently used first, until one slot is free."""
+        with self._lock:
+            candidates = [p for p in self._pools.values() if p is not exclude]
+        for p in candidates:
+            if self._sockets < self.max_sockets:
+                return
+            p.reap_idle(0)
+
+    def _maybe_reap(self) -> None:
+        now = time.monotonic()
+        if now - self._last_reap < self._REAP_INTERVAL:
+            return
+        self._last_reap = now
+        self.reap_idle()
+
+    def reap_idle(self) -> int:
+        """Close idle connections past idle_ttl and drop pools left empty."""
+        with self._lock:
+            pools = list(self._pools.items())
+        closed = sum(p.reap_idle() for _, p in pools)
+        dead: List[PgPool] = []
+        with self._lock:
+            for key, p in pools:
+                if p.size == 0 and p.idle_seconds > self.idle_ttl and self._pools.get(key) is p:
+                    del self._pools[key]
+                    dead.append(p)
+        for p in dead:
+            p.close()
+        return closed
+
+    def close_all(self) -> None:
+        with self._lock:
+            self._closed = True
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for p in pools:
+            p.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = list(self._pools.values())
+            lookups = self._hits + self._misses
+            summary = {
+                "pools":        len(pools),
+                "max_pools":    self.max_pools,
+                "open_sockets": self._sockets,
+                "max_sockets":  self.max_sockets,
+                "pool_hits":    self._hits,
+                "pool_misses":  self._misses,
+                "hit_rate":     round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions":    self._evictions,
+            }
+        summary["targets"] = [p.stats() for p in pools]
+        return summary
@@ -1,8 +1,15 @@
 import os
+import threading
+from typing import Any, Dict, Optional
+
 import psycopg2
 
+from app.core.config import DB_PORT
+from app.core.pg_async_pool import AsyncPgPoolRegistry
+from app.core.pg_pool import PgPool, PgPoolRegistry, PooledConnection, normalize_dsn
+
 
-def get_conn():
+def _connect():
     host = os.getenv("DB_HOST", "127.0.0.1")
     password = os.getenv("DB_PASS", os.getenv("DB_PASSWORD", "da_pass"))
     # Unix socket path (Cloud Run Cloud SQL proxy)
@@ -11,13 +18,155 @@ def get_conn():
             f"host={host} "
             f"dbname={os.getenv('DB_NAME', 'da_db')} "
             f"user={os.getenv('DB_USER', 'da_user')} "
-            f"password={password}"
+            f"password={password} "
+            f"connect_timeout=8"
         )
         return psycopg2.connect(dsn)
     return psycopg2.connect(
         host=host,
-        port=int(os.getenv("DB_PORT", "5432")),
+        port=DB_PORT,
         dbname=os.getenv("DB_NAME", "da_db"),
         user=os.getenv("DB_USER", "da_user"),
         password=password,
+        connect_timeout=8,
+    )
+
+
+# ── System DB pool ────────────────────────────────────────────────────────────
+# Created lazily on first checkout (auth bootstraps its tables at import time,
+# before the FastAPI lifespan runs) and warmed / closed by the lifespan hook.
+_pool: Optional[PgPool] = None
+_pool_lock = threading.Lock()
+
+
+def init_pool() -> PgPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = PgPool(
+                _connect,
+                name="system",
+                min_size=int(os.getenv("DB_POOL_MIN", "1")),
+                max_size=int(os.getenv("DB_POOL_MAX", "10")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "60000")),
+                max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+            )
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_conn(cursor_factory=None, statement_timeout_ms: Optional[int] = None) -> PooledConnection:
+    """
+    Check out a connection to the system database from the shared pool.
+    conn.close() returns it to the pool. statement_timeout_ms overrides the
+    pool default for this checkout only (0 disables the timeout).
+    """
+    pool = _pool if _pool is not None and not _pool.closed else init_pool()
+    return pool.getconn(cursor_factory=cursor_factory,
+                        statement_timeout_ms=statement_timeout_ms)
+
+
+# ── User-supplied pg_uri targets ─────────────────────────────────────────────
+_registry: Optional[PgPoolRegistry] = None
+
+
+def _get_registry() -> PgPoolRegistry:
+    global _registry
+    with _pool_lock:
+        if _registry is None:
+            _registry = PgPoolRegistry(
+                max_pools=int(os.getenv("PG_TARGET_POOLS_MAX", "32")),
+                max_sockets=int(os.getenv("PG_TARGET_SOCKETS_MAX", "64")),
+                per_pool_max=int(os.getenv("PG_TARGET_POOL_SIZE", "4")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                idle_ttl=float(os.getenv("PG_TARGET_IDLE_TTL", "300")),
+            )
+        return _registry
+
+
+def get_uri_conn(pg_uri: str, cursor_factory=None,
+                 statement_timeout_ms: Optional[int] = None) -> PooledConnection:
+    """
+    Check out a pooled connection to a user-supplied PostgreSQL URI.
+    Repeated requests against the same database reuse warm connections.
+    """
+    return _get_registry().getconn(pg_uri, cursor_factory=cursor_factory,
+                                   statement_timeout_ms=statement_timeout_ms)
+
+
+def is_system_uri(pg_uri: str) -> bool:
+    """True when pg_uri points at the system database (same host, port, db and user)."""
+    try:
+        p = normalize_dsn(pg_uri)
+    except Exception:
+        return False
+    return ((p.get("host") or "").lower(), p.get("port"), p.get("dbname"), p.get("user")) == (
+        os.getenv("DB_HOST", "127.0.0.1").lower(), str(DB_PORT),
+        os.getenv("DB_NAME", "da_db"), os.getenv("DB_USER", "da_user"),
     )
+
+
+def uri_pool_free(pg_uri: str) -> int:
+    """How many more connections to pg_uri can be checked out without waiting."""
+    return _get_registry().free_slots(pg_uri)
+
+
+def close_uri_pools() -> None:
+    global _registry
+    with _pool_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        registry.close_all()
+
+
+# ── User-supplied pg_uri targets, async pipeline (asyncpg) ───────────────────
+_async_registry: Optional[AsyncPgPoolRegistry] = None
+
+
+def _get_async_registry() -> AsyncPgPoolRegistry:
+    global _async_registry
+    if _async_registry is not None:
+        return _async_registry
+    registry = _get_registry()
+    with _pool_lock:
+        if _async_registry is None:
+            _async_registry = AsyncPgPoolRegistry(
+                max_pools=int(os.getenv("PG_TARGET_POOLS_MAX", "32")),
+                per_pool_max=int(os.getenv("PG_ASYNC_POOL_SIZE", "10")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                idle_ttl=float(os.getenv("PG_TARGET_IDLE_TTL", "300")),
+                # asyncpg sockets count against the same PG_TARGET_SOCKETS_MAX
+                reserve=registry.reserve_socket,
+                unreserve=registry.release_socket,
+            )
+        return _async_registry
+
+
+def get_uri_aconn(pg_uri: str, statement_timeout_ms: Optional[int] = None):
+    """
+    Async counterpart of get_uri_conn():
+
+        async with get_uri_aconn(pg_uri) as conn:
+            rows = await conn.fetch(sql)
+    """
+    return _get_async_registry().acquire(pg_uri, statement_timeout_ms=statement_timeout_ms)
+
+
+async def close_uri_apools() -> None:
+    if _async_registry is not None:
+        await _async_registry.close_loop_pools()
+
+
+def pool_stats() -> Dict[str, Any]:
+    system = _pool.stats() if _pool is not None else {"name": "system", "size": 0, "in_use": 0, "idle": 0}
+    targets = _registry.stats() if _registry is not None else {"pools": 0, "open_sockets": 0}
+    async_targets = _async_registry.stats() if _async_registry is not None else {"pools": 0}
+    return {"system": system, "targets": targets, "async_targets": async_targets}
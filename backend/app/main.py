@@ -9,12 +9,11 @@ load_dotenv()  # loads backend/.env into environment
 from contextlib import asynccontextmanager
 from typing import Any, Optional
 
-import motor.motor_asyncio
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routes.auth              import router as auth_router
+from app.api.routes.auth              import get_current_user, router as auth_router
 from app.api.routes.history           import router as history_router
 from app.api.routes.mongo             import router as mongo_router
 from app.api.routes.pg_query          import router as pg_router
@@ -25,6 +24,11 @@ from app.api.routes.mysql_routes      import router as mysql_router
 from app.api.routes.swarm             import router as swarm_router
 from app.api.routes.benchmark         import router as benchmark_router
 from app.api.routes.plugin            import router as plugin_router
+from app.core.fast_json               import FastJSONResponse
+from app.services.mongo_clients       import (
+    client_stats, close_all_clients, get_motor_client, release_client,
+)
+from app.services.mysql_service       import close_mysql_pools, mysql_pool_stats
 
 
 logger = logging.getLogger(__name__)
@@ -32,16 +36,29 @@ logger = logging.getLogger(__name__)
 # ── Startup / shutdown ────────────────────────────────────────────────────────
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Warm-up: open the system DB pool's min connections (non-fatal)
+    from app.db import init_pool, close_pool, close_uri_pools, close_uri_apools
+    init_pool().open()
+
     # Warm-up: verify MongoDB reachability (non-fatal)
     mongo_uri = os.getenv("MONGO_URI", "")
     if mongo_uri:
+        client = None
         try:
-            client = motor.motor_asyncio.AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=3000)
+            client = get_motor_client(mongo_uri)
             await client.admin.command("ping")
             logger.info("MongoDB connected")
         except Exception as exc:
             logger.warning(f"MongoDB not reachable at startup: {exc}")
+        finally:
+            if client is not None:
+                release_client(client)
     yield
+    close_pool()
+    close_uri_pools()
+    await close_uri_apools()
+    close_all_clients()
+    close_mysql_pools()
 
 
 # ── App ───────────────────────────────────────────────────────────────────────
@@ -50,6 +67,7 @@ app = FastAPI(
     version="2.0.0",
     description="Multi-agent natural language database assistant",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -81,6 +99,8 @@ async def unhandled_exception_handler(request: Request, exc: Exception) -> JSONR
 
 
 # ── Health / ops endpoints ────────────────────────────────────────────────────
+# /health and the */ping probes stay open for load balancers. Pool, cache
+# and LLM stats describe other users' traffic, so they require a signed-in user.
 @app.get("/health", tags=["ops"])
 def health():
     return {"status": "ok", "version": "2.0.0"}
@@ -97,17 +117,67 @@ def db_ping():
         raise HTTPException(status_code=503, detail=f"PostgreSQL unreachable: {exc}")
 
 
+@app.get("/db/pool", tags=["ops"])
+def db_pool(user=Depends(get_current_user)):
+    from app.db import pool_stats
+    return pool_stats()
+
+
+@app.get("/db/schema-cache", tags=["ops"])
+def db_schema_cache(user=Depends(get_current_user)):
+    from app.services.schema_cache import schema_cache
+    return schema_cache.stats()
+
+
+@app.get("/db/result-cache", tags=["ops"])
+def db_result_cache(user=Depends(get_current_user)):
+    from app.services.result_cache import result_cache
+    return result_cache.stats()
+
+
 @app.get("/mongo/ping", tags=["ops"])
 async def mongo_ping():
     mongo_uri = os.getenv("MONGO_URI", "")
     if not mongo_uri:
         raise HTTPException(status_code=503, detail="MONGO_URI not configured")
+    client = None
     try:
-        client = motor.motor_asyncio.AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=3000)
+        client = get_motor_client(mongo_uri)
         await client.admin.command("ping")
         return {"status": "ok", "message": "MongoDB reachable"}
     except Exception as exc:
         raise HTTPException(status_code=503, detail=f"MongoDB unreachable: {exc}")
+    finally:
+        if client is not None:
+            release_client(client)
+
+
+@app.get("/mongo/pool", tags=["ops"])
+def mongo_pool(user=Depends(get_current_user)):
+    return client_stats()
+
+
+@app.get("/mysql/pool", tags=["ops"])
+def mysql_pool(user=Depends(get_current_user)):
+    return mysql_pool_stats()
+
+
+@app.get("/llm/stats", tags=["ops"])
+def llm_client_stats(user=Depends(get_current_user)):
+    from app.services.llm_client import llm_stats
+    return llm_stats()
+
+
+@app.get("/llm/sql-cache", tags=["ops"])
+def llm_sql_cache(user=Depends(get_current_user)):
+    from app.services.sql_cache import sql_cache
+    return sql_cache.stats()
+
+
+@app.get("/llm/sql-templates", tags=["ops"])
+def llm_sql_templates(user=Depends(get_current_user)):
+    from app.services.sql_templates import template_cache
+    return template_cache.stats()
 
 
 # ── Open Claude Plugin ────────────────────────────────────────────────
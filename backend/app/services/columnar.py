@@ -0,0 +1,142 @@
+# backend/app/services/columnar.py
+"""
+Columnar query results.
+
+Results used to travel as List[Dict[str, Any]]: every row repeats every
+column name, which roughly doubles memory (and JSON size) for wide
+results. ColumnarResult keeps one list per column and, once a fetch is
+complete, packs NULL-free int / float / bool columns into NumPy arrays.
+
+It is a read-only Sequence of dict rows, so code that does len(rows),
+rows[0], rows[:5] or `for row in rows` keeps working unchanged; the
+profiling / insight / viz agents read whole columns instead (column(),
+numeric()).
+
+Response formats (request field "format"):
+  rows      — legacy: "data": [{col: value, ...}, ...]          (default)
+  columnar  — "rows": [[value, ...], ...] in "columns" order
+  arrays    — "arrays": {col: [value, ...]}
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+
+FORMATS = ("rows", "columnar", "arrays")
+
+_PACKED = {int: np.int64, float: np.float64, bool: np.bool_}
+
+
+def _pack(values: List[Any]) -> Union[List[Any], np.ndarray]:
+    """NumPy array for a NULL-free column of one scalar type, else the list."""
+    if not values:
+        return values
+    kind = type(values[0])
+    dtype = _PACKED.get(kind)
+    if dtype is None or any(type(v) is not kind for v in values):
+        return values
+    try:
+        return np.array(values, dtype=dtype)
+    except OverflowError:           # ints beyond int64 stay Python ints
+        return values
+
+
+class ColumnarResult(Sequence):
+    """Column names plus one value array per column."""
+
+    __slots__ = ("columns", "_data")
+
+    def __init__(self, columns: Iterable[str] = (), data: Optional[List[Any]] = None):
+        self.columns: List[str] = list(columns)
+        self._data: List[Any] = data if data is not None else [[] for _ in self.columns]
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict[str, Any]],
+                   columns: Optional[List[str]] = None) -> "ColumnarResult":
+        rows = list(rows)
+        if columns is None:
+            columns = list(rows[0].keys()) if rows else []
+        table = cls(columns, [[row.get(c) for row in rows] for c in columns])
+        return table.freeze()
+
+    def append(self, values: Iterable[Any]) -> None:
+        for column, v in zip(self._data, values):
+            column.append(v)
+
+    def freeze(self) -> "ColumnarResult":
+        """Pack the columns that fit a NumPy dtype (call once rows stop arriving)."""
+        self._data = [_pack(c) if isinstance(c, list) else c for c in self._data]
+        return self
+
+    # ── Sequence of dict rows (legacy access) ────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self._data[0]) if self._data else 0
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._row(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("row index out of range")
+        return self._row(i)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for values in zip(*self._lists()):
+            yield dict(zip(self.columns, values))
+
+    def __repr__(self) -> str:
+        return f"ColumnarResult({len(self)} rows × {len(self.columns)} cols)"
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        return {c: (d[i].item() if isinstance(d, np.ndarray) else d[i])
+                for c, d in zip(self.columns, self._data)}
+
+    def _lists(self) -> List[List[Any]]:
+        return [d.tolist() if isinstance(d, np.ndarray) else d for d in self._data]
+
+    # ── Column access ───────────────────────────────────────────────────
+
+    def column(self, name: str) -> List[Any]:
+        """Values of one column as plain Python objects."""
+        d = self._data[self.columns.index(name)]
+        return d.tolist() if isinstance(d, np.ndarray) else d
+
+    def numeric(self, name: str) -> Optional[np.ndarray]:
+        """The column as a NumPy array when it was packed as int / float, else None."""
+        d = self._data[self.columns.index(name)]
+        if isinstance(d, np.ndarray) and d.dtype.kind in "if":
+            return d
+        return None
+
+    # ── Output ──────────────────────────────────────────────────────────
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def to_rows(self, start: int = 0, stop: Optional[int] = None) -> List[List[Any]]:
+        lists = [d[start:stop].tolist() if isinstance(d, np.ndarray) else d[start:stop]
+                 for d in self._data]
+        return [list(values) for values in zip(*lists)]
+
+    def to_arrays(self) -> Dict[str, List[Any]]:
+        return dict(zip(self.columns, self._lists()))
+
+
+def as_table(rows: Any, columns: Optional[List[str]] = None) -> ColumnarResult:
+    """rows as a ColumnarResult — as is when it already is one, else from dict rows."""
+    if isinstance(rows, ColumnarResult):
+        return rows
+    return ColumnarResult.from_dicts(rows or [], columns or None)
+
+
+def response_data(rows: Any, fmt: str = "rows") -> Dict[str, Any]:
+    """The result-rows part of an API response in the requested format."""
+    if fmt == "columnar":
+        return {"format": "columnar", "rows": as_table(rows).to_rows()}
+    if fmt == "arrays":
+        return {"format": "arrays", "arrays": as_table(rows).to_arrays()}
+    return {"data": rows.to_dicts() if isinstance(rows, ColumnarResult) else rows}
@@ -0,0 +1,241 @@
+# backend/app/services/enum_discovery.py
+"""
+Categorical (enum-like) value discovery for PostgreSQL schemas.
+
+ENUM_DISCOVERY_MODE=stats (default)
+  1. One pg_stats query for the whole schema: columns whose n_distinct is
+     small are treated as categorical and their most_common_vals are used
+     directly — no table is touched.
+  2. Name-hinted columns (ENUM_COLS) on tables without statistics are
+     probed with TABLESAMPLE SYSTEM on large tables, or a bounded head scan
+     on small ones — on the caller's connection, plus pooled connections
+     the target's pool can spare.
+
+ENUM_DISCOVERY_MODE=distinct
+  Legacy behaviour: SELECT DISTINCT … LIMIT 20 for every name-hinted column,
+  still bounded-parallel.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import psycopg2.extensions
+import psycopg2.extras
+
+from app.db import get_uri_conn, uri_pool_free
+
+logger = logging.getLogger("db_assistant.enum_discovery")
+
+ENUM_DISCOVERY_MODE = os.getenv("ENUM_DISCOVERY_MODE", "stats").lower()
+MAX_VALUES          = 20                                             # values kept per column
+MAX_ENUM_COLUMNS    = int(os.getenv("ENUM_MAX_COLUMNS", "200"))      # columns kept per database
+PROBE_WORKERS       = int(os.getenv("ENUM_PROBE_WORKERS", "4"))
+PROBE_TIMEOUT_MS    = int(os.getenv("ENUM_PROBE_TIMEOUT_MS", "5000"))
+SAMPLE_PERCENT      = float(os.getenv("ENUM_SAMPLE_PERCENT", "1"))
+_LARGE_TABLE_ROWS   = 100_000
+_PROBE_ROW_CAP      = 50_000
+
+_TEXTUAL_TYPES = ("text", "character", "char", "citext", "name", "boolean")
+
+_STATS_SQL = r"""
+    SELECT DISTINCT ON (schemaname, tablename, attname)
+           schemaname, tablename, attname, n_distinct,
+           most_common_vals::text::text[] AS mcv
+    FROM pg_stats
+    WHERE schemaname NOT IN ('pg_catalog', 'information_schema')
+      AND schemaname NOT LIKE 'pg\_toast%%'
+      AND schemaname = ANY(%s)
+    ORDER BY schemaname, tablename, attname, inherited DESC
+"""
+
+
+def _is_categorical(col: Dict[str, Any]) -> bool:
+    """Text-like column, or a native enum (pg_catalog marks those is_enum: format_type()
+    gives the enum's own name; information_schema calls it USER-DEFINED)."""
+    t = (col.get("pg_type") or "").lower()
+    return bool(col.get("is_enum")) or t.startswith(_TEXTUAL_TYPES) or t == "user-defined"
+
+
+def _quote_fqn(fqn: str) -> str:
+    schema, _, table = fqn.partition(".")
+    return f'"{schema}"."{table}"'
+
+
+def _load_stats(conn, schemas: Iterable[str]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(_STATS_SQL, (list(schemas),))
+        return {
+            (f"{r['schemaname']}.{r['tablename']}", r["attname"]): {
+                "n_distinct": r["n_distinct"],
+                "mcv":        r["mcv"],
+            }
+            for r in cur.fetchall()
+        }
+
+
+def _estimated_distinct(n_distinct: Optional[float], approx_rows: Optional[int]) -> Optional[float]:
+    """pg_stats.n_distinct is absolute when > 0 and a fraction of rows when < 0."""
+    if n_distinct is None:
+        return None
+    if n_distinct > 0:
+        return n_distinct
+    if n_distinct < 0 and approx_rows:
+        return -n_distinct * approx_rows
+    return None
+
+
+def _probe_sqls(fqn: str, col: str, approx_rows: Optional[int], legacy: bool) -> List[str]:
+    """Queries that fetch up to MAX_VALUES distinct values without a full scan of a large table."""
+    qcol, qtbl = f'"{col}"', _quote_fqn(fqn)
+    head_sql = (
+        f"SELECT DISTINCT {qcol} AS v FROM "
+        f"(SELECT {qcol} FROM {qtbl} WHERE {qcol} IS NOT NULL LIMIT {_PROBE_ROW_CAP}) s "
+        f"LIMIT {MAX_VALUES}"
+    )
+    if legacy:
+        return [f"SELECT DISTINCT {qcol} AS v FROM {qtbl} WHERE {qcol} IS NOT NULL LIMIT {MAX_VALUES}"]
+    if approx_rows is None or approx_rows > _LARGE_TABLE_ROWS:
+        sample_sql = (
+            f"SELECT DISTINCT {qcol} AS v FROM "
+            f"(SELECT {qcol} FROM {qtbl} TABLESAMPLE SYSTEM ({SAMPLE_PERCENT}) "
+            f"WHERE {qcol} IS NOT NULL LIMIT {_PROBE_ROW_CAP}) s "
+            f"LIMIT {MAX_VALUES}"
+        )
+        # page sampling can come back empty on small or skewed tables
+        return [sample_sql, head_sql]
+    return [head_sql]
+
+
+def _probe(conn, fqn: str, col: str, sqls: List[str]) -> List[str]:
+    """
+    Run the probe queries on conn inside a savepoint with a local
+    statement_timeout. The savepoint is always rolled back, so the timeout
+    and any error are undone and the caller's transaction is left as it was.
+    A failed or timed-out query moves on to the next one (the head scan
+    after TABLESAMPLE).
+    """
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    except Exception as exc:
+        logger.debug("enum probe %s.%s: no cursor: %s", fqn, col, exc)
+        return []
+    with cur:
+        for sql in sqls:
+            try:
+                cur.execute("SAVEPOINT enum_probe")
+                try:
+                    cur.execute("SELECT set_config('statement_timeout', %s, true)",
+                                (str(PROBE_TIMEOUT_MS),))
+                    cur.execute(sql)
+                    vals = [str(r[0]) for r in cur.fetchall() if r[0] is not None]
+                finally:
+                    cur.execute("ROLLBACK TO SAVEPOINT enum_probe")
+                    cur.execute("RELEASE SAVEPOINT enum_probe")
+            except Exception as exc:
+                logger.debug("enum probe %s.%s failed: %s", fqn, col, exc)
+                continue
+            if vals:
+                return vals
+    return []
+
+
+def _probe_batch(pg_uri: str, jobs: List[Tuple[str, str, List[str]]]) -> Optional[List[List[str]]]:
+    """Probe jobs on one pooled connection; None when no connection could be had."""
+    try:
+        conn = get_uri_conn(pg_uri)
+    except Exception as exc:
+        logger.debug("enum probes: no pooled connection (%s)", exc)
+        return None
+    try:
+        return [_probe(conn, fqn, col, sqls) for fqn, col, sqls in jobs]
+    finally:
+        conn.close()
+
+
+def discover_enum_values(
+    conn,
+    pg_uri: str,
+    tables_schema: Dict[str, List[Dict]],
+    table_stats: Optional[Dict[str, Dict[str, Any]]] = None,
+    name_hints: Iterable[str] = (),
+) -> Tuple[Dict[str, List[str]], Dict[str, Any]]:
+    """
+    Returns ({"fqn.col": [values]}, metrics). `conn` is used for the single
+    pg_stats read and for probes; up to PROBE_WORKERS - 1 further probe
+    workers run on pooled connections to pg_uri that are idle or can be
+    opened without waiting.
+    """
+    t0 = time.perf_counter()
+    table_stats = table_stats or {}
+    hints = set(name_hints)
+    legacy = ENUM_DISCOVERY_MODE == "distinct"
+
+    found: Dict[str, Tuple[float, List[str]]] = {}   # key -> (rank, values)
+    from_stats = set()
+    to_probe: List[Tuple[str, str, Optional[int]]] = []
+
+    stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    if not legacy and tables_schema:
+        try:
+            stats = _load_stats(conn, {fqn.split(".", 1)[0] for fqn in tables_schema})
+        except Exception as exc:
+            logger.warning("pg_stats unavailable, falling back to probes: %s", exc)
+            conn.rollback()
+
+    for fqn, cols in tables_schema.items():
+        approx_rows = (table_stats.get(fqn) or {}).get("approx_rows")
+        for c in cols:
+            name = c["name"]
+            hinted = name in hints
+            st = stats.get((fqn, name))
+            if st is not None:
+                est = _estimated_distinct(st["n_distinct"], approx_rows)
+                low_card = est is not None and est <= MAX_VALUES
+                if st["mcv"] and (hinted or (low_card and _is_categorical(c))):
+                    # hinted columns rank first, then the lowest cardinality
+                    rank = -1.0 if hinted else (est or MAX_VALUES)
+                    found[f"{fqn}.{name}"] = (rank, [str(v) for v in st["mcv"][:MAX_VALUES]])
+                    from_stats.add(f"{fqn}.{name}")
+                    continue
+                if not hinted:
+                    continue
+            if hinted:
+                to_probe.append((fqn, name, approx_rows))
+
+    probed = 0
+    if to_probe:
+        jobs = [(fqn, name, _probe_sqls(fqn, name, rows, legacy)) for fqn, name, rows in to_probe]
+        # the calling thread probes on conn; extra workers only take pooled
+        # connections that are free right now, so none of them waits on a
+        # pool that conn itself is holding a slot of
+        workers = max(1, min(PROBE_WORKERS, len(jobs)))
+        extra = min(workers - 1, uri_pool_free(pg_uri)) if workers > 1 else 0
+        batches = [jobs[i::extra + 1] for i in range(extra + 1)]
+        results: List[Tuple[Tuple[str, str, List[str]], List[str]]] = []
+        with ThreadPoolExecutor(max_workers=max(1, extra)) as pool:
+            futures = [(pool.submit(_probe_batch, pg_uri, b), b) for b in batches[1:]]
+            results.extend(zip(batches[0], (_probe(conn, f, c, q) for f, c, q in batches[0])))
+            for fut, batch in futures:
+                vals = fut.result()
+                if vals is None:                        # pool filled up meanwhile
+                    vals = [_probe(conn, f, c, q) for f, c, q in batch]
+                results.extend(zip(batch, vals))
+        for (fqn, name, _), vals in results:
+            probed += 1
+            if vals:
+                found[f"{fqn}.{name}"] = (-1.0, vals)
+
+    ranked = sorted(found.items(), key=lambda kv: kv[1][0])[:MAX_ENUM_COLUMNS]
+    enum_values = {k: v for k, (_, v) in ranked}
+    metrics = {
+        "mode":       "distinct" if legacy else "stats",
+        "from_stats": len(from_stats & enum_values.keys()),
+        "probed":     probed,
+        "columns":    len(enum_values),
+        "ms":         int((time.perf_counter() - t0) * 1000),
+    }
+    return enum_values, metrics
@@ -0,0 +1,246 @@
+# backend/app/services/join_graph.py
+"""
+Join graph for schema-aware JOIN hints.
+
+Replaces the "compare every pair of tables' column sets" heuristic, which is
+O(n²) in tables and emits noise for any shared column (id, created_at, …).
+
+Edges come from, in order of trust:
+  fk     — declared foreign keys (pg_constraint)
+  key    — a column that is the primary key of one table, or an <x>_id column
+           that names another table (orders.customer_id → customers.id);
+           other tables holding that column join to the owner only (a star,
+           not a clique)
+  shared — any other column name shared by at most `max_fanout` tables and
+           not on the generic-name stoplist (selectivity filter)
+
+The inverted index column-name → tables keeps construction linear in the
+number of columns. hints(tables=…) returns only the edges on the shortest
+join paths connecting the tables a question needs, so prompt size tracks
+the question, not the schema.
+"""
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Shared names that almost never mean "same entity"
+_GENERIC_COLUMNS = {
+    "id", "name", "title", "description", "comment", "comments", "notes",
+    "status", "type", "value", "date", "created", "updated", "modified",
+    "created_at", "updated_at", "modified_at", "deleted_at", "created_by",
+    "updated_by", "is_active", "active", "version", "timestamp",
+}
+_KEY_SUFFIXES = ("_id", "_key", "_code", "_no", "_num", "_uuid")
+
+_WEIGHTS = {"fk": 1, "key": 2, "shared": 3}
+
+
+@dataclass
+class JoinEdge:
+    left:       str
+    right:      str
+    left_cols:  Tuple[str, ...]
+    right_cols: Tuple[str, ...]
+    kind:       str            # fk | key | shared
+
+    @property
+    def weight(self) -> int:
+        return _WEIGHTS[self.kind]
+
+    def reversed(self) -> "JoinEdge":
+        return JoinEdge(self.right, self.left, self.right_cols, self.left_cols, self.kind)
+
+
+def _base_name(table: str) -> str:
+    return table.replace('"', "").rsplit(".", 1)[-1].lower()
+
+
+def _names_table(column: str, table: str) -> bool:
+    """customer_id → customer / customers / customeres-style plural match."""
+    col = column.lower()
+    for suffix in _KEY_SUFFIXES:
+        if col.endswith(suffix):
+            stem = col[: -len(suffix)]
+            base = _base_name(table)
+            return bool(stem) and base in (stem, stem + "s", stem + "es")
+    return False
+
+
+def _is_key_like(column: str) -> bool:
+    return column.lower().endswith(_KEY_SUFFIXES)
+
+
+class JoinGraph:
+    def __init__(self):
+        self.adj: Dict[str, Dict[str, JoinEdge]] = {}
+
+    # ── construction ──────────────────────────────────────────────────────
+    def _add(self, edge: JoinEdge) -> None:
+        if edge.left == edge.right:
+            return
+        cur = self.adj.get(edge.left, {}).get(edge.right)
+        if cur is not None:
+            if cur.weight < edge.weight:
+                return
+            if cur.weight == edge.weight and cur.kind == "shared":
+                # merge additional shared columns into one edge
+                cols = tuple(sorted(set(cur.left_cols) | set(edge.left_cols)))[:4]
+                edge = JoinEdge(edge.left, edge.right, cols, cols, "shared")
+        self.adj.setdefault(edge.left, {})[edge.right] = edge
+        self.adj.setdefault(edge.right, {})[edge.left] = edge.reversed()
+
+    @classmethod
+    def build(
+        cls,
+        tables: Dict[str, Iterable],
+        foreign_keys: Iterable[Dict] = (),
+        primary_keys: Optional[Dict[str, List[str]]] = None,
+        max_fanout: int = 6,
+    ) -> "JoinGraph":
+        """
+        tables       — {table: [column dicts or names]}
+        foreign_keys — [{table, columns, ref_table, ref_columns}]
+        primary_keys — {table: [pk columns]}
+        """
+        g = cls()
+        primary_keys = primary_keys or {}
+        cols_of: Dict[str, Dict[str, str]] = {}
+        index: Dict[str, List[str]] = {}          # lower(col) -> tables
+        for t, cols in tables.items():
+            g.adj.setdefault(t, {})
+            names = {}
+            for c in cols:
+                name = c.get("name") or c.get("column_name") if isinstance(c, dict) else c
+                if name:
+                    names[name.lower()] = name
+            cols_of[t] = names
+            for lc in names:
+                index.setdefault(lc, []).append(t)
+
+        for fk in foreign_keys:
+            if fk["table"] in cols_of and fk["ref_table"] in cols_of:
+                g._add(JoinEdge(fk["table"], fk["ref_table"],
+                                tuple(fk["columns"]), tuple(fk["ref_columns"]), "fk"))
+
+        # <x>_id → table x with an "id" column
+        by_base: Dict[str, List[str]] = {}
+        for t in tables:
+            by_base.setdefault(_base_name(t), []).append(t)
+        for t, names in cols_of.items():
+            for lc, name in names.items():
+                if not _is_key_like(lc):
+                    continue
+                for suffix in _KEY_SUFFIXES:
+                    if lc.endswith(suffix):
+                        stem = lc[: -len(suffix)]
+                        break
+                for base in (stem, stem + "s", stem + "es"):
+                    for owner in by_base.get(base, ()):
+                        if owner != t and "id" in cols_of[owner] and lc not in cols_of[owner]:
+                            g._add(JoinEdge(t, owner, (name,), (cols_of[owner]["id"],), "key"))
+
+        # same-name columns via the inverted index
+        for lc, holders in index.items():
+            if len(holders) < 2:
+                continue
+            owners = [t for t in holders
+                      if lc in {p.lower() for p in primary_keys.get(t, ())}
+                      or _names_table(lc, t)]
+            if owners and len(owners) < len(holders):
+                owner_set = set(owners)
+                for t in holders:
+                    if t in owner_set:
+                        continue
+                    for o in owners:
+                        g._add(JoinEdge(t, o, (cols_of[t][lc],), (cols_of[o][lc],), "key"))
+            elif len(holders) <= max_fanout and lc not in _GENERIC_COLUMNS:
+                kind = "key" if _is_key_like(lc) else "shared"
+                for i, a in enumerate(holders):
+                    for b in holders[i + 1:]:
+                        g._add(JoinEdge(a, b, (cols_of[a][lc],), (cols_of[b][lc],), kind))
+        return g
+
+    # ── queries ───────────────────────────────────────────────────────────
+    @property
+    def edges(self) -> List[JoinEdge]:
+        out = []
+        for a, nbrs in self.adj.items():
+            for b, e in nbrs.items():
+                if a < b:
+                    out.append(e)
+        return sorted(out, key=lambda e: (e.weight, e.left, e.right))
+
+    def _dijkstra(self, sources: Set[str], target: str) -> Optional[List[JoinEdge]]:
+        if target in sources:
+            return []
+        dist = {s: 0 for s in sources}
+        prev: Dict[str, JoinEdge] = {}
+        heap = [(0, s) for s in sorted(sources)]
+        heapq.heapify(heap)
+        while heap:
+            d, node = heapq.heappop(heap)
+            if node == target:
+                path = []
+                while node not in sources:
+                    e = prev[node]
+                    path.append(e)
+                    node = e.left
+                return list(reversed(path))
+            if d > dist.get(node, float("inf")):
+                continue
+            for nbr, e in self.adj.get(node, {}).items():
+                nd = d + e.weight
+                if nd < dist.get(nbr, float("inf")):
+                    dist[nbr] = nd
+                    prev[nbr] = e
+                    heapq.heappush(heap, (nd, nbr))
+        return None
+
+    def shortest_path(self, a: str, b: str) -> Optional[List[JoinEdge]]:
+        """Cheapest chain of joins from a to b, or None if disconnected."""
+        return self._dijkstra({a}, b)
+
+    def paths_between(self, tables: Iterable[str]) -> List[JoinEdge]:
+        """
+        Edges connecting all `tables` (greedy Steiner tree: grow from the first
+        table, attaching each next table by its shortest path). Intermediate
+        bridge tables are included when needed.
+        """
+        wanted = [t for t in dict.fromkeys(tables) if t in self.adj]
+        if len(wanted) < 2:
+            return []
+        connected = {wanted[0]}
+        out: List[JoinEdge] = []
+        for t in wanted[1:]:
+            path = self._dijkstra(connected, t)
+            if not path:
+                continue
+            for e in path:
+                out.append(e)
+                connected.add(e.left)
+                connected.add(e.right)
+        return out
+
+    def hints(
+        self,
+        tables: Optional[Iterable[str]] = None,
+        limit: int = 40,
+        label: Callable[[str], str] = lambda t: t,
+        quote_cols: bool = False,
+    ) -> List[str]:
+        """Prompt lines. With `tables`, only the join paths between them."""
+        edges = self.paths_between(tables) if tables is not None else self.edges
+        return [format_edge(e, label, quote_cols) for e in edges[:limit]]
+
+
+def format_edge(e: JoinEdge, label: Callable[[str], str] = lambda t: t,
+                quote_cols: bool = False) -> str:
+    q = (lambda c: f'"{c}"') if quote_cols else (lambda c: c)
+    conds = " AND ".join(
+        f"{label(e.left)}.{q(lc)} = {label(e.right)}.{q(rc)}"
+        for lc, rc in zip(e.left_cols, e.right_cols)
+    )
+    suffix = {"fk": "  (foreign key)", "key": "", "shared": "  (shared column)"}[e.kind]
+    return f"  - {conds}{suffix}"
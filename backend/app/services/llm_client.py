@@ -0,0 +1,440 @@
+# backend/app/services/llm_client.py
+"""
+Process-wide Gemini client.
+
+Every agent and route used to build its own genai.Client (or configure a
+google.generativeai GenerativeModel) per call, paying client setup and a
+fresh TLS handshake each time. One google-genai Client per timeout value
+is created lazily and reused; its underlying HTTP pool keeps connections
+alive between calls.
+
+generate() / agenerate() add:
+  - per-call timeout (LLM_TIMEOUT_S default)
+  - admission through one process-wide token bucket sized to the Gemini
+    quota (LLM_RPM, LLM_BURST). agenerate() callers queue for a slot until a
+    deadline (LLM_QUEUE_TIMEOUT_S); at most LLM_QUEUE_MAX wait at once, the
+    rest fail fast with LLMBusy. generate() queues the same way on its own
+    (worker) thread
+  - jittered exponential backoff on 429 / RESOURCE_EXHAUSTED / 5xx / timeouts,
+    at most LLM_MAX_RETRIES attempts within the same deadline.
+    A 429 pauses the shared bucket, so callers back off together instead
+    of each sleeping 5/15/30s and retrying into the same limit
+  - metrics per call label: calls, errors, retries, latency, token usage,
+    plus scheduler queue depth and wait times (llm_stats(), GET /llm/stats),
+    optionally accumulated into a per-request dict (AgentState.metrics["llm"])
+
+agenerate() waits with asyncio.sleep, so async routes hold no thread at all;
+generate() sleeps on the worker thread that runs the sync route or agent.
+
+Identical prompts in flight at the same time (same model, config, contents)
+are coalesced through SingleFlight: one upstream call, every concurrent
+caller gets its text or its exception. coalesce=False opts out.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from google import genai
+from google.genai import errors as genai_errors
+
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger("db_assistant.llm_client")
+
+DEFAULT_MODEL   = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+LLM_TIMEOUT_S   = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+LLM_RPM             = float(os.getenv("LLM_RPM", "60"))           # Gemini requests/minute quota
+LLM_BURST           = float(os.getenv("LLM_BURST", "10"))
+LLM_QUEUE_MAX       = int(os.getenv("LLM_QUEUE_MAX", "32"))       # callers allowed to wait
+LLM_QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "30"))
+LLM_BACKOFF_BASE_S  = float(os.getenv("LLM_BACKOFF_BASE_S", "2"))
+LLM_BACKOFF_MAX_S   = float(os.getenv("LLM_BACKOFF_MAX_S", "30"))
+
+
+class LLMBusy(RuntimeError):
+    """No rate-limit slot within the caller's deadline, or the queue is full."""
+
+
+def _is_retryable(e: Exception) -> bool:
+    """429 rate limit / resource exhausted, transient server errors, timeouts."""
+    if isinstance(e, genai_errors.ServerError):
+        return True
+    msg = str(e).lower()
+    return ("429" in msg or "resource_exhausted" in msg or "resource exhausted" in msg
+            or "timed out" in msg or "timeout" in msg or "503" in msg)
+
+
+def _is_rate_limit(e: Exception) -> bool:
+    msg = str(e).lower()
+    return "429" in msg or "resource_exhausted" in msg or "resource exhausted" in msg
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with jitter."""
+    return random.uniform(0.5, 1.0) * min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * (2 ** attempt))
+
+
+class _Scheduler:
+    """
+    Token bucket with reservations: a caller takes a token now or is told
+    how long to wait for one (tokens go negative while callers are queued).
+    """
+
+    def __init__(self, rpm: float, burst: float, queue_max: int):
+        self.rate          = max(rpm, 0.001) / 60.0
+        self.capacity      = max(burst, 1.0)
+        self.queue_max     = queue_max
+        self._lock         = threading.Lock()
+        self._tokens       = self.capacity
+        self._stamp        = time.monotonic()
+        self._paused_until = 0.0
+
+        self.waiting     = 0
+        self.max_waiting = 0
+        self.admitted    = 0
+        self.rejected    = 0
+        self.throttled   = 0
+        self._wait_ms_total = 0.0
+        self._wait_ms_max   = 0.0
+
+    def reserve(self, deadline: float, not_before: float = 0.0, queue: bool = True) -> float:
+        """Seconds to wait before calling upstream. Raises LLMBusy (always
+        when a wait would be needed and queue is False)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            ready = max(now + max(0.0, 1.0 - self._tokens) / self.rate,
+                        self._paused_until, not_before)
+            wait = ready - now
+            if wait > 0 and not queue:
+                self.rejected += 1
+                raise LLMBusy(f"LLM rate limit: no free slot (next in {wait:.1f}s)")
+            if wait > 0 and self.waiting >= self.queue_max:
+                self.rejected += 1
+                raise LLMBusy(f"LLM queue full ({self.waiting} callers waiting)")
+            if ready > deadline:
+                self.rejected += 1
+                raise LLMBusy(f"LLM rate limit: no slot within deadline (next in {wait:.1f}s)")
+            self._tokens -= 1.0
+            self.admitted += 1
+            self._wait_ms_total += wait * 1000
+            self._wait_ms_max = max(self._wait_ms_max, wait * 1000)
+            if wait > 0:
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+            return wait
+
+    def leave_queue(self) -> None:
+        with self._lock:
+            self.waiting -= 1
+
+    def throttle(self, seconds: float) -> None:
+        """Upstream said 429: hold every caller back for `seconds`."""
+        with self._lock:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            return {
+                "rpm":            round(self.rate * 60, 2),
+                "burst":          self.capacity,
+                "tokens":         round(tokens, 2),
+                "queue_depth":    self.waiting,
+                "queue_max_seen": self.max_waiting,
+                "queue_limit":    self.queue_max,
+                "admitted":       self.admitted,
+                "rejected":       self.rejected,
+                "throttled_429":  self.throttled,
+                "paused_s":       round(max(0.0, self._paused_until - now), 2),
+                "wait_ms_avg":    round(self._wait_ms_total / self.admitted, 1) if self.admitted else 0.0,
+                "wait_ms_max":    round(self._wait_ms_max, 1),
+            }
+
+
+class _Counters:
+    __slots__ = ("calls", "errors", "retries", "ms_total", "ms_max",
+                 "prompt_tokens", "output_tokens")
+
+    def __init__(self):
+        self.calls = self.errors = self.retries = 0
+        self.ms_total = self.ms_max = 0.0
+        self.prompt_tokens = self.output_tokens = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls":         self.calls,
+            "errors":        self.errors,
+            "retries":       self.retries,
+            "ms_avg":        round(self.ms_total / self.calls, 1) if self.calls else 0.0,
+            "ms_max":        round(self.ms_max, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+class LLMClient:
+    def __init__(self, api_key_env: str = "GEMINI_API_KEY"):
+        self._api_key_env = api_key_env
+        self._lock        = threading.Lock()
+        self._clients: Dict[int, genai.Client] = {}   # timeout ms -> client
+        self._stats: Dict[str, _Counters] = {}
+        self.scheduler = _Scheduler(LLM_RPM, LLM_BURST, LLM_QUEUE_MAX)
+        self.flights   = SingleFlight()
+
+    def _client(self, timeout_s: float) -> genai.Client:
+        timeout_ms = int(timeout_s * 1000)
+        client = self._clients.get(timeout_ms)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(timeout_ms)
+            if client is None:
+                api_key = os.getenv(self._api_key_env)
+                if not api_key:
+                    raise RuntimeError(f"{self._api_key_env} not set")
+                client = genai.Client(api_key=api_key, http_options={"timeout": timeout_ms})
+                self._clients[timeout_ms] = client
+        return client
+
+    def _record(self, label: str, ms: float, retries: int, ok: bool,
+                usage: Any, metrics: Optional[Dict[str, Any]]) -> None:
+        prompt_toks = getattr(usage, "prompt_token_count", None) or 0
+        output_toks = getattr(usage, "candidates_token_count", None) or 0
+        with self._lock:
+            for c in (self._stats.setdefault(label, _Counters()),
+                      self._stats.setdefault("_all", _Counters())):
+                c.calls += 1
+                c.errors += 0 if ok else 1
+                c.retries += retries
+                c.ms_total += ms
+                c.ms_max = max(c.ms_max, ms)
+                c.prompt_tokens += prompt_toks
+                c.output_tokens += output_toks
+        if metrics is not None:
+            m = metrics.setdefault("llm", {"calls": 0, "retries": 0, "ms": 0,
+                                           "prompt_tokens": 0, "output_tokens": 0})
+            m["calls"] += 1
+            m["retries"] += retries
+            m["ms"] += int(ms)
+            m["prompt_tokens"] += prompt_toks
+            m["output_tokens"] += output_toks
+
+    def _next_attempt_at(self, e: Exception, attempt: int, attempts: int,
+                         deadline: float) -> Optional[float]:
+        """Earliest monotonic time for the next attempt, or None to give up."""
+        if not _is_retryable(e) or attempt >= attempts - 1:
+            return None
+        delay = _backoff(attempt)
+        if time.monotonic() + delay > deadline:
+            return None
+        if _is_rate_limit(e):
+            self.scheduler.throttle(delay)
+        return time.monotonic() + delay
+
+    @staticmethod
+    def _failure(last_error: Exception, attempts: int) -> RuntimeError:
+        if isinstance(last_error, LLMBusy):
+            return last_error
+        if _is_rate_limit(last_error) and attempts > 1:
+            return RuntimeError(
+                f"Gemini rate limit: retries exhausted. "
+                f"Please wait a minute and try again. Last error: {last_error}"
+            )
+        if isinstance(last_error, genai_errors.ClientError):
+            return RuntimeError(f"Gemini API error: {last_error}")
+        return RuntimeError(f"Gemini call failed: {last_error}")
+
+    def _generate(
+        self,
+        contents: Union[str, List[Any]],
+        *,
+        model: Optional[str] = None,
+        config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        label: str = "default",
+        metrics: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        # sync callers run on worker threads (FastAPI's threadpool or
+        # to_thread), so waiting here holds a pool thread, not the event loop
+        client = self._client(timeout or LLM_TIMEOUT_S)
+        attempts = max(1, retries if retries is not None else LLM_MAX_RETRIES)
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + LLM_QUEUE_TIMEOUT_S
+        not_before = 0.0
+        last_error: Optional[Exception] = None
+
+        for attempt in range(attempts):
+            try:
+                wait = self.scheduler.reserve(deadline, not_before)
+            except LLMBusy as e:
+                last_error = e
+                break
+            if wait > 0:
+                try:
+                    time.sleep(wait)
+                finally:
+                    self.scheduler.leave_queue()
+            try:
+                resp = client.models.generate_content(
+                    model=model or DEFAULT_MODEL,
+                    contents=contents,
+                    config=config,
+                )
+                self._record(label, (time.perf_counter() - t0) * 1000, attempt, True,
+                             getattr(resp, "usage_metadata", None), metrics)
+                return (resp.text or "").strip()
+            except Exception as e:
+                last_error = e
+                not_before = self._next_attempt_at(e, attempt, attempts, deadline)
+                if not_before is None:
+                    break
+                logger.warning("Gemini %s: %s (attempt %d/%d), backing off",
+                               label, type(e).__name__, attempt + 1, attempts)
+
+        self._record(label, (time.perf_counter() - t0) * 1000, attempt, False, None, metrics)
+        raise self._failure(last_error, attempts)
+
+    async def _agenerate(
+        self,
+        contents: Union[str, List[Any]],
+        *,
+        model: Optional[str] = None,
+        config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        label: str = "default",
+        metrics: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        client = self._client(timeout or LLM_TIMEOUT_S)
+        attempts = max(1, retries if retries is not None else LLM_MAX_RETRIES)
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + LLM_QUEUE_TIMEOUT_S
+        not_before = 0.0
+        last_error: Optional[Exception] = None
+
+        for attempt in range(attempts):
+            try:
+                wait = self.scheduler.reserve(deadline, not_before)
+            except LLMBusy as e:
+                last_error = e
+                break
+            if wait > 0:
+                try:
+                    await asyncio.sleep(wait)
+                finally:
+                    self.scheduler.leave_queue()
+            try:
+                resp = await client.aio.models.generate_content(
+                    model=model or DEFAULT_MODEL,
+                    contents=contents,
+                    config=config,
+                )
+                self._record(label, (time.perf_counter() - t0) * 1000, attempt, True,
+                             getattr(resp, "usage_metadata", None), metrics)
+                return (resp.text or "").strip()
+            except Exception as e:
+                last_error = e
+                not_before = self._next_attempt_at(e, attempt, attempts, deadline)
+                if not_before is None:
+                    break
+                logger.warning("Gemini %s: %s (attempt %d/%d), backing off",
+                               label, type(e).__name__, attempt + 1, attempts)
+
+        self._record(label, (time.perf_counter() - t0) * 1000, attempt, False, None, metrics)
+        raise self._failure(last_error, attempts)
+
+    @staticmethod
+    def _flight_key(contents: Union[str, List[Any]], model: Optional[str],
+                    config: Optional[Dict[str, Any]]) -> str:
+        h = hashlib.sha256()
+        for part in (model or DEFAULT_MODEL, repr(config), repr(contents)):
+            h.update(part.encode("utf-8", "surrogatepass"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    @staticmethod
+    def _note_shared(metrics: Optional[Dict[str, Any]]) -> None:
+        if metrics is not None:
+            m = metrics.setdefault("llm", {"calls": 0, "retries": 0, "ms": 0,
+                                           "prompt_tokens": 0, "output_tokens": 0})
+            m["coalesced"] = m.get("coalesced", 0) + 1
+
+    def generate(
+        self,
+        contents: Union[str, List[Any]],
+        *,
+        model: Optional[str] = None,
+        config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        label: str = "default",
+        metrics: Optional[Dict[str, Any]] = None,
+        coalesce: bool = True,
+    ) -> str:
+        """
+        Text of the first candidate. Raises RuntimeError (LLMBusy when no
+        rate-limit slot frees up before LLM_QUEUE_TIMEOUT_S). Waits and backs
+        off on the calling thread — call it from a worker thread, or use
+        agenerate() from async code.
+        """
+        call = lambda: self._generate(contents, model=model, config=config, timeout=timeout,
+                                      retries=retries, label=label, metrics=metrics)
+        if not coalesce:
+            return call()
+        text, shared = self.flights.do(self._flight_key(contents, model, config), call)
+        if shared:
+            self._note_shared(metrics)
+        return text
+
+    async def agenerate(
+        self,
+        contents: Union[str, List[Any]],
+        *,
+        model: Optional[str] = None,
+        config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        label: str = "default",
+        metrics: Optional[Dict[str, Any]] = None,
+        coalesce: bool = True,
+    ) -> str:
+        """generate() for async routes — queueing and backoff never block a thread."""
+        call = lambda: self._agenerate(contents, model=model, config=config, timeout=timeout,
+                                       retries=retries, label=label, metrics=metrics)
+        if not coalesce:
+            return await call()
+        text, shared = await self.flights.ado(self._flight_key(contents, model, config), call)
+        if shared:
+            self._note_shared(metrics)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients":   len(self._clients),
+                "total":     self._stats.get("_all", _Counters()).as_dict(),
+                "by_label":  {k: v.as_dict() for k, v in self._stats.items() if k != "_all"},
+                "scheduler": self.scheduler.stats(),
+                "single_flight": self.flights.stats(),
+            }
+
+
+llm = LLMClient()
+
+
+def llm_stats() -> Dict[str, Any]:
+    return llm.stats()
@@ -0,0 +1,246 @@
+# backend/app/services/mongo_clients.py
+"""
+Process-wide MongoClient / AsyncIOMotorClient caches.
+
+A MongoClient is itself a thread-safe connection pool; building one per call
+pays server selection, topology discovery and the TLS handshake every time.
+These caches hand out one long-lived client per URI instead.
+
+Callers must NOT close the clients they get back; they hand them back with
+release_client() instead. Every checkout is reference-counted: a client
+evicted (LRU / idle / discard) while checked out is only retired, and it is
+closed when its last user releases it. Shutdown (main.lifespan) closes all.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+
+logger = logging.getLogger("db_assistant.mongo_clients")
+
+_SERVER_SELECTION_MS = 5000
+
+
+def _uri_key(uri: str) -> str:
+    """Credential-safe cache key."""
+    return hashlib.sha256(uri.strip().encode()).hexdigest()
+
+
+class _PoolCounter(ConnectionPoolListener):
+    """Tracks the driver's own pool for one client: open / in-use sockets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+
+    def _add(self, attr: str, n: int) -> None:
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + n)
+
+    def pool_created(self, event):                 pass
+    def pool_ready(self, event):                   pass
+    def pool_cleared(self, event):                 pass
+    def pool_closed(self, event):                  pass
+    def connection_created(self, event):           self._add("open", 1)
+    def connection_ready(self, event):             pass
+    def connection_closed(self, event):            self._add("open", -1)
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event):  self._add("checkout_failures", 1)
+    def connection_checked_out(self, event):       self._add("checked_out", 1)
+    def connection_checked_in(self, event):        self._add("checked_out", -1)
+
+
+class _Slot:
+    __slots__ = ("client", "counter", "last_used", "users", "retired")
+
+    def __init__(self, client, counter: _PoolCounter):
+        self.client    = client
+        self.counter   = counter
+        self.last_used = time.monotonic()
+        self.users     = 0        # checkouts not yet released
+        self.retired   = False    # evicted; close once users drops to 0
+
+
+class _ClientCache:
+    """Bounded LRU of clients keyed by URI, with idle eviction."""
+
+    def __init__(self, name: str, factory: Callable[[str, _PoolCounter], Any],
+                 max_clients: int, idle_ttl: float):
+        self.name        = name
+        self.max_clients = max_clients
+        self.idle_ttl    = idle_ttl
+        self._factory    = factory
+        self._lock       = threading.Lock()
+        self._slots: "OrderedDict[str, _Slot]" = OrderedDict()
+        self._leased: Dict[int, _Slot] = {}     # id(client) -> slot, while users > 0
+
+        self._hits          = 0
+        self._misses        = 0
+        self._evictions     = 0
+        self._checkout_ms_total = 0.0
+        self._checkout_ms_max   = 0.0
+
+    def get(self, uri: str):
+        """Check out the client for uri; hand it back with release()."""
+        t0 = time.perf_counter()
+        key = _uri_key(uri)
+        now = time.monotonic()
+        stale: List[_Slot] = []
+        with self._lock:
+            # idle eviction (oldest first) — a client in use is not idle
+            for k in list(self._slots):
+                s = self._slots[k]
+                if k != key and not s.users and now - s.last_used > self.idle_ttl:
+                    stale.append(self._slots.pop(k))
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._hits += 1
+                self._slots.move_to_end(key)
+            else:
+                self._misses += 1
+                counter = _PoolCounter()
+                slot = _Slot(self._factory(uri, counter), counter)
+                self._slots[key] = slot
+                while len(self._slots) > self.max_clients:
+                    stale.append(self._slots.popitem(last=False)[1])
+            slot.last_used = now
+            slot.users += 1
+            self._leased[id(slot.client)] = slot
+            self._evictions += len(stale)
+            stale = self._retire(stale)
+
+            ms = (time.perf_counter() - t0) * 1000
+            self._checkout_ms_total += ms
+            self._checkout_ms_max = max(self._checkout_ms_max, ms)
+        for s in stale:
+            self._close(s)
+        return slot.client
+
+    def release(self, client) -> bool:
+        """Hand back a client from get(); False if it did not come from this cache."""
+        with self._lock:
+            slot = self._leased.get(id(client))
+            if slot is None or slot.client is not client:
+                return False
+            slot.users -= 1
+            slot.last_used = time.monotonic()
+            if slot.users:
+                return True
+            del self._leased[id(client)]
+            if not slot.retired:
+                return True
+        self._close(slot)
+        return True
+
+    def _retire(self, slots: List[_Slot]) -> List[_Slot]:
+        """Mark evicted slots retired; returns those nobody uses (close them now)."""
+        idle = []
+        for s in slots:
+            s.retired = True
+            if not s.users:
+                idle.append(s)
+        return idle
+
+    def discard(self, uri: str) -> None:
+        """Drop the client for `uri` (e.g. after a failed ping); closed once released."""
+        with self._lock:
+            slot = self._slots.pop(_uri_key(uri), None)
+            stale = self._retire([slot] if slot is not None else [])
+        for s in stale:
+            self._close(s)
+
+    def close_all(self) -> None:
+        with self._lock:
+            slots = list(self._slots.values())
+            slots += [s for s in self._leased.values() if s.retired]
+            self._slots.clear()
+            self._leased.clear()
+        for s in slots:
+            self._close(s)
+
+    def _close(self, slot: _Slot) -> None:
+        try:
+            slot.client.close()
+        except Exception as exc:
+            logger.debug("%s: close failed: %s", self.name, exc)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            slots = list(self._slots.values())
+            lookups = self._hits + self._misses
+            return {
+                "clients":           len(slots),
+                "max_clients":       self.max_clients,
+                "hits":              self._hits,
+                "misses":            self._misses,
+                "evictions":         self._evictions,
+                "checked_out":       sum(s.users for s in slots),
+                "retired_in_use":    sum(1 for s in self._leased.values() if s.retired),
+                "open_connections":  sum(s.counter.open for s in slots),
+                "in_use":            sum(s.counter.checked_out for s in slots),
+                "checkout_failures": sum(s.counter.checkout_failures for s in slots),
+                "checkout_ms_avg":   round(self._checkout_ms_total / lookups, 3) if lookups else 0.0,
+                "checkout_ms_max":   round(self._checkout_ms_max, 3),
+            }
+
+
+_MAX_CLIENTS = int(os.getenv("MONGO_CLIENT_CACHE_SIZE", "16"))
+_IDLE_TTL    = float(os.getenv("MONGO_CLIENT_IDLE_TTL", "600"))
+_MAX_POOL    = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+
+
+def _new_sync(uri: str, counter: _PoolCounter) -> MongoClient:
+    return MongoClient(uri, serverSelectionTimeoutMS=_SERVER_SELECTION_MS,
+                       maxPoolSize=_MAX_POOL, event_listeners=[counter])
+
+
+def _new_motor(uri: str, counter: _PoolCounter):
+    import motor.motor_asyncio
+    return motor.motor_asyncio.AsyncIOMotorClient(
+        uri, serverSelectionTimeoutMS=_SERVER_SELECTION_MS,
+        maxPoolSize=_MAX_POOL, event_listeners=[counter],
+    )
+
+
+_sync_cache  = _ClientCache("mongo", _new_sync, _MAX_CLIENTS, _IDLE_TTL)
+_motor_cache = _ClientCache("motor", _new_motor, _MAX_CLIENTS, _IDLE_TTL)
+
+
+def get_mongo_client(uri: str) -> MongoClient:
+    """Shared pymongo client for `uri`. Do not close it — release_client() it."""
+    return _sync_cache.get(uri)
+
+
+def get_motor_client(uri: str):
+    """Shared Motor client for `uri`. Do not close it — release_client() it."""
+    return _motor_cache.get(uri)
+
+
+def release_client(client) -> None:
+    """Hand back a client from get_mongo_client() / get_motor_client()."""
+    if not _sync_cache.release(client):
+        _motor_cache.release(client)
+
+
+def discard_client(uri: str) -> None:
+    _sync_cache.discard(uri)
+    _motor_cache.discard(uri)
+
+
+def close_all_clients() -> None:
+    _sync_cache.close_all()
+    _motor_cache.close_all()
+
+
+def client_stats() -> Dict[str, Any]:
+    return {"mongo": _sync_cache.stats(), "motor": _motor_cache.stats()}
@@ -8,9 +8,11 @@ from datetime import datetime
 from bson import ObjectId
 from pymongo import MongoClient
 
+from app.services.mongo_clients import get_mongo_client, release_client
+
 
 def get_client(uri: str) -> MongoClient:
-    return MongoClient(uri, serverSelectionTimeoutMS=5000)
+    return get_mongo_client(uri)
 
 
 def _restore_dates(obj: Any) -> Any:
@@ -66,7 +68,7 @@ def execute_find(
         ms = int((perf_counter() - t0) * 1000)
         return docs, ms
     finally:
-        client.close()
+        release_client(client)
 
 
 def execute_aggregate(
@@ -96,7 +98,7 @@ def execute_aggregate(
         ms = int((perf_counter() - t0) * 1000)
         return docs, ms
     finally:
-        client.close()
+        release_client(client)
 
 
 def run_query(
@@ -6,9 +6,11 @@ from collections import Counter, defaultdict
 from datetime import datetime
 from pymongo import MongoClient
 
+from app.services.mongo_clients import get_mongo_client, release_client
+
 
 def get_client(uri: str) -> MongoClient:
-    return MongoClient(uri, serverSelectionTimeoutMS=5000)
+    return get_mongo_client(uri)
 
 
 def list_databases(uri: str) -> List[str]:
@@ -16,7 +18,7 @@ def list_databases(uri: str) -> List[str]:
     try:
         return sorted(client.list_database_names())
     finally:
-        client.close()
+        release_client(client)
 
 
 def list_collections(uri: str, db: str) -> List[str]:
@@ -24,7 +26,7 @@ def list_collections(uri: str, db: str) -> List[str]:
     try:
         return sorted(client[db].list_collection_names())
     finally:
-        client.close()
+        release_client(client)
 
 
 def preview_documents(uri: str, db: str, collection: str, limit: int = 10) -> List[Dict[str, Any]]:
@@ -38,7 +40,7 @@ def preview_documents(uri: str, db: str, collection: str, limit: int = 10) -> Li
             out.append(d)
         return out
     finally:
-        client.close()
+        release_client(client)
 
 
 def _type_name(v: Any) -> str:
@@ -147,7 +149,7 @@ def infer_schema(uri: str, db: str, collection: str, sample_size: int = 400) ->
 
         return {"db": db, "collection": collection, "sample_size": total, "fields": fields}
     finally:
-        client.close()
+        release_client(client)
 
 
 def build_mongo_schema_prompt(schema: Dict[str, Any]) -> str:
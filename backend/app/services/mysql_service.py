@@ -1,10 +1,13 @@
-import mysql.connector
-from mysql.connector import Error
-import google.generativeai as genai
+from mysql.connector import Error, pooling
+from mysql.connector.errors import PoolError
+import hashlib
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+from app.services.llm_client import llm
 
 SYSTEM_PROMPT = """You are a MySQL SQL generator.
 
@@ -20,22 +23,151 @@ Rules:
 - Use MySQL-specific syntax (LIMIT instead of TOP, IFNULL instead of COALESCE where appropriate)
 """
 
-def get_mysql_connection(host: str, port: int, database: str, username: str, password: str):
-    """Create and return a MySQL connection."""
-    try:
-        conn = mysql.connector.connect(
+# ── Connection pools ─────────────────────────────────────────────────────────
+# One small mysql.connector pool per (host, port, database, user, password hash).
+# Pools start empty and open connections on demand (up to MYSQL_POOL_SIZE), so
+# a one-off connect costs one connection. Sessions are reset when a connection
+# is returned, and the pool pings each connection on checkout and
+# transparently reconnects stale ones.
+_POOL_SIZE    = int(os.getenv("MYSQL_POOL_SIZE", "4"))
+_POOLS_MAX    = int(os.getenv("MYSQL_POOLS_MAX", "16"))
+_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+
+
+class _LazyPool:
+    """MySQLConnectionPool that opens its connections as they are needed."""
+
+    def __init__(self, name: str, **config):
+        # no connection arguments here — the constructor would open pool_size connections
+        self.pool = pooling.MySQLConnectionPool(pool_name=name, pool_size=_POOL_SIZE,
+                                                pool_reset_session=True)
+        self.pool.set_config(**config)
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def checkout(self):
+        """A pooled connection; PoolError when all _POOL_SIZE are checked out."""
+        try:
+            return self.pool.get_connection()
+        except PoolError:
+            with self._lock:
+                if self.opened >= _POOL_SIZE:
+                    raise
+                self.opened += 1
+            try:
+                self.pool.add_connection()
+            except Error:
+                with self._lock:
+                    self.opened -= 1
+                raise
+            return self.pool.get_connection()
+
+    def close_idle(self) -> None:
+        """Disconnect idle connections (checked-out ones are closed by GC)."""
+        while True:
+            try:
+                cnx = self.pool.get_connection()
+            except Error:
+                return
+            try:
+                cnx.disconnect()
+            except Error:
+                pass
+
+
+_pools: "OrderedDict[tuple, _LazyPool]" = OrderedDict()
+_pools_lock = threading.Lock()
+_pool_stats = {"pools_created": 0, "pools_evicted": 0, "checkouts": 0,
+               "waits": 0, "wait_ms_total": 0.0, "exhausted": 0}
+
+
+def _pool_key(host: str, port: int, database: str, username: str, password: str) -> tuple:
+    pw_hash = hashlib.sha256((password or "").encode()).hexdigest()
+    return ((host or "").lower(), int(port), database, username, pw_hash)
+
+
+def _get_pool(host: str, port: int, database: str, username: str, password: str) -> _LazyPool:
+    key = _pool_key(host, port, database, username, password)
+    evicted = []
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            _pools.move_to_end(key)
+            return pool
+
+        # opens nothing yet, so it is cheap to build under the lock
+        pool = _LazyPool(
+            "da_" + hashlib.sha256(repr(key).encode()).hexdigest()[:24],
             host=host,
             port=port,
             database=database,
             user=username,
             password=password,
             connection_timeout=8,
-            autocommit=True
+            autocommit=True,
         )
-        return conn
+        _pools[key] = pool
+        _pool_stats["pools_created"] += 1
+        while len(_pools) > _POOLS_MAX:
+            evicted.append(_pools.popitem(last=False)[1])
+            _pool_stats["pools_evicted"] += 1
+    for old in evicted:
+        old.close_idle()
+    return pool
+
+
+def get_mysql_connection(host: str, port: int, database: str, username: str, password: str):
+    """Check out a pooled MySQL connection. conn.close() returns it to the pool."""
+    try:
+        pool = _get_pool(host, port, database, username, password)
     except Error as e:
         raise Exception(f"MySQL connection failed: {str(e)}")
 
+    t0 = time.monotonic()
+    waited = False
+    while True:
+        try:
+            conn = pool.checkout()
+            break
+        except PoolError:
+            # all connections checked out — wait for one to come back
+            waited = True
+            if time.monotonic() - t0 >= _POOL_TIMEOUT:
+                with _pools_lock:
+                    _pool_stats["exhausted"] += 1
+                raise Exception(
+                    f"MySQL connection failed: pool exhausted "
+                    f"({_POOL_SIZE} connections busy for {_POOL_TIMEOUT:.0f}s)"
+                )
+            time.sleep(0.05)
+        except Error as e:
+            raise Exception(f"MySQL connection failed: {str(e)}")
+
+    with _pools_lock:
+        _pool_stats["checkouts"] += 1
+        if waited:
+            _pool_stats["waits"] += 1
+            _pool_stats["wait_ms_total"] += (time.monotonic() - t0) * 1000
+    return conn
+
+
+def mysql_pool_stats() -> dict:
+    with _pools_lock:
+        stats = dict(_pool_stats)
+        stats["wait_ms_total"] = round(stats["wait_ms_total"], 2)
+        stats["pools"] = len(_pools)
+        stats["pool_size"] = _POOL_SIZE
+        stats["connections_opened"] = sum(p.opened for p in _pools.values())
+    return stats
+
+
+def close_mysql_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for p in pools:
+        p.close_idle()
+
 
 def get_mysql_tables(host: str, port: int, database: str, username: str, password: str):
     """List all tables in the MySQL database."""
@@ -98,16 +230,13 @@ def ensure_safe_mysql(sql: str) -> str:
 def generate_mysql_sql(schema_prompt: str, question: str) -> str:
     """Generate MySQL SQL from natural language using Gemini."""
     try:
-        client = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            system_instruction=SYSTEM_PROMPT
-        )
         prompt = f"{schema_prompt}\n\nUser Question: {question}\n\nReturn ONLY MySQL SQL:"
-        response = client.generate_content(
+        raw_sql = llm.generate(
             prompt,
-            generation_config={"temperature": 0.0}
+            model="gemini-2.0-flash",
+            config={"system_instruction": SYSTEM_PROMPT, "temperature": 0.0},
+            label="mysql_sql",
         )
-        raw_sql = response.text.strip()
         return ensure_safe_mysql(raw_sql)
     except ValueError as e:
         raise e
@@ -2,13 +2,14 @@
 
 from __future__ import annotations
 
-import os
 import re
 import json
-import time
+import hashlib
 import logging
-from google import genai
-from google.genai import errors as genai_errors
+from typing import Any, Dict, Optional
+
+from app.services.llm_client import DEFAULT_MODEL, llm
+from app.services.sql_cache import cache_key, sql_cache
 
 logger = logging.getLogger("db_assistant.nl_to_sql")
 
@@ -53,16 +54,15 @@ COMMON MISTAKES TO AVOID:
 - For champion vs last place percentage: use WITH CTEs, each with LIMIT 1 to avoid multiple row errors. Formula: (last_ms - champ_ms) * 100.0 / last_ms
 """
 
+# Any edit to the SQL system prompt changes every SQL cache key
+_SQL_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT_SQL.encode()).hexdigest()[:16]
+
 SYSTEM_PROMPT_JSON = """You are a JSON generator.
 Rules:
 - Return ONLY valid JSON. No SQL. No markdown. No extra text.
 - The output MUST be parseable by json.loads().
 """
 
-# Retry config for 429 rate limit errors
-_MAX_RETRIES  = 3
-_RETRY_DELAYS = [5, 15, 30]  # seconds between retries
-
 
 def assert_safe_select(sql: str) -> None:
     s = sql.strip().lower()
@@ -157,76 +157,102 @@ def _extract_first_json_object(text: str) -> str:
     raise ValueError(f"Unbalanced JSON braces in model output. Raw: {s[:300]}")
 
 
-def _is_rate_limit_error(e: Exception) -> bool:
-    """Check if error is a 429 rate limit / resource exhausted error."""
-    msg = str(e).lower()
-    return "429" in msg or "resource_exhausted" in msg or "resource exhausted" in msg
-
-
-def _call_gemini_text(system_prompt: str, user_prompt: str) -> str:
+def _call_gemini_text(system_prompt: str, user_prompt: str,
+                      label: str = "text", metrics: Optional[Dict[str, Any]] = None,
+                      config: Optional[Dict[str, Any]] = None) -> str:
     """
-    Shared Gemini call with automatic retry on 429 rate limit errors.
-    Retries up to 3 times with increasing delays: 5s, 15s, 30s.
+    Shared Gemini call on the process-wide client (app.services.llm_client).
+    Admission goes through its shared rate-limit bucket (queueing up to
+    LLM_QUEUE_TIMEOUT_S on this worker thread) with bounded retries. Identical
+    prompts already in flight are coalesced into one upstream call.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY not set")
-
-    client = genai.Client(api_key=api_key)
-    last_error = None
-
-    for attempt in range(_MAX_RETRIES):
-        try:
-            resp = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[system_prompt, user_prompt],
-            )
-            return (resp.text or "").strip()
-
-        except genai_errors.ClientError as e:
-            if _is_rate_limit_error(e) and attempt < _MAX_RETRIES - 1:
-                delay = _RETRY_DELAYS[attempt]
-                logger.warning(
-                    "Gemini 429 rate limit hit (attempt %d/%d). "
-                    "Retrying in %ds...", attempt + 1, _MAX_RETRIES, delay
-                )
-                time.sleep(delay)
-                last_error = e
-                continue
-            raise RuntimeError(f"Gemini API error: {e}")
-
-        except Exception as e:
-            if _is_rate_limit_error(e) and attempt < _MAX_RETRIES - 1:
-                delay = _RETRY_DELAYS[attempt]
-                logger.warning(
-                    "Gemini rate limit hit (attempt %d/%d). "
-                    "Retrying in %ds...", attempt + 1, _MAX_RETRIES, delay
-                )
-                time.sleep(delay)
-                last_error = e
-                continue
-            raise RuntimeError(f"Gemini call failed: {e}")
-
-    raise RuntimeError(
-        f"Gemini rate limit: all {_MAX_RETRIES} retries exhausted. "
-        f"Please wait a minute and try again. Last error: {last_error}"
-    )
-
-
-def generate_sql(schema_prompt: str, user_question: str) -> str:
-    prompt = f"""{schema_prompt}
+    return llm.generate([system_prompt, user_prompt], config=config, label=label, metrics=metrics)
+
+
+async def _acall_gemini_text(system_prompt: str, user_prompt: str,
+                             label: str = "text", metrics: Optional[Dict[str, Any]] = None,
+                             config: Optional[Dict[str, Any]] = None) -> str:
+    """_call_gemini_text() for the async pipeline — waits without holding a thread."""
+    return await llm.agenerate([system_prompt, user_prompt], config=config,
+                               label=label, metrics=metrics)
+
+
+def _sql_prompt(schema_prompt: str, user_question: str) -> str:
+    return f"""{schema_prompt}
 
 User Question:
 {user_question}
 
 Return ONLY SQL:
 """
-    raw_text = _call_gemini_text(SYSTEM_PROMPT_SQL, prompt)
+
+
+def _sql_key(prompt: str, temperature: Optional[float]) -> str:
+    if temperature is None:
+        return cache_key(_SQL_PROMPT_VERSION, DEFAULT_MODEL, prompt)
+    return cache_key(_SQL_PROMPT_VERSION, DEFAULT_MODEL, f"temperature={temperature}", prompt)
+
+
+def _sql_config(temperature: Optional[float]) -> Optional[Dict[str, Any]]:
+    return None if temperature is None else {"temperature": temperature}
+
+
+def _cached_sql(key: str, use_cache: bool, metrics: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not use_cache:
+        return None
+    cached, tier = sql_cache.get(key)
+    if cached is not None and metrics is not None:
+        metrics["sql_cache"] = {"hit": True, "tier": tier, "key": key}
+    return cached
+
+
+def _store_sql(key: str, raw_text: str, use_cache: bool,
+               metrics: Optional[Dict[str, Any]]) -> str:
     sql = _extract_sql(raw_text)
     assert_safe_select(sql)
+    sql_cache.put(key, sql)
+    if metrics is not None:
+        metrics["sql_cache"] = {"hit": False, "bypassed": not use_cache, "key": key}
     return sql
 
 
+def generate_sql(schema_prompt: str, user_question: str,
+                 metrics: Optional[Dict[str, Any]] = None,
+                 use_cache: bool = True,
+                 temperature: Optional[float] = None) -> str:
+    """
+    SQL for the question. Identical inputs are served from sql_cache without
+    a Gemini call; use_cache=False forces a fresh generation (and refreshes
+    the cached entry). Cache outcome goes to metrics["sql_cache"].
+    temperature overrides the model default (and is part of the cache key).
+    """
+    prompt = _sql_prompt(schema_prompt, user_question)
+    key = _sql_key(prompt, temperature)
+    cached = _cached_sql(key, use_cache, metrics)
+    if cached is not None:
+        return cached
+
+    raw_text = _call_gemini_text(SYSTEM_PROMPT_SQL, prompt, label="sql", metrics=metrics,
+                                 config=_sql_config(temperature))
+    return _store_sql(key, raw_text, use_cache, metrics)
+
+
+async def agenerate_sql(schema_prompt: str, user_question: str,
+                        metrics: Optional[Dict[str, Any]] = None,
+                        use_cache: bool = True,
+                        temperature: Optional[float] = None) -> str:
+    """generate_sql() for the async pipeline."""
+    prompt = _sql_prompt(schema_prompt, user_question)
+    key = _sql_key(prompt, temperature)
+    cached = _cached_sql(key, use_cache, metrics)
+    if cached is not None:
+        return cached
+
+    raw_text = await _acall_gemini_text(SYSTEM_PROMPT_SQL, prompt, label="sql", metrics=metrics,
+                                        config=_sql_config(temperature))
+    return _store_sql(key, raw_text, use_cache, metrics)
+
+
 def generate_json(schema_prompt: str, user_question: str) -> str:
     """
     Gemini call for Mongo query generation.
@@ -239,5 +265,5 @@ USER_QUESTION:
 
 Return ONLY valid JSON:
 """
-    raw_text = _call_gemini_text(SYSTEM_PROMPT_JSON, prompt)
+    raw_text = _call_gemini_text(SYSTEM_PROMPT_JSON, prompt, label="json")
     return raw_text
\ No newline at end of file
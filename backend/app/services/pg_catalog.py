@@ -0,0 +1,182 @@
+# backend/app/services/pg_catalog.py
+"""
+Bulk PostgreSQL catalog introspection.
+
+Replaces the per-table information_schema.columns loop (one query per
+table) with two pg_catalog queries for the whole database or any subset
+of schemas / tables:
+
+  1. tables + columns (json_agg per table) + primary key + reltuples + comments
+  2. foreign keys with ordered column lists on both sides
+
+information_schema views are built on per-row privilege checks and are
+slow on catalogs with tens of thousands of relations; pg_catalog with one
+has_table_privilege() filter is not.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+import psycopg2.extras
+
+logger = logging.getLogger("db_assistant.pg_catalog")
+
+_SYSTEM_SCHEMA_FILTER = (
+    "n.nspname NOT IN ('pg_catalog', 'information_schema') "
+    r"AND n.nspname NOT LIKE 'pg\_toast%%' "
+    r"AND n.nspname NOT LIKE 'pg\_temp%%'"
+)
+
+_TABLES_SQL = """
+    SELECT n.nspname            AS table_schema,
+           c.relname            AS table_name,
+           c.reltuples::bigint  AS approx_rows,
+           td.description       AS table_comment,
+           json_agg(json_build_object(
+               'name',    a.attname,
+               'pg_type', format_type(a.atttypid, NULL),
+               'is_enum', t.typtype = 'e',
+               'comment', cd.description
+           ) ORDER BY a.attnum) AS columns,
+           (SELECT array_agg(pa.attname ORDER BY k.ord)::text[]
+              FROM pg_constraint pk
+              CROSS JOIN LATERAL unnest(pk.conkey) WITH ORDINALITY AS k(attnum, ord)
+              JOIN pg_attribute pa ON pa.attrelid = pk.conrelid AND pa.attnum = k.attnum
+             WHERE pk.conrelid = c.oid AND pk.contype = 'p') AS primary_key
+    FROM pg_class c
+    JOIN pg_namespace n  ON n.oid = c.relnamespace
+    JOIN pg_attribute a  ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    JOIN pg_type t       ON t.oid = a.atttypid
+    LEFT JOIN pg_description td
+           ON td.objoid = c.oid AND td.classoid = 'pg_class'::regclass AND td.objsubid = 0
+    LEFT JOIN pg_description cd
+           ON cd.objoid = c.oid AND cd.classoid = 'pg_class'::regclass AND cd.objsubid = a.attnum
+    WHERE c.relkind IN ('r', 'p')
+      AND {filters}
+      AND has_table_privilege(c.oid, 'SELECT')
+    GROUP BY c.oid, n.nspname, c.relname, c.reltuples, td.description
+    ORDER BY n.nspname, c.relname
+"""
+
+_FOREIGN_KEYS_SQL = """
+    SELECT n.nspname  AS table_schema,
+           c.relname  AS table_name,
+           fn.nspname AS ref_schema,
+           fc.relname AS ref_table,
+           ARRAY(SELECT a.attname::text
+                   FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                   JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                  ORDER BY k.ord) AS columns,
+           ARRAY(SELECT a.attname::text
+                   FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+                   JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+                  ORDER BY k.ord) AS ref_columns
+    FROM pg_constraint con
+    JOIN pg_class c      ON c.oid  = con.conrelid
+    JOIN pg_namespace n  ON n.oid  = c.relnamespace
+    JOIN pg_class fc     ON fc.oid = con.confrelid
+    JOIN pg_namespace fn ON fn.oid = fc.relnamespace
+    WHERE con.contype = 'f'
+      AND {filters}
+    ORDER BY n.nspname, c.relname, con.conname
+"""
+
+
+def _filters(schemas: Optional[Iterable[str]], tables: Optional[Iterable[str]],
+             exclude: Iterable[str]) -> tuple:
+    clauses: List[str] = [_SYSTEM_SCHEMA_FILTER]
+    params: List[Any] = []
+    if schemas is not None:
+        clauses.append("n.nspname = ANY(%s)")
+        params.append(list(schemas))
+    if tables is not None:
+        clauses.append("c.relname = ANY(%s)")
+        params.append(list(tables))
+    exclude = list(exclude)
+    if exclude:
+        clauses.append("NOT (c.relname = ANY(%s))")
+        params.append(exclude)
+    return " AND ".join(clauses), params
+
+
+def load_catalog(
+    conn,
+    schemas: Optional[Iterable[str]] = None,
+    tables: Optional[Iterable[str]] = None,
+    exclude: Iterable[str] = (),
+    with_foreign_keys: bool = True,
+) -> Dict[str, Any]:
+    """
+    Introspect tables visible to the current user.
+
+    Returns:
+      {
+        "tables": {
+          "schema.table": {
+            "schema", "table", "approx_rows" (None if never analyzed),
+            "comment", "primary_key": [...],
+            "columns": [{"name", "pg_type"[, "is_enum", "comment"]}],
+          }, ...
+        },
+        "foreign_keys": [
+          {"table": "s.t", "columns": [...], "ref_table": "s.r", "ref_columns": [...]}, ...
+        ],
+      }
+    """
+    filters, params = _filters(schemas, tables, exclude)
+    out: Dict[str, Any] = {"tables": {}, "foreign_keys": []}
+
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(_TABLES_SQL.format(filters=filters), params)
+        for r in cur.fetchall():
+            fqn = f"{r['table_schema']}.{r['table_name']}"
+            columns = []
+            for c in r["columns"]:
+                col = {"name": c["name"], "pg_type": c["pg_type"]}
+                if c.get("is_enum"):
+                    col["is_enum"] = True
+                if c.get("comment"):
+                    col["comment"] = c["comment"]
+                columns.append(col)
+            rows = r["approx_rows"]
+            out["tables"][fqn] = {
+                "schema":      r["table_schema"],
+                "table":       r["table_name"],
+                "approx_rows": rows if rows is not None and rows >= 0 else None,
+                "comment":     r["table_comment"],
+                "primary_key": list(r["primary_key"] or []),
+                "columns":     columns,
+            }
+
+        if with_foreign_keys:
+            fk_filters, fk_params = _filters(schemas, None, ())
+            cur.execute(_FOREIGN_KEYS_SQL.format(filters=fk_filters), fk_params)
+            for r in cur.fetchall():
+                src = f"{r['table_schema']}.{r['table_name']}"
+                ref = f"{r['ref_schema']}.{r['ref_table']}"
+                if src not in out["tables"] or ref not in out["tables"]:
+                    continue
+                out["foreign_keys"].append({
+                    "table":       src,
+                    "columns":     list(r["columns"]),
+                    "ref_table":   ref,
+                    "ref_columns": list(r["ref_columns"]),
+                })
+
+    logger.debug("load_catalog: %d tables, %d foreign keys",
+                 len(out["tables"]), len(out["foreign_keys"]))
+    return out
+
+
+def tables_schema_of(catalog: Dict[str, Any]) -> Dict[str, List[Dict]]:
+    """AgentState.tables_schema shape: {fqn: [{name, pg_type}]}."""
+    return {fqn: t["columns"] for fqn, t in catalog["tables"].items() if t["columns"]}
+
+
+def table_stats_of(catalog: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """AgentState.table_stats shape: {fqn: {approx_rows, primary_key, comment}}."""
+    return {
+        fqn: {k: t[k] for k in ("approx_rows", "primary_key", "comment")}
+        for fqn, t in catalog["tables"].items()
+    }
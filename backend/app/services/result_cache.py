@@ -0,0 +1,303 @@
+# backend/app/services/result_cache.py
+"""
+In-process cache of executed query results.
+
+Dashboards, swarm subtasks that converge on the same query and
+/pg/nl-query-multi sub-questions run byte-identical SQL over and over.
+PgExecutionAgent and ExecutionAgent look the result up here first:
+
+  key = sha256(target, normalized SQL, data version of every table read)
+
+The tables a query reads are taken from its plan, not from the SQL text:
+EXPLAIN (VERBOSE, FORMAT JSON) on the connection that would run it lists
+every scanned relation with its schema — comma joins, subqueries, CTEs and
+views (expanded to their base tables) included. Their data versions are
+then read in one catalog query:
+
+  oid : relfilenode : n_tup_ins + n_tup_upd + n_tup_del : generation
+
+oid moves when a table is dropped and re-created (every upload does that),
+relfilenode on TRUNCATE / VACUUM FULL, and the pg_stat_user_tables counters
+on any committed or rolled-back write. The counters are reported by other
+backends with a short delay (a few seconds at most), so RESULT_CACHE_TTL
+still ages entries out. generation is this process' own counter for a
+table: invalidate_table() bumps it and drops every entry that read the
+table — the upload / delete routes call it right after replacing a table.
+
+Not cached (status "bypass"): SQL calling volatile functions (now(),
+random(), current_date, ...), plans with a function scan (a set-returning
+function in FROM may read anything) or a TABLESAMPLE scan, plans that read
+foreign tables or other relations without a tracked version, SQL that
+reads no table at all, SQL that does not plan.
+
+Eviction is LRU within RESULT_CACHE_MAX entries and RESULT_CACHE_MAX_BYTES
+of estimated row payload (FetchResult.bytes).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.result_fetch import FetchResult
+from app.services.sql_cache import cache_key
+
+logger = logging.getLogger("db_assistant.result_cache")
+
+RESULT_CACHE           = os.getenv("RESULT_CACHE", "1").lower() not in ("0", "false", "off", "no")
+RESULT_CACHE_MAX       = int(os.getenv("RESULT_CACHE_MAX", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(128 << 20)))
+RESULT_CACHE_TTL       = float(os.getenv("RESULT_CACHE_TTL", "300"))   # 0 = no TTL
+
+_VOLATILE = re.compile(
+    r"\b(?:random|setseed|now|clock_timestamp|statement_timestamp|transaction_timestamp|"
+    r"timeofday|current_date|current_time|current_timestamp|localtime|localtimestamp|"
+    r"nextval|currval|lastval|gen_random_uuid|uuid_generate_v\w*|txid_current\w*|pg_sleep)\b",
+    re.IGNORECASE,
+)
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_SPACE  = re.compile(r"\s+")
+
+# plan nodes whose rows the cache cannot tie to table versions (TABLESAMPLE
+# is random; the others do not read a versioned relation)
+_OPAQUE_SCANS = ("Function Scan", "Table Function Scan", "Foreign Scan", "Custom Scan",
+                 "Sample Scan")
+
+# relkinds whose contents the version below actually tracks
+_VERSIONED = ("r", "m")
+
+_VERSIONS_SQL = """
+    SELECT r.ref,
+           n.nspname || '.' || c.relname AS fqn,
+           c.relkind::text               AS relkind,
+           c.oid::bigint || ':' || c.relfilenode::bigint || ':' ||
+           coalesce(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0) AS version
+    FROM unnest({param}::text[]) AS r(ref)
+    LEFT JOIN pg_class c     ON c.oid = to_regclass(r.ref)
+    LEFT JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+"""
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    sql with the layout that does not change its meaning removed: runs of
+    whitespace collapsed, unquoted text lower-cased, trailing ';' dropped.
+    String literals and quoted identifiers are kept as written; SQL with
+    comments, dollar quotes or backslash escapes is only trimmed.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    if any(t in sql for t in ("--", "/*", "$", "\\")):
+        return sql
+    parts = _QUOTED.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = _SPACE.sub(" ", parts[i]).lower()
+    return "".join(parts)
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _plan_relations(plan: Any) -> Tuple[List[str], Optional[str]]:
+    """
+    (quoted schema.table of every relation an EXPLAIN (VERBOSE, FORMAT JSON)
+    plan scans, bypass reason or None). Walks init plans and subplans too.
+    """
+    if isinstance(plan, (str, bytes)):
+        plan = json.loads(plan)
+    refs = set()
+    stack = [p["Plan"] for p in plan]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") in _OPAQUE_SCANS:
+            return [], "opaque_scan"
+        if "Relation Name" in node:
+            refs.add(f'{_quote_ident(node["Schema"])}.{_quote_ident(node["Relation Name"])}')
+        stack.extend(node.get("Plans", ()))
+    return sorted(refs), None
+
+
+@dataclass
+class Lookup:
+    """Outcome of ResultCache.lookup() — pass it back to store() on a miss."""
+    status:      str                               # "hit" | "miss" | "bypass"
+    key:         Optional[str]         = None
+    tables:      Tuple[str, ...]       = ()
+    generations: Tuple[int, ...]       = ()
+    fetched:     Optional[FetchResult] = None
+    reason:      Optional[str]         = None      # why a lookup was bypassed
+
+    def as_metrics(self) -> Dict[str, Any]:
+        return {"status": self.status, "tables": list(self.tables), "reason": self.reason}
+
+
+@dataclass
+class _Entry:
+    fetched: FetchResult
+    tables:  Tuple[str, ...]
+    created: float = field(default_factory=time.monotonic)
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES, ttl: float = RESULT_CACHE_TTL,
+                 enabled: bool = RESULT_CACHE):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.ttl         = ttl
+        self.enabled     = enabled
+        self._lock       = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._generation: Dict[str, int] = {}
+        self._bytes         = 0
+        self._hits          = 0
+        self._misses        = 0
+        self._bypassed      = 0
+        self._evictions     = 0
+        self._invalidations = 0
+
+    # ── Lookup ──────────────────────────────────────────────────────────
+
+    def lookup(self, conn, target: str, sql: str) -> Lookup:
+        """Cached result for sql on a psycopg2 connection (EXPLAIN + one catalog query)."""
+        reason = self._precheck(sql)
+        if reason:
+            return self._bypass(reason)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (VERBOSE, FORMAT JSON) " + sql)
+                row = cur.fetchone()
+                refs, reason = _plan_relations(next(iter(row.values())) if isinstance(row, dict)
+                                               else row[0])
+                if reason or not refs:
+                    return self._bypass(reason or "no_tables")
+                cur.execute(_VERSIONS_SQL.format(param="%s"), (refs,))
+                rows = [tuple(r.values()) if isinstance(r, dict) else tuple(r)
+                        for r in cur.fetchall()]
+        except Exception as exc:
+            conn.rollback()
+            logger.info("ResultCache: plan / version lookup failed: %s", exc)
+            return self._bypass("version_lookup_failed")
+        return self._get(target, sql, rows)
+
+    async def alookup(self, conn, target: str, sql: str) -> Lookup:
+        """lookup() on an asyncpg connection."""
+        reason = self._precheck(sql)
+        if reason:
+            return self._bypass(reason)
+        try:
+            refs, reason = _plan_relations(await conn.fetchval("EXPLAIN (VERBOSE, FORMAT JSON) " + sql))
+            if reason or not refs:
+                return self._bypass(reason or "no_tables")
+            rows = [tuple(r) for r in await conn.fetch(_VERSIONS_SQL.format(param="$1"), refs)]
+        except Exception as exc:
+            logger.info("ResultCache: plan / version lookup failed: %s", exc)
+            return self._bypass("version_lookup_failed")
+        return self._get(target, sql, rows)
+
+    def _precheck(self, sql: str) -> Optional[str]:
+        if not self.enabled:
+            return "disabled"
+        if _VOLATILE.search(sql):
+            return "volatile"
+        return None
+
+    def _bypass(self, reason: str) -> Lookup:
+        with self._lock:
+            self._bypassed += 1
+        return Lookup("bypass", reason=reason)
+
+    def _get(self, target: str, sql: str, rows: List[Tuple[str, ...]]) -> Lookup:
+        if any(fqn is None for _, fqn, _, _ in rows):
+            return self._bypass("unresolved_relation")   # dropped since it was planned
+        if any(relkind not in _VERSIONED for _, _, relkind, _ in rows):
+            return self._bypass("unversioned_relation")
+        versions = sorted({(fqn.lower(), version) for _, fqn, _, version in rows})
+        tables = tuple(fqn for fqn, _ in versions)
+
+        now = time.monotonic()
+        with self._lock:
+            generations = tuple(self._generation.get(t, 0) for t in tables)
+            key = cache_key(target, normalize_sql(sql),
+                            *(f"{t}={v}:{g}" for (t, v), g in zip(versions, generations)))
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self.ttl or now - entry.created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return Lookup("hit", key, tables, generations, entry.fetched)
+                self._drop(key)
+            self._misses += 1
+            return Lookup("miss", key, tables, generations)
+
+    # ── Store / evict ───────────────────────────────────────────────────
+
+    def store(self, lookup: Lookup, fetched: FetchResult) -> None:
+        """Keep the result of a missed lookup (unless a table changed meanwhile)."""
+        if lookup.status != "miss" or fetched.bytes > self.max_bytes:
+            return
+        with self._lock:
+            if tuple(self._generation.get(t, 0) for t in lookup.tables) != lookup.generations:
+                return                                   # invalidated while the SQL ran
+            if lookup.key in self._entries:
+                self._drop(lookup.key)
+            self._entries[lookup.key] = _Entry(fetched, lookup.tables)
+            self._bytes += fetched.bytes
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.fetched.bytes
+
+    def invalidate_table(self, fqn: str) -> int:
+        """
+        Forget every result that read schema.table fqn (unquoted). Call after
+        the table is replaced or dropped; returns the number of entries dropped.
+        """
+        fqn = fqn.lower()
+        with self._lock:
+            self._generation[fqn] = self._generation.get(fqn, 0) + 1
+            stale = [k for k, e in self._entries.items() if fqn in e.tables]
+            for k in stale:
+                self._drop(k)
+            self._invalidations += 1
+        if stale:
+            logger.info("ResultCache: %s replaced — dropped %d cached results", fqn, len(stale))
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled":       self.enabled,
+                "entries":       len(self._entries),
+                "bytes":         self._bytes,
+                "max_entries":   self.max_entries,
+                "max_bytes":     self.max_bytes,
+                "hits":          self._hits,
+                "misses":        self._misses,
+                "bypassed":      self._bypassed,
+                "evictions":     self._evictions,
+                "invalidations": self._invalidations,
+                "hit_rate":      round(self._hits / lookups, 4) if lookups else 0.0,
+                "ttl_s":         self.ttl,
+            }
+
+
+result_cache = ResultCache()
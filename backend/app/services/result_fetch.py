@@ -0,0 +1,176 @@
+# backend/app/services/result_fetch.py
+"""
+Bounded result fetching over server-side cursors.
+
+cur.fetchall() materializes the whole result in the worker before a single
+row is used; a direct query or a generated SQL without LIMIT can pull
+millions of rows. fetch_capped() declares a named (server-side) cursor and
+pulls RESULT_FETCH_BATCH rows at a time until:
+
+  row cap   — RESULT_MAX_ROWS rows kept (one extra row is read to know
+              whether the result was truncated)
+  byte cap  — RESULT_MAX_BYTES of estimated row payload kept
+
+and then closes the cursor, so the remaining rows never leave the server.
+Rows are collected column by column into a ColumnarResult
+(services/columnar) on any cursor factory.
+
+afetch_capped() is the same on asyncpg (cursor inside a transaction);
+iter_capped() yields each batch as it arrives, for streaming responses.
+response_fields() turns the fetch metrics into the truncated /
+truncated_reason / bytes_fetched / result_cache keys of the query responses.
+"""
+from __future__ import annotations
+
+import datetime
+import decimal
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import psycopg2.extensions
+
+from app.services.columnar import ColumnarResult
+
+RESULT_MAX_ROWS    = int(os.getenv("RESULT_MAX_ROWS", "100000"))       # 0 = no row cap
+RESULT_MAX_BYTES   = int(os.getenv("RESULT_MAX_BYTES", str(64 << 20)))  # 0 = no byte cap
+RESULT_FETCH_BATCH = int(os.getenv("RESULT_FETCH_BATCH", "2000"))
+
+
+@dataclass
+class FetchResult:
+    rows:      ColumnarResult = field(default_factory=ColumnarResult)
+    bytes:     int            = 0
+    batches:   int            = 0
+    truncated: Optional[str]  = None   # None | "row_cap" | "byte_cap"
+
+    @property
+    def columns(self) -> List[str]:
+        return self.rows.columns
+
+    def as_metrics(self) -> Dict[str, Any]:
+        return {"rows": len(self.rows), "bytes": self.bytes, "batches": self.batches,
+                "truncated": self.truncated is not None, "reason": self.truncated}
+
+
+def response_fields(fetch: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Truncation and result-cache fields for an API response from metrics["fetch"]."""
+    fetch = fetch or {}
+    return {
+        "truncated":        fetch.get("truncated", False),
+        "truncated_reason": fetch.get("reason"),
+        "bytes_fetched":    fetch.get("bytes", 0),
+        "result_cache":     fetch.get("cache", "bypass"),   # "hit" | "miss" | "bypass"
+    }
+
+
+def _value_bytes(v: Any) -> int:
+    """Rough payload size of one value — cheap, not sys.getsizeof."""
+    if v is None:
+        return 0
+    if isinstance(v, (str, bytes, bytearray, memoryview)):
+        return len(v)
+    if isinstance(v, (bool, int, float)):
+        return 8
+    if isinstance(v, (decimal.Decimal, datetime.date, datetime.time, datetime.timedelta)):
+        return 16
+    return len(str(v))
+
+
+def _row_bytes(row: Any) -> int:
+    return sum(_value_bytes(v) for v in row)
+
+
+class _Collector:
+    """Applies the row / byte caps while batches arrive."""
+
+    def __init__(self, max_rows: int, max_bytes: int, result: Optional[FetchResult] = None):
+        self.max_rows  = max_rows
+        self.max_bytes = max_bytes
+        self.result    = result if result is not None else FetchResult()
+
+    def next_batch_size(self, batch: int) -> int:
+        if not self.max_rows:
+            return batch
+        # +1 so hitting the cap exactly can be told apart from truncation
+        return max(1, min(batch, self.max_rows + 1 - len(self.result.rows)))
+
+    def begin(self, columns: List[str]) -> None:
+        if not self.result.columns:
+            self.result.rows = ColumnarResult(columns)
+
+    def add(self, batch: List[Any]) -> bool:
+        """Keep rows (value tuples) from a batch; False once a cap is hit (stop fetching)."""
+        r = self.result
+        r.batches += 1
+        for row in batch:
+            if self.max_rows and len(r.rows) >= self.max_rows:
+                r.truncated = "row_cap"
+                return False
+            size = _row_bytes(row)
+            if self.max_bytes and r.bytes + size > self.max_bytes and r.rows:
+                r.truncated = "byte_cap"
+                return False
+            r.bytes += size
+            r.rows.append(row)
+        return True
+
+    def done(self) -> FetchResult:
+        self.result.rows.freeze()
+        return self.result
+
+
+def fetch_capped(conn, sql: str, params: Any = None, *,
+                 max_rows: int = RESULT_MAX_ROWS, max_bytes: int = RESULT_MAX_BYTES,
+                 batch: int = RESULT_FETCH_BATCH) -> FetchResult:
+    """Run sql on a psycopg2 connection through a named cursor, within the caps."""
+    result = FetchResult()
+    for _ in iter_capped(conn, sql, params, result=result,
+                         max_rows=max_rows, max_bytes=max_bytes, batch=batch):
+        pass
+    return result
+
+
+def iter_capped(conn, sql: str, params: Any = None, *, result: FetchResult,
+                max_rows: int = RESULT_MAX_ROWS, max_bytes: int = RESULT_MAX_BYTES,
+                batch: int = RESULT_FETCH_BATCH) -> Iterator[List[Any]]:
+    """
+    fetch_capped() as a generator for streaming responses: yields the rows
+    kept from each batch as soon as it comes off the cursor. result collects
+    the columns, rows and counters (complete once the generator is exhausted).
+    """
+    collector = _Collector(max_rows, max_bytes, result)
+    name = f"dbq_{uuid.uuid4().hex}"
+    with conn.cursor(name=name, cursor_factory=psycopg2.extensions.cursor) as cur:
+        cur.itersize = batch
+        cur.execute(sql, params)
+        while True:
+            n = collector.next_batch_size(batch)
+            rows = cur.fetchmany(n)
+            if cur.description:
+                collector.begin([d.name for d in cur.description])
+            before = len(result.rows)
+            more = bool(rows) and collector.add(rows) and len(rows) == n
+            if len(result.rows) > before:
+                yield rows[:len(result.rows) - before]
+            if not more:
+                break
+    collector.done()
+
+
+async def afetch_capped(conn, sql: str, *args: Any,
+                        max_rows: int = RESULT_MAX_ROWS, max_bytes: int = RESULT_MAX_BYTES,
+                        batch: int = RESULT_FETCH_BATCH) -> FetchResult:
+    """fetch_capped() on an asyncpg connection."""
+    collector = _Collector(max_rows, max_bytes)
+    async with conn.transaction(readonly=True):
+        stmt = await conn.prepare(sql)
+        collector.begin([a.name for a in stmt.get_attributes()])
+        cur = await stmt.cursor(*args)
+        while True:
+            n = collector.next_batch_size(batch)
+            rows = await cur.fetch(n)
+            if not rows or not collector.add(rows) or len(rows) < n:
+                break
+    return collector.done()
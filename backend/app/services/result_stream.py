@@ -0,0 +1,60 @@
+# backend/app/services/result_stream.py
+"""
+NDJSON result streams.
+
+The */stream query routes answer with one JSON object per line
+(application/x-ndjson) instead of one document once everything is done:
+
+  {"event": "sql", "sql": ...}                      as soon as the SQL is known
+  {"event": "columns", "columns": [...]}
+  {"event": "rows", "rows": [[...], ...]}           one per batch, in columns order
+  {"event": "result", "count": N, "execution_time_ms": ..., "truncated": ..., ...}
+  {"event": "profile" | "summary" | "viz" | "eda_insights", "data": ...}
+  {"event": "done", "total_ms": ...}
+
+A failure after the stream has started is sent as {"event": "error",
+"detail": ...} and ends the stream. Rows reach the client before the
+profiling / insight / viz agents run and before the EDA Gemini call.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Iterable, Iterator, List
+
+from app.core.fast_json import dumps
+from app.services.columnar import as_table
+from app.services.result_fetch import RESULT_FETCH_BATCH, FetchResult
+
+NDJSON = "application/x-ndjson"
+
+
+def event(name: str, **fields: Any) -> bytes:
+    """One NDJSON line (orjson, same value handling as FastJSONResponse)."""
+    return dumps({"event": name, **fields}) + b"\n"
+
+
+def fetch_events(batches: Iterable[List[Any]], fetched: FetchResult) -> Iterator[bytes]:
+    """columns + rows events for iter_capped() batches, as they come off the cursor."""
+    sent_columns = False
+    for rows in batches:
+        if not sent_columns:
+            yield event("columns", columns=fetched.columns)
+            sent_columns = True
+        yield event("rows", rows=rows)
+    if not sent_columns:
+        yield event("columns", columns=fetched.columns)
+
+
+def row_events(rows: Any, batch: int = RESULT_FETCH_BATCH) -> Iterator[bytes]:
+    """columns + rows events for a result already in memory."""
+    table = as_table(rows)
+    yield event("columns", columns=table.columns)
+    for start in range(0, len(table), batch):
+        yield event("rows", rows=table.to_rows(start, start + batch))
+
+
+async def arow_events(rows: Any, batch: int = RESULT_FETCH_BATCH) -> AsyncIterator[bytes]:
+    """row_events() for async generators — each batch is encoded in a worker thread."""
+    lines = row_events(rows, batch)
+    while (line := await asyncio.to_thread(next, lines, None)) is not None:
+        yield line
@@ -0,0 +1,128 @@
+# backend/app/services/schema_cache.py
+"""
+In-process cache of PostgreSQL schema discovery results.
+
+PgSchemaAgent stores what it introspects (tables_schema, enum_values,
+join_hints, ...) per target database. An entry stays valid while
+
+  1. the catalog fingerprint is unchanged — one cheap pg_catalog query that
+     moves whenever a table is created, dropped, rewritten or altered
+     (relation count, max pg_class/pg_attribute xmin, sum of relfilenode), and
+  2. it is younger than SCHEMA_CACHE_TTL seconds — data-dependent parts such
+     as enum values drift without DDL, so entries still age out.
+
+Keys are credential-safe (app.core.pg_pool.dsn_key).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("db_assistant.schema_cache")
+
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "600"))
+SCHEMA_CACHE_MAX = int(os.getenv("SCHEMA_CACHE_MAX", "64"))
+
+_FINGERPRINT_SQL = r"""
+    WITH rel AS (
+        SELECT c.oid, c.xmin::text::bigint AS x, c.relfilenode::bigint AS f
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p', 'v', 'm')
+          AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+          AND n.nspname NOT LIKE 'pg\_toast%'
+    )
+    SELECT (SELECT count(*) FROM rel)                 || ':' ||
+           (SELECT coalesce(max(x), 0) FROM rel)      || ':' ||
+           (SELECT coalesce(sum(f), 0) FROM rel)      || ':' ||
+           (SELECT coalesce(max(a.xmin::text::bigint), 0)
+              FROM pg_attribute a JOIN rel ON rel.oid = a.attrelid
+             WHERE a.attnum > 0)                      AS fingerprint
+"""
+
+
+@dataclass
+class SchemaSnapshot:
+    fingerprint:   str
+    tables_schema: Dict[str, List[Dict]] = field(default_factory=dict)
+    enum_values:   Dict[str, List[str]]  = field(default_factory=dict)
+    join_hints:    List[str]             = field(default_factory=list)
+    extra:         Dict[str, Any]        = field(default_factory=dict)
+    built_at:      float                 = field(default_factory=time.monotonic)
+    build_ms:      int                   = 0
+
+
+def schema_fingerprint(conn) -> str:
+    """One round trip; works with tuple and RealDictCursor connections."""
+    with conn.cursor() as cur:
+        cur.execute(_FINGERPRINT_SQL)
+        row = cur.fetchone()
+    return str(row["fingerprint"] if isinstance(row, dict) else row[0])
+
+
+async def aschema_fingerprint(conn) -> str:
+    """schema_fingerprint() on an asyncpg connection."""
+    return str(await conn.fetchval(_FINGERPRINT_SQL))
+
+
+class SchemaCache:
+    def __init__(self, max_entries: int = SCHEMA_CACHE_MAX, ttl: float = SCHEMA_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self._lock       = threading.Lock()
+        self._entries: "OrderedDict[str, SchemaSnapshot]" = OrderedDict()
+        self._hits          = 0
+        self._misses        = 0
+        self._invalidations = 0
+
+    def get(self, key: str, fingerprint: str) -> Optional[SchemaSnapshot]:
+        with self._lock:
+            snap = self._entries.get(key)
+            if snap is None:
+                self._misses += 1
+                return None
+            expired = self.ttl and time.monotonic() - snap.built_at > self.ttl
+            if expired or snap.fingerprint != fingerprint:
+                del self._entries[key]
+                self._invalidations += 1
+                self._misses += 1
+                logger.info("SchemaCache: %s entry dropped (%s)", key[:12],
+                            "ttl" if expired else "catalog changed")
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return snap
+
+    def put(self, key: str, snap: SchemaSnapshot) -> None:
+        with self._lock:
+            self._entries[key] = snap
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries":       len(self._entries),
+                "hits":          self._hits,
+                "misses":        self._misses,
+                "invalidations": self._invalidations,
+                "hit_rate":      round(self._hits / lookups, 4) if lookups else 0.0,
+                "ttl_s":         self.ttl,
+            }
+
+
+schema_cache = SchemaCache()
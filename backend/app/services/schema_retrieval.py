@@ -0,0 +1,176 @@
+# backend/app/services/schema_retrieval.py
+"""
+Question-relevant table retrieval for large PostgreSQL schemas.
+
+A BM25 index over one "document" per table:
+  table name (x3), column names (x2), table/column comments,
+  enum values and column sample values.
+
+select_tables() takes the top-k tables for a question and expands them
+along the join graph:
+  1. bridge tables on the join paths connecting the top-k tables
+  2. direct foreign-key / key neighbours (lookup tables), best-scored first
+
+The index is pure Python and built once per schema snapshot
+(PgSchemaAgent stores it in the schema cache).
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SCHEMA_RETRIEVAL_TOP_K    = int(os.getenv("SCHEMA_RETRIEVAL_TOP_K", "8"))
+SCHEMA_RETRIEVAL_EXPAND   = int(os.getenv("SCHEMA_RETRIEVAL_EXPAND", "4"))
+SCHEMA_PROMPT_MAX_TOKENS  = int(os.getenv("SCHEMA_PROMPT_MAX_TOKENS", "6000"))
+
+_K1 = 1.2
+_B  = 0.75
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "with", "and", "or",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "has", "have",
+    "what", "which", "who", "whom", "whose", "how", "many", "much", "when",
+    "where", "why", "show", "list", "give", "me", "find", "get", "all", "each",
+    "per", "from", "that", "this", "these", "those", "it", "its", "their",
+    "there", "than", "then", "as", "at", "into", "top", "most", "least",
+}
+
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_WORD_RE  = re.compile(r"[^\W_]+")
+
+
+def _stem(tok: str) -> str:
+    if len(tok) > 4 and tok.endswith("ies"):
+        return tok[:-3] + "y"
+    if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+        return tok[:-1]
+    return tok
+
+
+def tokenize(text: str) -> List[str]:
+    """Split snake_case / camelCase / free text into stemmed lowercase terms."""
+    words = _WORD_RE.findall(_CAMEL_RE.sub(" ", str(text or "")))
+    return [_stem(w.lower()) for w in words if w.lower() not in _STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token; close enough for budgeting prompts."""
+    return (len(text) + 3) // 4
+
+
+class SchemaIndex:
+    def __init__(self):
+        self.docs:    Dict[str, Counter] = {}
+        self.lengths: Dict[str, int]     = {}
+        self.idf:     Dict[str, float]   = {}
+        self.avg_len: float              = 1.0
+
+    @classmethod
+    def build(
+        cls,
+        tables_schema: Dict[str, List[Dict]],
+        table_stats: Optional[Dict[str, Dict[str, Any]]] = None,
+        enum_values: Optional[Dict[str, List[str]]] = None,
+    ) -> "SchemaIndex":
+        idx = cls()
+        table_stats = table_stats or {}
+        values_by_table: Dict[str, List[str]] = {}
+        for key, vals in (enum_values or {}).items():
+            fqn = key.rsplit(".", 1)[0]
+            values_by_table.setdefault(fqn, []).extend(str(v) for v in vals)
+
+        for fqn, cols in tables_schema.items():
+            terms: Counter = Counter()
+            for t in tokenize(fqn.rsplit(".", 1)[-1]):
+                terms[t] += 3
+            comment = (table_stats.get(fqn) or {}).get("comment")
+            terms.update(tokenize(comment))
+            for c in cols:
+                for t in tokenize(c.get("name", "")):
+                    terms[t] += 2
+                terms.update(tokenize(c.get("comment")))
+                for v in (c.get("sample_values") or [])[:10]:
+                    terms.update(tokenize(v))
+            for v in values_by_table.get(fqn, ()):
+                terms.update(tokenize(v))
+            idx.docs[fqn] = terms
+            idx.lengths[fqn] = sum(terms.values())
+
+        n = len(idx.docs)
+        if n:
+            idx.avg_len = sum(idx.lengths.values()) / n or 1.0
+            df: Counter = Counter()
+            for terms in idx.docs.values():
+                df.update(terms.keys())
+            idx.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+        return idx
+
+    def search(self, question: str,
+               candidates: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """BM25 scores > 0, best first."""
+        q_terms = set(tokenize(question))
+        pool = self.docs if candidates is None else {
+            t: self.docs[t] for t in candidates if t in self.docs
+        }
+        scored = []
+        for fqn, terms in pool.items():
+            norm = _K1 * (1 - _B + _B * self.lengths[fqn] / self.avg_len)
+            score = 0.0
+            for t in q_terms:
+                tf = terms.get(t)
+                if tf:
+                    score += self.idf[t] * tf * (_K1 + 1) / (tf + norm)
+            if score > 0:
+                scored.append((fqn, score))
+        scored.sort(key=lambda x: -x[1])
+        return scored
+
+
+def select_tables(
+    index: SchemaIndex,
+    question: str,
+    tables: Iterable[str],
+    join_graph=None,
+    top_k: int = SCHEMA_RETRIEVAL_TOP_K,
+    expand: int = SCHEMA_RETRIEVAL_EXPAND,
+    pinned: Iterable[str] = (),
+) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Returns (tables in prompt order, info). `pinned` tables (e.g. holding a
+    value the question mentions) are always seeds. An empty list means
+    nothing in the question matched and the caller should keep the full schema.
+    """
+    tables  = list(tables)
+    allowed = set(tables)
+    ranked  = index.search(question, candidates=tables)
+    scores  = dict(ranked)
+    pinned  = [t for t in dict.fromkeys(pinned) if t in allowed]
+    seeds   = list(dict.fromkeys(pinned + [t for t, _ in ranked]))[:max(top_k, len(pinned))]
+    info: Dict[str, Any] = {"matched": len(ranked), "pinned": len(pinned),
+                            "seeds": len(seeds), "bridges": 0, "neighbours": 0}
+    if not seeds:
+        return [], info
+
+    selected = list(seeds)
+    chosen   = set(seeds)
+    if join_graph is not None:
+        for e in join_graph.paths_between(seeds):
+            for t in (e.left, e.right):
+                if t in allowed and t not in chosen:
+                    selected.append(t)
+                    chosen.add(t)
+                    info["bridges"] += 1
+
+        neighbours = {
+            nbr for t in seeds
+            for nbr, e in join_graph.adj.get(t, {}).items()
+            if e.kind in ("fk", "key") and nbr in allowed and nbr not in chosen
+        }
+        for t in sorted(neighbours, key=lambda t: (-scores.get(t, 0.0), t))[:expand]:
+            selected.append(t)
+            chosen.add(t)
+            info["neighbours"] += 1
+    return selected, info
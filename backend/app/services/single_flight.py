@@ -0,0 +1,127 @@
+# backend/app/services/single_flight.py
+"""
+In-flight deduplication ("single flight") of identical calls.
+
+Concurrent callers with the same key share one execution: the first caller
+(leader) runs the function, the rest (followers) wait for it and receive the
+same result, or the same exception. Nothing is cached — once the flight
+lands the key is free again, so the next caller starts a fresh call.
+
+Used by LLMClient to coalesce identical Gemini prompts sent in parallel by
+swarm workers, concurrent users asking the same question, etc., and by
+PgSchemaAgent so concurrent schema-cache misses run one introspection.
+
+  do(key, fn)          sync callers, threads block on the leader's Event
+  ado(key, coro_fn)    async callers share one asyncio Task. A cancelled
+                       caller only stops waiting; the upstream call is
+                       cancelled once no caller is waiting for it any more.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done   = threading.Event()
+        self.result = None
+        self.error  = None
+
+
+class _AsyncFlight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task    = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._async: Dict[Tuple[int, str], _AsyncFlight] = {}   # (loop id, key) -> flight
+        self.leaders   = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(result, shared) — shared is True when another caller's call was
+        reused, so it is always False for the leader."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.result, False
+
+    async def ado(self, key: str, coro_fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async do(). Flights are per event loop; tasks cannot be shared across loops."""
+        loop = asyncio.get_running_loop()
+        fkey = (id(loop), key)
+        with self._lock:
+            flight = self._async.get(fkey)
+            shared = flight is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                flight = self._async[fkey] = _AsyncFlight(loop.create_task(coro_fn()))
+                flight.task.add_done_callback(lambda _t: self._land(fkey, flight))
+                self.leaders += 1
+            flight.waiters += 1
+
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done():
+                # This caller went away; the shared call keeps running for the others
+                with self._lock:
+                    flight.waiters -= 1
+                    orphaned = flight.waiters == 0
+                    self.cancelled += 1
+                if orphaned:
+                    flight.task.cancel()
+            raise
+        with self._lock:
+            flight.waiters -= 1
+        return result, shared
+
+    def _land(self, fkey: Tuple[int, str], flight: _AsyncFlight) -> None:
+        with self._lock:
+            if self._async.get(fkey) is flight:
+                del self._async[fkey]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "in_flight":      len(self._flights) + len(self._async),
+                "leaders":        self.leaders,
+                "coalesced":      self.coalesced,
+                "cancelled":      self.cancelled,
+                "coalesce_rate":  round(self.coalesced / calls, 4) if calls else 0.0,
+            }
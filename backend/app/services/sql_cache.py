@@ -0,0 +1,184 @@
+# backend/app/services/sql_cache.py
+"""
+Content-addressed cache of generated SQL.
+
+generate_sql() is called with byte-identical inputs all the time (dashboard
+refreshes, benchmark retries, repeated plugin questions, swarm subtasks).
+The key is a hash of everything that determines the model's answer:
+
+  sha256(system prompt hash, model, schema prompt + question text)
+
+The schema prompt embeds the tables, columns, join hints and linked values,
+so any schema change produces a new key by construction.
+
+Two tiers, both with TTL:
+  1. in-process LRU           SQL_CACHE_MAX entries
+  2. local sqlite file        SQL_CACHE_DISK_MAX rows, survives restarts
+                              (SQL_CACHE_PATH; "off" disables the tier)
+
+A cached statement that later fails to execute is invalidated by the
+caller (ReActAgent), so a bad generation is not served again.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("db_assistant.sql_cache")
+
+SQL_CACHE_TTL      = float(os.getenv("SQL_CACHE_TTL", "86400"))
+SQL_CACHE_MAX      = int(os.getenv("SQL_CACHE_MAX", "1024"))
+SQL_CACHE_DISK_MAX = int(os.getenv("SQL_CACHE_DISK_MAX", "20000"))
+SQL_CACHE_PATH     = os.getenv(
+    "SQL_CACHE_PATH", os.path.join(tempfile.gettempdir(), "db_assistant_sql_cache.sqlite3"))
+
+_PRUNE_EVERY = 200   # disk puts between size/TTL prunes
+
+
+def cache_key(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8", "surrogatepass"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class SQLCache:
+    def __init__(self, max_entries: int = SQL_CACHE_MAX, ttl: float = SQL_CACHE_TTL,
+                 path: str = SQL_CACHE_PATH, disk_max: int = SQL_CACHE_DISK_MAX):
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self.disk_max    = disk_max
+        self._lock       = threading.Lock()
+        self._mem: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()   # key -> (sql, created)
+        self._db: Optional[sqlite3.Connection] = None
+        self._puts = 0
+        self._hits = {"memory": 0, "disk": 0}
+        self._misses = 0
+        self._invalidations = 0
+
+        if path and path.lower() != "off":
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS sql_cache ("
+                    " key TEXT PRIMARY KEY, sql TEXT NOT NULL,"
+                    " created REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS sql_cache_last_used ON sql_cache (last_used)")
+            except Exception as exc:
+                logger.warning("SQLCache: disk tier disabled (%s): %s", path, exc)
+                self._db = None
+
+    def _fresh(self, created: float, now: float) -> bool:
+        return not self.ttl or now - created <= self.ttl
+
+    def _remember(self, key: str, sql: str, created: float) -> None:
+        self._mem[key] = (sql, created)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """(sql, tier) — tier is "memory" / "disk", or (None, None) on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if self._fresh(entry[1], now):
+                    self._mem.move_to_end(key)
+                    self._hits["memory"] += 1
+                    return entry[0], "memory"
+                del self._mem[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT sql, created FROM sql_cache WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        if self._fresh(row[1], now):
+                            self._db.execute(
+                                "UPDATE sql_cache SET last_used = ? WHERE key = ?", (now, key))
+                            self._remember(key, row[0], row[1])
+                            self._hits["disk"] += 1
+                            return row[0], "disk"
+                        self._db.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                except sqlite3.Error as exc:
+                    logger.warning("SQLCache: disk read failed: %s", exc)
+
+            self._misses += 1
+            return None, None
+
+    def put(self, key: str, sql: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, sql, now)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sql_cache (key, sql, created, last_used) "
+                    "VALUES (?, ?, ?, ?)", (key, sql, now, now))
+                self._puts += 1
+                if self._puts % _PRUNE_EVERY == 0:
+                    self._prune_disk(now)
+            except sqlite3.Error as exc:
+                logger.warning("SQLCache: disk write failed: %s", exc)
+
+    def _prune_disk(self, now: float) -> None:
+        if self.ttl:
+            self._db.execute("DELETE FROM sql_cache WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM sql_cache WHERE key IN ("
+            " SELECT key FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max,))
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._mem.pop(key, None)
+            self._invalidations += 1
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                except sqlite3.Error as exc:
+                    logger.warning("SQLCache: disk delete failed: %s", exc)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM sql_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            disk_rows = None
+            if self._db is not None:
+                try:
+                    disk_rows = self._db.execute("SELECT count(*) FROM sql_cache").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            hits = self._hits["memory"] + self._hits["disk"]
+            lookups = hits + self._misses
+            return {
+                "memory_entries": len(self._mem),
+                "disk_entries":   disk_rows,
+                "hits_memory":    self._hits["memory"],
+                "hits_disk":      self._hits["disk"],
+                "misses":         self._misses,
+                "invalidations":  self._invalidations,
+                "hit_rate":       round(hits / lookups, 4) if lookups else 0.0,
+                "ttl_s":          self.ttl,
+            }
+
+
+sql_cache = SQLCache()
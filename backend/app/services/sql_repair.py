@@ -0,0 +1,238 @@
+# backend/app/services/sql_repair.py
+"""
+Rule-based repair of mechanical SQL errors (no LLM call).
+
+Most failed ReAct attempts are not reasoning mistakes but spelling ones:
+a column in the wrong case, a typo'd table, schema.table.col next to an
+alias, a doubled LIMIT, a bare table name. repair_sql() fixes one such
+error from the structured sql_error (services/sql_validator) and the
+schema the prompt was built from:
+
+  undefined_column    — Postgres' own "Perhaps you meant ..." hint, else a
+                        case-insensitive / fuzzy match among the columns of
+                        the tables in FROM (quoted when mixed case)
+  undefined_table     — "invalid reference to FROM-clause entry": switch
+                        to the alias; unknown relation: fuzzy match against
+                        tables_schema and use the fully qualified name
+  syntax_error        — back-to-back LIMIT clauses the error points at
+
+Ambiguous columns go back to the model: which table was meant is a
+semantic choice, not a spelling fix. Each call fixes at most one error;
+PgRepairAgent re-validates with EXPLAIN and calls again while the next
+error is also repairable. Rewrites skip string literals.
+"""
+from __future__ import annotations
+
+import difflib
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_FUZZY_CUTOFF = 0.75
+
+_LITERAL   = re.compile(r"('(?:[^']|'')*')")
+_LIMIT_RUN = re.compile(r"\bLIMIT\s+\d+(?:\s+LIMIT\s+\d+)+", re.IGNORECASE)
+_NEAR_LIMIT = re.compile(r'syntax error at or near "LIMIT"', re.IGNORECASE)
+_IDENT     = r'(?:"[^"]+"|\w+)'
+_FROM_ITEM = re.compile(
+    rf"\b(?:FROM|JOIN)\s+({_IDENT}(?:\.{_IDENT})?)"
+    rf"(?:\s+(?:AS\s+)?(?!(?:ON|USING|WHERE|JOIN|INNER|LEFT|RIGHT|FULL|CROSS|NATURAL|GROUP|ORDER|"
+    rf"LIMIT|HAVING|UNION|EXCEPT|INTERSECT|WINDOW|OFFSET|FETCH|FOR|LATERAL)\b)({_IDENT}))?",
+    re.IGNORECASE,
+)
+# FROM that is not a table: EXTRACT(year FROM col), TRIM(x FROM y), IS DISTINCT FROM
+_NOT_A_TABLE  = re.compile(
+    r"(?:\b(?:EXTRACT|SUBSTRING|TRIM|OVERLAY|POSITION)\s*\([^()]*|\bDISTINCT\s+)$", re.IGNORECASE)
+_SAFE_IDENT   = re.compile(r"[a-z_][a-z0-9_$]*")
+_COLUMN_MSG   = re.compile(r'column ("?[\w.]+"?(?:\."?\w+"?)*) does not exist', re.IGNORECASE)
+_SUGGESTION   = re.compile(r'Perhaps you meant to reference the (?:column|table alias) "([^"]+)"')
+_FROM_REF_MSG = re.compile(r'invalid reference to FROM-clause entry for table "([^"]+)"')
+
+
+def _unquote(ident: str) -> str:
+    return ident[1:-1].replace('""', '"') if ident.startswith('"') else ident
+
+
+def quote_ident(name: str) -> str:
+    """Identifier as Postgres needs it written (quoted unless plain lower case)."""
+    if _SAFE_IDENT.fullmatch(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_fqn(fqn: str) -> str:
+    return ".".join(quote_ident(p) for p in fqn.split(".", 1))
+
+
+def _outside_literals(sql: str, pattern: "re.Pattern[str]", repl) -> Tuple[str, int]:
+    """re.subn over the parts of sql that are not string literals."""
+    parts = _LITERAL.split(sql)
+    total = 0
+    for i in range(0, len(parts), 2):
+        parts[i], n = pattern.subn(repl, parts[i])
+        total += n
+    return "".join(parts), total
+
+
+def from_refs(sql: str) -> List[Tuple[str, str]]:
+    """(table reference, name used to qualify its columns) for each FROM/JOIN table."""
+    refs: List[Tuple[str, str]] = []
+    text = _LITERAL.sub("''", sql)
+    for m in _FROM_ITEM.finditer(text):
+        if _NOT_A_TABLE.search(text, 0, m.start()):
+            continue
+        ref = ".".join(_unquote(p) for p in re.findall(_IDENT, m.group(1)))
+        refs.append((ref, m.group(2) or m.group(1)))
+    return refs
+
+
+def from_items(sql: str, tables_schema: Dict[str, List[Dict]]) -> List[Tuple[str, str]]:
+    """from_refs() resolved against tables_schema (unknown tables are skipped)."""
+    by_lower = {fqn.lower(): fqn for fqn in tables_schema}
+    by_table: Dict[str, str] = {}
+    for fqn in tables_schema:
+        by_table.setdefault(fqn.rsplit(".", 1)[-1].lower(), fqn)
+    items: List[Tuple[str, str]] = []
+    for ref, qualifier in from_refs(sql):
+        fqn = by_lower.get(ref.lower()) or by_table.get(ref.rsplit(".", 1)[-1].lower())
+        if fqn:
+            items.append((fqn, qualifier))
+    return items
+
+
+def _match(name: str, candidates: List[str]) -> Optional[str]:
+    """Case-insensitive exact match, else the single closest fuzzy match."""
+    exact = [c for c in candidates if c.lower() == name.lower()]
+    if exact:
+        return exact[0]
+    lowered = {c.lower(): c for c in candidates}
+    close = difflib.get_close_matches(name.lower(), list(lowered), n=2, cutoff=_FUZZY_CUTOFF)
+    if not close:
+        return None
+    ratio = lambda c: difflib.SequenceMatcher(None, name.lower(), c).ratio()
+    # A tie between two candidates is a guess — leave it to the model
+    if len(close) == 2 and ratio(close[0]) == ratio(close[1]):
+        return None
+    return lowered[close[0]]
+
+
+def _token(name: str) -> str:
+    """Regex for an identifier as written: bare (any case) or quoted."""
+    return rf'(?:"{re.escape(name)}"|(?<![\w"]){re.escape(name)}(?![\w"]))'
+
+
+# ── Rules ───────────────────────────────────────────────────────────────
+
+def _fix_duplicate_limit(sql: str, err: Dict[str, Any]) -> Optional[str]:
+    """
+    LIMIT a LIMIT b written back to back (same nesting level) → LIMIT b,
+    only when the syntax error is at a LIMIT. LIMITs elsewhere (subqueries,
+    CTEs) are never touched. When the error position falls inside one such
+    run it must point past its first LIMIT; otherwise there must be exactly
+    one run (execution errors report positions in the DECLARE statement).
+    """
+    if not _NEAR_LIMIT.search(err.get("message") or ""):
+        return None
+    # literals blanked in place, so offsets still match sql
+    text = _LITERAL.sub(lambda m: "'" + " " * (len(m.group(0)) - 2) + "'", sql)
+    runs = list(_LIMIT_RUN.finditer(text))
+    pos = err.get("position")
+    if pos is not None and any(m.start() <= pos - 1 < m.end() for m in runs):
+        runs = [m for m in runs if m.start() < pos - 1 < m.end()]
+    if len(runs) != 1:
+        return None
+    run = runs[0]
+    last = list(re.finditer(r"\bLIMIT\b", run.group(0), re.IGNORECASE))[-1]
+    return sql[:run.start()] + run.group(0)[last.start():] + sql[run.end():]
+
+
+def _fix_column(sql: str, err: Dict[str, Any],
+                tables_schema: Dict[str, List[Dict]]) -> Optional[str]:
+    m = _COLUMN_MSG.search(err.get("message") or "")
+    if not m:
+        return None
+    parts = [_unquote(p) for p in re.findall(_IDENT, m.group(1))]
+    bad, qualifier = parts[-1], (parts[-2] if len(parts) > 1 else None)
+
+    fix: Optional[str] = None
+    hint = _SUGGESTION.search(err.get("hint") or "")
+    if hint:
+        fix = hint.group(1).rsplit(".", 1)[-1]
+    else:
+        items = from_items(sql, tables_schema)
+        if qualifier:
+            items = [(fqn, q) for fqn, q in items
+                     if _unquote(q).lower() == qualifier.lower()
+                     or fqn.rsplit(".", 1)[-1].lower() == qualifier.lower()] or items
+        tables = [fqn for fqn, _ in items] or list(tables_schema)
+        columns = list(dict.fromkeys(c["name"] for fqn in tables for c in tables_schema[fqn]))
+        fix = _match(bad, columns)
+    if not fix or fix == bad:
+        return None
+
+    if qualifier:
+        pattern = re.compile(rf"({_token(qualifier)}\.){_token(bad)}", re.IGNORECASE)
+        repl = lambda mm: mm.group(1) + quote_ident(fix)
+    else:
+        pattern = re.compile(rf"(?<!\.){_token(bad)}", re.IGNORECASE)
+        repl = lambda mm: quote_ident(fix)
+    out, n = _outside_literals(sql, pattern, repl)
+    return out if n else None
+
+
+def _fix_from_reference(sql: str, err: Dict[str, Any]) -> Optional[str]:
+    """schema.table.col / table.col where the table has an alias → alias.col."""
+    m = _FROM_REF_MSG.search(err.get("message") or "")
+    hint = _SUGGESTION.search(err.get("hint") or "")
+    if not m or not hint:
+        return None
+    table, alias = m.group(1), hint.group(1)
+    pattern = re.compile(rf"(?:{_IDENT}\.)?{_token(table)}\.(?={_IDENT})", re.IGNORECASE)
+    out, n = _outside_literals(sql, pattern, lambda _: quote_ident(alias) + ".")
+    return out if n else None
+
+
+def _fix_table(sql: str, err: Dict[str, Any],
+               tables_schema: Dict[str, List[Dict]]) -> Optional[str]:
+    m = re.search(r'relation "([^"]+)" does not exist', err.get("message") or "")
+    if not m:
+        return None
+    ref = m.group(1)
+    schema, _, table = ref.rpartition(".")
+    names = {fqn.rsplit(".", 1)[-1]: fqn for fqn in tables_schema}
+    fqn = next((f for f in tables_schema if f.lower() == ref.lower()), None)
+    if fqn is None:
+        name = _match(table, list(names))
+        fqn = names.get(name) if name else None
+    if fqn is None:
+        return None
+
+    written = rf"(?:{_token(schema)}\.)?{_token(table)}" if schema else \
+              rf"(?:{_IDENT}\.)?{_token(table)}"
+    pattern = re.compile(rf"(\b(?:FROM|JOIN)\s+){written}(?![\w.\"])", re.IGNORECASE)
+    out, n = _outside_literals(sql, pattern, lambda mm: mm.group(1) + _quote_fqn(fqn))
+    return out if n and out != sql else None
+
+
+def repair_sql(sql: str, err: Optional[Dict[str, Any]],
+               tables_schema: Dict[str, List[Dict]]) -> Optional[Tuple[str, str]]:
+    """(rewritten sql, rule name) for a mechanically fixable error, else None."""
+    if not err or not sql:
+        return None
+    kind = err.get("kind")
+    message = err.get("message") or ""
+    fixed: Optional[str] = None
+    rule = kind or "unknown"
+
+    if kind == "syntax_error":
+        fixed, rule = _fix_duplicate_limit(sql, err), "duplicate_limit"
+    elif kind == "undefined_column":
+        fixed = _fix_column(sql, err, tables_schema)
+    elif kind == "undefined_table":
+        if _FROM_REF_MSG.search(message):
+            fixed, rule = _fix_from_reference(sql, err), "alias_reference"
+        else:
+            fixed = _fix_table(sql, err, tables_schema)
+
+    if not fixed or fixed == sql:
+        return None
+    return fixed, rule
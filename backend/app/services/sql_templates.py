@@ -0,0 +1,528 @@
+# backend/app/services/sql_templates.py
+"""
+Parameterized SQL templates mined from past successful questions.
+
+query_history and query_audit_log hold question → SQL pairs that returned
+rows. A pair becomes a template by turning every SQL literal that also
+appears in the question into a slot:
+
+  "top 5 customers in Berlin"             → "top <n0> customers in <s1>"
+  SELECT ... WHERE city = 'Berlin' LIMIT 5 → ... WHERE city = '⟦1⟧' LIMIT ⟦0⟧
+
+Literals the question does not mention (LIMIT 1 for "which ...", 100.0 in a
+percentage) stay part of the template.
+
+match() shortlists templates through an inverted index on the question's
+non-slot terms, then fills the slots from the new question:
+
+  1. exact shape — the skeleton as a regex (slots become capture groups);
+     confidence 1.0 when every string slot caught a single word or a value
+     that value linking confirms for the slot's column, otherwise the fill
+     is scored as a near shape
+  2. near shape  — numbers in order, string slots from value linking
+     (state.value_links for the slot's column); confidence = Jaccard of
+     the non-slot terms, accepted at SQL_TEMPLATE_MIN_SCORE
+
+String slot values are re-cased to the stored value when value linking
+knows it. PgTemplateAgent validates the filled SQL with EXPLAIN before it
+runs; a hit skips Gemini entirely.
+
+Templates carry SQL, schema names and literals from one tenant's queries,
+so they never leave their scope: template_scope() is the target
+(dsn_key(pg_uri)) plus the user when the caller knows one. History is mined
+per scope — only that user's rows, and only rows that ran against that
+target (audit-log rows through their saved connection, query_history rows
+on the system DB). Every FROM/JOIN table of a template is resolved to its
+schema-qualified name when it is learned; match() requires each of those
+names to exist as-is in the current schema.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.pg_pool import dsn_key, normalize_dsn
+from app.services.schema_retrieval import tokenize
+from app.services.sql_repair import from_refs
+
+logger = logging.getLogger("db_assistant.sql_templates")
+
+SQL_TEMPLATES             = os.getenv("SQL_TEMPLATES", "1").lower() not in ("0", "false", "off", "no")
+SQL_TEMPLATE_MIN_SCORE    = float(os.getenv("SQL_TEMPLATE_MIN_SCORE", "0.85"))
+SQL_TEMPLATE_MAX          = int(os.getenv("SQL_TEMPLATE_MAX", "5000"))
+SQL_TEMPLATE_HISTORY_ROWS = int(os.getenv("SQL_TEMPLATE_HISTORY_ROWS", "5000"))
+
+_SHORTLIST = 8
+
+_STRING  = re.compile(r"'((?:[^']|'')*)'")
+_NUMBER  = re.compile(r"(?<![\w.'\"])(\d+(?:\.\d+)?)(?![\w.'\"])")
+_Q_NUM   = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.]|\.\d)")
+_SLOT_Q  = re.compile(r"<([sn])(\d+)>")
+_SLOT_S  = re.compile(r"⟦(\d+)⟧")
+_COMPARE = re.compile(r'(?:("?\w+"?)\.)?"?(\w+)"?\s*(?:=|<>|!=|I?LIKE|>=|<=|>|<)\s*$', re.IGNORECASE)
+
+# uploaded-dataset questions, all answered on the system DB
+_HISTORY_SQL = """
+    SELECT question, sql FROM query_history
+    WHERE user_id::text = %(user)s AND row_count > 0
+      AND question IS NOT NULL AND sql IS NOT NULL
+    ORDER BY created_at DESC LIMIT %(limit)s
+"""
+# questions asked through a saved connection to this target
+_AUDIT_SQL = """
+    SELECT a.question, a.sql_generated AS sql
+    FROM query_audit_log a
+    JOIN user_connections c ON c.id = a.connection_id
+    WHERE a.user_id::text = %(user)s AND a.query_type = 'nl_query'
+      AND a.status = 'success' AND a.row_count > 0
+      AND a.question IS NOT NULL AND a.sql_generated IS NOT NULL
+      AND lower(c.host) = %(host)s AND c.port::text = %(port)s
+      AND c.dbname = %(dbname)s AND c.db_username = %(username)s
+    ORDER BY a.created_at DESC LIMIT %(limit)s
+"""
+
+
+@dataclass
+class Slot:
+    kind:   str                     # "s" (string) | "n" (number)
+    value:  str                     # value in the mined pair
+    column: Optional[Tuple[Optional[str], str]] = None
+    # (qualifier, column) a string slot is compared with, as written in the SQL
+
+
+@dataclass
+class Template:
+    id:       str
+    scope:    str                   # template_scope() it was learned in
+    skeleton: str                   # normalized question with <s0>/<n1> slots
+    sql:      str                   # SQL with ⟦i⟧ slots
+    slots:    List[Slot]
+    refs:     List[str]             # lower-case schema.table of each FROM/JOIN item, in order
+    terms:    Set[str] = field(default_factory=set)
+    hits:     int = 0
+
+
+@dataclass
+class TemplateMatch:
+    template: Template
+    sql:      str
+    score:    float
+    values:   List[str]
+
+
+def template_scope(pg_uri: str, user_id: Any = "") -> str:
+    """Partition templates are learned, mined and matched in."""
+    key = dsn_key(pg_uri)
+    return f"{key}:{user_id}" if user_id not in (None, "") else key
+
+
+def _resolve_refs(sql: str, tables_schema: Dict[str, List[Dict]]) -> Optional[List[str]]:
+    """
+    Lower-case schema.table for every FROM/JOIN item of sql, or None if one
+    is not in tables_schema. A bare name resolves only when exactly one
+    schema has that table.
+    """
+    by_lower = {fqn.lower() for fqn in tables_schema}
+    by_table: Dict[str, List[str]] = {}
+    for fqn in by_lower:
+        by_table.setdefault(fqn.rsplit(".", 1)[-1], []).append(fqn)
+    refs: List[str] = []
+    for ref, _ in from_refs(sql or ""):
+        ref = ref.lower()
+        if "." in ref:
+            if ref not in by_lower:
+                return None
+            refs.append(ref)
+            continue
+        owners = by_table.get(ref, [])
+        if len(owners) != 1:
+            return None
+        refs.append(owners[0])
+    return refs
+
+
+def _normalize(question: str) -> str:
+    return re.sub(r"\s+", " ", (question or "").strip()).rstrip("?.!").strip()
+
+
+def _escape_sql_string(value: str) -> str:
+    return value.replace("'", "''")
+
+
+def _outside_strings(sql: str) -> List[Tuple[int, int]]:
+    """Spans of sql that are not inside string literals."""
+    spans, pos = [], 0
+    for m in _STRING.finditer(sql):
+        spans.append((pos, m.start()))
+        pos = m.end()
+    spans.append((pos, len(sql)))
+    return spans
+
+
+def _compared_column(sql: str, before: int) -> Optional[Tuple[Optional[str], str]]:
+    m = _COMPARE.search(sql[:before].rstrip("(% "))
+    if not m:
+        return None
+    return ((m.group(1) or "").strip('"').lower() or None), m.group(2)
+
+
+def _column_key(column: Optional[Tuple[Optional[str], str]],
+                items: List[Tuple[str, str]]) -> Optional[str]:
+    # items: (fqn, qualifier) per FROM/JOIN item
+    """value_links key ("fqn.col") for a slot's column under the current schema."""
+    if column is None:
+        return None
+    qualifier, col = column
+    owners = {fqn for fqn, ref in items
+              if qualifier is None or qualifier in (ref.strip('"').lower(),
+                                                    fqn.rsplit(".", 1)[-1].lower())}
+    return f"{next(iter(owners))}.{col}" if len(owners) == 1 else None
+
+
+def templatize(question: str, sql: str, scope: str,
+               tables_schema: Dict[str, List[Dict]]) -> Optional[Template]:
+    """Template for a successful (question, sql) pair; None if it cannot be reused."""
+    q = _normalize(question)
+    refs = _resolve_refs(sql, tables_schema)
+    if not q or not refs:
+        return None
+    q_lower = q.lower()
+
+    # (start, end, slot) spans in the SQL and the question
+    sql_spans: List[Tuple[int, int, int]] = []
+    q_spans: List[Tuple[int, int, int]] = []
+    slots: List[Slot] = []
+    by_value: Dict[Tuple[str, str], int] = {}
+
+    def slot_for(kind: str, value: str, q_start: int, column=None) -> int:
+        key = (kind, value.lower())
+        if key not in by_value:
+            by_value[key] = len(slots)
+            slots.append(Slot(kind, value, column))
+            q_spans.append((q_start, q_start + len(value), by_value[key]))
+        return by_value[key]
+
+    for m in _STRING.finditer(sql):
+        raw = m.group(1).replace("''", "'")
+        core = raw.strip("%")
+        if not core:
+            continue
+        if ("s", core.lower()) not in by_value:
+            # A value the question mentions once becomes a slot; anything else is constant
+            hits = [h.start() for h in
+                    re.finditer(rf"(?<!\w){re.escape(core.lower())}(?!\w)", q_lower)]
+            if len(hits) != 1:
+                continue
+            slot_for("s", q[hits[0]:hits[0] + len(core)], hits[0], _compared_column(sql, m.start()))
+        idx = by_value[("s", core.lower())]
+        lead = len(raw) - len(raw.lstrip("%"))
+        start = m.start(1) + lead
+        sql_spans.append((start, start + len(_escape_sql_string(core)), idx))
+
+    q_numbers: Dict[str, List[int]] = {}
+    for m in _Q_NUM.finditer(q):
+        q_numbers.setdefault(m.group(0), []).append(m.start())
+    for a, b in _outside_strings(sql):
+        for m in _NUMBER.finditer(sql, a, b):
+            positions = q_numbers.get(m.group(1), [])
+            if len(positions) != 1:
+                continue
+            idx = slot_for("n", m.group(1), positions[0])
+            sql_spans.append((m.start(1), m.end(1), idx))
+
+    # Slots must not overlap in the question ("5" inside "2015")
+    ordered = sorted(q_spans)
+    if any(a[1] > b[0] for a, b in zip(ordered, ordered[1:])):
+        return None
+
+    sql_t = sql
+    for start, end, idx in sorted(sql_spans, reverse=True):
+        sql_t = sql_t[:start] + f"⟦{idx}⟧" + sql_t[end:]
+    skeleton = q
+    for start, end, idx in sorted(q_spans, reverse=True):
+        skeleton = skeleton[:start] + f"<{slots[idx].kind}{idx}>" + skeleton[end:]
+
+    tid = hashlib.sha256(f"{scope}\x00{skeleton.lower()}\x00{sql_t}".encode()).hexdigest()[:16]
+    return Template(tid, scope, skeleton, sql_t, slots, refs,
+                    set(tokenize(_SLOT_Q.sub(" ", skeleton))))
+
+
+def _skeleton_regex(skeleton: str) -> "re.Pattern[str]":
+    out, pos = [], 0
+    for m in _SLOT_Q.finditer(skeleton):
+        out.append(r"\s+".join(re.escape(w) for w in skeleton[pos:m.start()].split(" ")))
+        out.append(r"(\d+(?:\.\d+)?)" if m.group(1) == "n" else r"(.+?)")
+        pos = m.end()
+    out.append(r"\s+".join(re.escape(w) for w in skeleton[pos:].split(" ")))
+    return re.compile("^" + "".join(out) + "$", re.IGNORECASE)
+
+
+def _linked(value: str, column: Optional[str], value_links: Dict[str, List[str]]) -> bool:
+    """value is a stored value of the slot's column according to value linking."""
+    return any(v.lower() == value.lower() for v in value_links.get(column or "", []))
+
+
+def _canonical(value: str, column: Optional[str], value_links: Dict[str, List[str]]) -> str:
+    """Stored spelling of a string value when value linking knows the column."""
+    for v in value_links.get(column or "", []):
+        if v.lower() == value.lower():
+            return v
+    return value
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class TemplateCache:
+    """
+    In-process index of SQL templates (LRU, SQL_TEMPLATE_MAX entries in
+    all scopes together).
+
+    Each scope is mined lazily from query_history / query_audit_log on its
+    first use and extended with every question the LLM answers successfully
+    there (learn()). Lookups only ever see templates of their own scope.
+    """
+
+    def __init__(self, max_entries: int = SQL_TEMPLATE_MAX):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._templates: "OrderedDict[str, Template]" = OrderedDict()
+        self._index: Dict[Tuple[str, str], Set[str]] = {}   # (scope, term) -> template ids
+        self._loaded: Set[str] = set()                       # scopes already mined
+
+        self._lookups  = 0
+        self._hits     = 0
+        self._rejected = 0
+        self._mined    = 0
+        self._llm_ms_total = 0
+        self._llm_samples  = 0
+        self._saved_ms     = 0
+
+    # ── population ────────────────────────────────────────────────────────
+    def _add(self, t: Template) -> bool:
+        with self._lock:
+            if t.id in self._templates:
+                self._templates.move_to_end(t.id)
+                return False
+            self._templates[t.id] = t
+            for term in t.terms:
+                self._index.setdefault((t.scope, term), set()).add(t.id)
+            while len(self._templates) > self.max_entries:
+                _, old = self._templates.popitem(last=False)
+                self._unindex_locked(old)
+            return True
+
+    def _unindex_locked(self, t: Template) -> None:
+        for term in t.terms:
+            ids = self._index.get((t.scope, term))
+            if ids is not None:
+                ids.discard(t.id)
+                if not ids:
+                    del self._index[(t.scope, term)]
+
+    def learn(self, question: str, sql: str, scope: str, tables_schema: Dict[str, List[Dict]],
+              llm_ms: Optional[int] = None) -> Optional[Template]:
+        """Add a successful LLM answer to scope; llm_ms feeds the saved-latency estimate."""
+        if llm_ms:
+            with self._lock:
+                self._llm_ms_total += llm_ms
+                self._llm_samples += 1
+        t = templatize(question, sql, scope, tables_schema)
+        if t is not None and self._add(t):
+            return t
+        return None
+
+    def load_history(self, conn, pg_uri: str, user_id: Any, tables_schema: Dict[str, List[Dict]],
+                     system: bool = False, limit: int = SQL_TEMPLATE_HISTORY_ROWS) -> int:
+        """
+        Mine user_id's successful questions against pg_uri from the system DB's
+        query logs (psycopg2 connection); returns templates added. system:
+        pg_uri is the system DB itself, where query_history questions ran.
+        """
+        scope = template_scope(pg_uri, user_id)
+        target = normalize_dsn(pg_uri)
+        params = {
+            "user":     str(user_id),
+            "host":     (target.get("host") or "").lower(),
+            "port":     target.get("port", "5432"),
+            "dbname":   target.get("dbname", ""),
+            "username": target.get("user", ""),
+            "limit":    limit,
+        }
+        added = 0
+        for query in ([_HISTORY_SQL] if system else []) + [_AUDIT_SQL]:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    rows = cur.fetchall()
+            except Exception as exc:
+                conn.rollback()
+                logger.info("TemplateCache: history source skipped (%s)", exc)
+                continue
+            for r in reversed(rows):   # oldest first, so recent templates stay in the LRU
+                question, sql = (r["question"], r["sql"]) if isinstance(r, dict) else (r[0], r[1])
+                t = templatize(question, sql, scope, tables_schema)
+                if t is not None and self._add(t):
+                    added += 1
+        with self._lock:
+            self._mined += added
+        logger.info("TemplateCache: %d templates mined from query history", added)
+        return added
+
+    def ensure_loaded(self, connect, pg_uri: str, user_id: Any,
+                      tables_schema: Dict[str, List[Dict]], system: bool = False) -> None:
+        """
+        Mine a scope's history once per process; connect() returns a system
+        DB connection. Without a user there is no history to attribute, so
+        such scopes only learn from their own answers.
+        """
+        scope = template_scope(pg_uri, user_id)
+        if scope in self._loaded:
+            return
+        with self._lock:
+            if scope in self._loaded:
+                return
+            self._loaded.add(scope)
+        if user_id in (None, ""):
+            return
+        try:
+            conn = connect()
+        except Exception as exc:
+            logger.info("TemplateCache: query history unavailable (%s)", exc)
+            return
+        try:
+            self.load_history(conn, pg_uri, user_id, tables_schema, system=system)
+        finally:
+            conn.close()
+
+    # ── lookup ────────────────────────────────────────────────────────────
+    def _fill(self, t: Template, question: str, columns: List[Optional[str]],
+              value_links: Dict[str, List[str]]) -> Optional[Tuple[List[str], float]]:
+        m = _skeleton_regex(t.skeleton).match(question)
+        if m:
+            values = [""] * len(t.slots)
+            for g, sm in zip(m.groups(), _SLOT_Q.finditer(t.skeleton)):
+                values[int(sm.group(2))] = g
+            # A string slot matches anything, so extra words of a longer question
+            # land in it; trust it only as one token or a value linking confirms
+            if all(s.kind == "n" or len(values[i].split()) == 1
+                   or _linked(values[i], columns[i], value_links)
+                   for i, s in enumerate(t.slots)):
+                return values, 1.0
+
+        # Near shape: numbers in order, strings from value linking
+        numbers = [x.group(0) for x in _Q_NUM.finditer(question)]
+        order = [int(sm.group(2)) for sm in _SLOT_Q.finditer(t.skeleton)]
+        if sum(1 for s in t.slots if s.kind == "n") != len(numbers):
+            return None
+        values = [""] * len(t.slots)
+        rest = question
+        for i in order:
+            s = t.slots[i]
+            if s.kind == "n":
+                values[i] = numbers.pop(0)
+            else:
+                linked = [v for v in value_links.get(columns[i] or "", [])
+                          if v.lower() in question.lower()]
+                if len(linked) != 1:
+                    return None
+                values[i] = linked[0]
+            rest = re.sub(rf"(?<!\w){re.escape(values[i])}(?!\w)", " ", rest, count=1,
+                          flags=re.IGNORECASE)
+        return values, _jaccard(t.terms, set(tokenize(_Q_NUM.sub(" ", rest))))
+
+    def match(self, question: str, scope: str, tables_schema: Dict[str, List[Dict]],
+              value_links: Optional[Dict[str, List[str]]] = None,
+              min_score: float = SQL_TEMPLATE_MIN_SCORE) -> Optional[TemplateMatch]:
+        """Best template of scope for the question whose tables all exist, with slots filled."""
+        q = _normalize(question)
+        value_links = value_links or {}
+        terms = set(tokenize(_Q_NUM.sub(" ", q)))
+        with self._lock:
+            self._lookups += 1
+            counts: Dict[str, int] = {}
+            for term in terms:
+                for tid in self._index.get((scope, term), ()):
+                    counts[tid] = counts.get(tid, 0) + 1
+            shortlist = [self._templates[tid] for tid in
+                         sorted(counts, key=counts.get, reverse=True)[:_SHORTLIST]]
+
+        by_lower = {fqn.lower(): fqn for fqn in tables_schema}
+        best: Optional[TemplateMatch] = None
+        for t in shortlist:
+            # Every table the template reads must exist in this database, same schema
+            if t.scope != scope or any(ref not in by_lower for ref in t.refs):
+                continue
+            written = from_refs(t.sql)
+            if len(written) != len(t.refs):
+                continue
+            items = [(by_lower[ref], qualifier) for ref, (_, qualifier) in zip(t.refs, written)]
+            columns = [_column_key(s.column, items) for s in t.slots]
+            filled = self._fill(t, q, columns, value_links)
+            if filled is None or filled[1] < min_score:
+                continue
+            values, score = filled
+            if best is None or score > best.score:
+                best = TemplateMatch(t, self.render(t, values, columns, value_links), score, values)
+            if score == 1.0:
+                break
+        return best
+
+    @staticmethod
+    def render(t: Template, values: List[str], columns: List[Optional[str]],
+               value_links: Dict[str, List[str]]) -> str:
+        def fill(m: "re.Match[str]") -> str:
+            i = int(m.group(1))
+            if t.slots[i].kind == "n":
+                return values[i]
+            return _escape_sql_string(_canonical(values[i], columns[i], value_links))
+        return _SLOT_S.sub(fill, t.sql)
+
+    # ── outcome accounting ────────────────────────────────────────────────
+    def loaded(self, scope: str) -> bool:
+        return scope in self._loaded
+
+    def hit(self, template_id: str) -> int:
+        """Record a served hit; returns the estimated LLM latency it saved (ms)."""
+        with self._lock:
+            t = self._templates.get(template_id)
+            if t is not None:
+                t.hits += 1
+                self._templates.move_to_end(template_id)
+            self._hits += 1
+            saved = self._llm_ms_total // self._llm_samples if self._llm_samples else 0
+            self._saved_ms += saved
+            return saved
+
+    def reject(self, template_id: str, scope: str) -> None:
+        """The filled SQL failed validation or execution — drop the template from scope."""
+        with self._lock:
+            self._rejected += 1
+            t = self._templates.get(template_id)
+            if t is not None and t.scope == scope:
+                del self._templates[template_id]
+                self._unindex_locked(t)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "templates":      len(self._templates),
+                "scopes":         len({t.scope for t in self._templates.values()}),
+                "mined":          self._mined,
+                "lookups":        self._lookups,
+                "hits":           self._hits,
+                "rejected":       self._rejected,
+                "hit_rate":       round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+                "avg_llm_ms":     self._llm_ms_total // self._llm_samples if self._llm_samples else None,
+                "saved_ms":       self._saved_ms,
+            }
+
+
+template_cache = TemplateCache()
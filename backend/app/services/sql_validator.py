@@ -0,0 +1,192 @@
+# backend/app/services/sql_validator.py
+"""
+EXPLAIN-based pre-validation of generated SQL.
+
+`EXPLAIN (FORMAT JSON)` (no ANALYZE) parses, binds and plans the statement
+without reading any data, so a wrong column or table is caught in
+milliseconds instead of after a long scan, and the planner's estimates come
+for free:
+
+  ok        — plan is within SQL_EXPLAIN_MAX_COST
+  limited   — over budget without a top-level LIMIT; re-planned as
+              SELECT * FROM (<sql>) LIMIT n, which fits the budget
+  rejected  — over budget even with a LIMIT (ask for a cheaper query)
+  error     — the statement does not bind; sql_error() describes why
+
+sql_error() turns psycopg2 / asyncpg errors into a structured dict
+{code, kind, message, hint, identifier, position} that the ReAct loop feeds
+back to the model instead of a raw traceback string.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+SQL_EXPLAIN          = os.getenv("SQL_EXPLAIN", "1").lower() not in ("0", "false", "off", "no")
+SQL_EXPLAIN_MAX_COST = float(os.getenv("SQL_EXPLAIN_MAX_COST", "5000000"))   # 0 = no cost cap
+
+_EXPLAIN = "EXPLAIN (FORMAT JSON) "
+
+# SQLSTATE → short kind used in retry hints and repair rules
+_KINDS = {
+    "42703": "undefined_column",
+    "42P01": "undefined_table",
+    "42702": "ambiguous_column",
+    "42P09": "ambiguous_alias",
+    "42883": "undefined_function",
+    "42804": "datatype_mismatch",
+    "42601": "syntax_error",
+    "42803": "grouping_error",
+    "42P10": "invalid_column_reference",
+    "22P02": "invalid_text_representation",
+    "22007": "invalid_datetime_format",
+    "22012": "division_by_zero",
+    "21000": "cardinality_violation",
+    "57014": "query_canceled",
+}
+
+_QUOTED = re.compile(r'"([^"]+)"')
+
+
+@dataclass
+class Validation:
+    status:   str                        # ok | limited | rejected | error
+    sql:      str                        # possibly rewritten (limited)
+    cost:     Optional[float] = None
+    rows:     Optional[float] = None
+    node:     Optional[str]   = None     # top plan node
+    ms:       int             = 0
+    error:    Optional[Dict[str, Any]] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status in ("ok", "limited")
+
+    def as_metrics(self) -> Dict[str, Any]:
+        out = {"status": self.status, "cost": self.cost, "rows": self.rows,
+               "node": self.node, "ms": self.ms}
+        if self.error:
+            out["error"] = self.error.get("kind")
+        return out
+
+
+def sql_error(exc: BaseException) -> Dict[str, Any]:
+    """Structured description of a psycopg2 / asyncpg error (or any exception)."""
+    diag = getattr(exc, "diag", None)
+    code = getattr(exc, "pgcode", None) or getattr(exc, "sqlstate", None)
+    if diag is not None:
+        message  = diag.message_primary or str(exc)
+        hint     = diag.message_hint
+        position = diag.statement_position
+    else:
+        message  = getattr(exc, "message", None) or str(exc)
+        hint     = getattr(exc, "hint", None)
+        position = getattr(exc, "position", None)
+    message = str(message).strip().splitlines()[0] if message else ""
+    m = _QUOTED.search(message)
+    return {
+        "code":       code,
+        "kind":       _KINDS.get(code or "", "error" if code else "unknown"),
+        "message":    message,
+        "hint":       hint,
+        "identifier": m.group(1) if m else None,
+        "position":   int(position) if position else None,
+    }
+
+
+def _explain_error(exc: BaseException) -> Dict[str, Any]:
+    """sql_error() for a failed EXPLAIN, with position relative to the SQL itself."""
+    err = sql_error(exc)
+    if err["position"]:
+        err["position"] = max(1, err["position"] - len(_EXPLAIN))
+    return err
+
+
+def format_sql_error(err: Dict[str, Any]) -> str:
+    text = err.get("message") or "unknown error"
+    if err.get("hint"):
+        text += f" (hint: {err['hint']})"
+    return text
+
+
+def _has_top_limit(plan: Dict[str, Any]) -> bool:
+    return plan.get("Node Type") == "Limit"
+
+
+def _wrap_limit(sql: str, limit: int) -> str:
+    return f"SELECT * FROM ({sql.strip().rstrip(';')}) AS _q LIMIT {int(limit)}"
+
+
+def _plan_of(raw: Any) -> Dict[str, Any]:
+    doc = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+    return doc[0]["Plan"]
+
+
+def _first(row: Any) -> Any:
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def _is_db_error(exc: BaseException) -> bool:
+    """Server-side SQL error (has a SQLSTATE) — not a lost connection."""
+    return bool(getattr(exc, "pgcode", None) or getattr(exc, "sqlstate", None))
+
+
+def _judge(sql: str, plan: Dict[str, Any], t0: float, max_cost: float) -> Validation:
+    v = Validation("ok", sql, cost=plan.get("Total Cost"), rows=plan.get("Plan Rows"),
+                   node=plan.get("Node Type"), ms=int((time.perf_counter() - t0) * 1000))
+    if max_cost and v.cost is not None and v.cost > max_cost:
+        v.status = "rejected"
+        v.error = {
+            "code": None, "kind": "cost_limit", "identifier": None, "position": None,
+            "message": (f"estimated cost {v.cost:,.0f} exceeds the limit of {max_cost:,.0f} "
+                        f"(~{v.rows or 0:,.0f} rows)"),
+            "hint": "filter earlier, aggregate fewer rows or avoid cross joins",
+        }
+    return v
+
+
+def explain(conn, sql: str, limit: int, max_cost: float = SQL_EXPLAIN_MAX_COST) -> Validation:
+    """Validate on a psycopg2 connection (rolled back on error)."""
+    t0 = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(_EXPLAIN + sql)
+            plan = _plan_of(_first(cur.fetchone()))
+            v = _judge(sql, plan, t0, max_cost)
+            if v.status == "rejected" and not _has_top_limit(plan):
+                wrapped = _wrap_limit(sql, limit)
+                cur.execute(_EXPLAIN + wrapped)
+                lv = _judge(wrapped, _plan_of(_first(cur.fetchone())), t0, max_cost)
+                if lv.ok:
+                    lv.status = "limited"
+                    return lv
+            return v
+    except Exception as e:
+        if not _is_db_error(e):
+            raise
+        conn.rollback()
+        return Validation("error", sql, ms=int((time.perf_counter() - t0) * 1000), error=_explain_error(e))
+
+
+async def aexplain(conn, sql: str, limit: int, max_cost: float = SQL_EXPLAIN_MAX_COST) -> Validation:
+    """explain() on an asyncpg connection."""
+    t0 = time.perf_counter()
+    try:
+        plan = _plan_of(await conn.fetchval(_EXPLAIN + sql))
+        v = _judge(sql, plan, t0, max_cost)
+        if v.status == "rejected" and not _has_top_limit(plan):
+            wrapped = _wrap_limit(sql, limit)
+            lv = _judge(wrapped, _plan_of(await conn.fetchval(_EXPLAIN + wrapped)),
+                        t0, max_cost)
+            if lv.ok:
+                lv.status = "limited"
+                return lv
+        return v
+    except Exception as e:
+        if not _is_db_error(e):
+            raise
+        return Validation("error", sql, ms=int((time.perf_counter() - t0) * 1000), error=_explain_error(e))
@@ -0,0 +1,181 @@
+# backend/app/services/value_index.py
+"""
+Value linking: map literals in a question to the columns that hold them.
+
+Instead of pasting every enum list and sample row into the prompt, the
+categorical values discovered for a database (pg_stats MCVs, probes,
+column sample_values) go into an inverted index:
+
+  exact    normalized value  → [(fqn.col, original value)]
+  trigram  3-char gram       → value ids   (typos, plurals, partial words)
+  prefix   sorted normalized values        ("calif" → "California")
+
+Normalization folds case and accents and collapses punctuation, so the
+prompt can carry the column's EXACT stored spelling for whatever the user
+typed. Built once per schema snapshot (PgSchemaAgent), linked per question
+(PgSchemaRetrievalAgent).
+
+VALUE_LINKING=off restores the full enum / sample-value lists in prompts.
+"""
+from __future__ import annotations
+
+import bisect
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+VALUE_LINKING = os.getenv("VALUE_LINKING", "on").lower() not in ("0", "off", "false", "no")
+
+MAX_SPAN_WORDS     = 4
+MAX_LINKS_PER_COL  = 5
+MAX_LINKS_TOTAL    = 20
+_MIN_FUZZY_CHARS   = 4
+_FUZZY_THRESHOLD   = 0.55
+_PREFIX_SCORE      = 0.6
+_MAX_VALUE_CHARS   = 80
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "with", "and", "or",
+    "is", "are", "was", "were", "be", "do", "does", "did", "has", "have", "not",
+    "what", "which", "who", "how", "many", "much", "when", "where", "show",
+    "list", "give", "me", "find", "all", "each", "per", "from", "that", "this",
+    "it", "its", "their", "than", "as", "at", "top", "most", "least", "total",
+    "number", "count", "average", "sum", "yes", "no", "true", "false",
+}
+
+
+def normalize(value) -> str:
+    """Case- and accent-insensitive form used for matching."""
+    s = unicodedata.normalize("NFKD", str(value))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", s.casefold()).strip()
+
+
+def _trigrams(s: str) -> Set[str]:
+    padded = f"  {s} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ValueIndex:
+    def __init__(self):
+        self.values: List[Tuple[str, str, str]]    = []   # (normalized, fqn.col, original)
+        self.exact:  Dict[str, List[int]]          = {}
+        self.grams:  Dict[str, List[int]]          = {}
+        self._gram_sets: List[Set[str]]            = []
+        self._sorted: List[Tuple[str, int]]        = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def build(
+        cls,
+        enum_values: Optional[Dict[str, List[str]]] = None,
+        tables_schema: Optional[Dict[str, List[Dict]]] = None,
+    ) -> "ValueIndex":
+        """enum_values {"fqn.col": [...]}, plus column sample_values from tables_schema."""
+        idx = cls()
+        seen: Set[Tuple[str, str]] = set()
+
+        def add(key: str, vals: Iterable) -> None:
+            for v in vals:
+                if v is None:
+                    continue
+                orig = str(v)
+                norm = normalize(orig)
+                if not norm or len(orig) > _MAX_VALUE_CHARS or (key, orig) in seen:
+                    continue
+                # bare numbers link to nearly everything; keep codes/years only
+                if norm.isdigit() and len(norm) < 4:
+                    continue
+                seen.add((key, orig))
+                vid = len(idx.values)
+                idx.values.append((norm, key, orig))
+                idx.exact.setdefault(norm, []).append(vid)
+                grams = _trigrams(norm)
+                idx._gram_sets.append(grams)
+                for g in grams:
+                    idx.grams.setdefault(g, []).append(vid)
+
+        for key, vals in (enum_values or {}).items():
+            add(key, vals)
+        for fqn, cols in (tables_schema or {}).items():
+            for c in cols:
+                if c.get("sample_values"):
+                    add(f"{fqn}.{c['name']}", c["sample_values"])
+
+        idx._sorted = sorted((norm, vid) for vid, (norm, _, _) in enumerate(idx.values))
+        return idx
+
+    # ── lookup ────────────────────────────────────────────────────────────
+    def _fuzzy(self, span: str) -> List[Tuple[int, float]]:
+        grams = _trigrams(span)
+        overlap: Dict[int, int] = {}
+        for g in grams:
+            for vid in self.grams.get(g, ()):
+                overlap[vid] = overlap.get(vid, 0) + 1
+        out = []
+        for vid, n in overlap.items():
+            jaccard = n / (len(grams) + len(self._gram_sets[vid]) - n)
+            if jaccard >= _FUZZY_THRESHOLD:
+                out.append((vid, jaccard))
+        return out
+
+    def _prefix(self, span: str) -> List[int]:
+        i = bisect.bisect_left(self._sorted, (span, -1))
+        out = []
+        while i < len(self._sorted) and len(out) < MAX_LINKS_PER_COL:
+            norm, vid = self._sorted[i]
+            if not norm.startswith(span):
+                break
+            out.append(vid)
+            i += 1
+        return out
+
+    def link(
+        self,
+        question: str,
+        tables: Optional[Iterable[str]] = None,
+        max_per_column: int = MAX_LINKS_PER_COL,
+        max_total: int = MAX_LINKS_TOTAL,
+    ) -> Dict[str, List[str]]:
+        """{"fqn.col": [stored values the question refers to]}, best matches first."""
+        if not self.values:
+            return {}
+        allowed = set(tables) if tables is not None else None
+        words = normalize(question).split()
+        best: Dict[int, float] = {}
+
+        for n in range(min(MAX_SPAN_WORDS, len(words)), 0, -1):
+            for i in range(len(words) - n + 1):
+                parts = words[i:i + n]
+                if all(w in _STOPWORDS for w in parts):
+                    continue
+                span = " ".join(parts)
+                hits = [(vid, 1.0) for vid in self.exact.get(span, ())]
+                if not hits and len(span) >= _MIN_FUZZY_CHARS and not span.isdigit():
+                    hits = self._fuzzy(span)
+                    hits += [(vid, _PREFIX_SCORE) for vid in self._prefix(span)]
+                for vid, score in hits:
+                    # longer spans are more specific
+                    score += 0.01 * n
+                    if score > best.get(vid, 0.0):
+                        best[vid] = score
+
+        links: Dict[str, List[str]] = {}
+        total = 0
+        for vid, _ in sorted(best.items(), key=lambda kv: -kv[1]):
+            _, key, orig = self.values[vid]
+            if allowed is not None and key.rsplit(".", 1)[0] not in allowed:
+                continue
+            col = links.setdefault(key, [])
+            if len(col) >= max_per_column:
+                continue
+            col.append(orig)
+            total += 1
+            if total >= max_total:
+                break
+        return links
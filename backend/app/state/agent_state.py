@@ -1,6 +1,6 @@
 # backend/app/state/agent_state.py
 from __future__ import annotations
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence
 from dataclasses import dataclass, field
 
 
@@ -38,13 +38,29 @@ class AgentState:
     # ── User question & config ───────────────────────────────
     user_question: Optional[str] = None
     limit:         int            = 50
+    use_sql_cache: bool           = True   # False = always ask Gemini (refreshes cache)
 
     # ── Enum / categorical values fetched from DB ────────────
     enum_values: Dict[str, List[str]] = field(default_factory=dict)
     # "fqn.colname" -> ["val1","val2",...]
+    value_index: Optional[Any]        = None   # services.value_index.ValueIndex
+    value_links: Dict[str, List[str]] = field(default_factory=dict)
+    # "fqn.colname" -> stored values the question refers to
 
     # ── JOIN hints ────────────────────────────────────────────
     join_hints: List[str] = field(default_factory=list)
+    join_graph: Optional[Any] = None   # services.join_graph.JoinGraph
+
+    # ── Catalog metadata (PgSchemaAgent) ─────────────────────
+    foreign_keys: List[Dict[str, Any]]      = field(default_factory=list)
+    # [{table, columns, ref_table, ref_columns}]
+    table_stats:  Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # fqn -> {approx_rows, primary_key, comment}
+
+    # ── Schema retrieval (PgSchemaRetrievalAgent) ────────────
+    schema_index:    Optional[Any] = None   # services.schema_retrieval.SchemaIndex
+    relevant_tables: List[str]     = field(default_factory=list)
+    # tables the SQL prompt is limited to, most relevant first (empty = all)
 
     # ── Planning ──────────────────────────────────────────────
     intent:    Optional[str]       = None
@@ -59,11 +75,12 @@ class AgentState:
     warnings:      List[str] = field(default_factory=list)
 
     # ── Execution results ─────────────────────────────────────
-    results:            List[Dict[str, Any]] = field(default_factory=list)
-    columns:            List[str]            = field(default_factory=list)
-    execution_error:    Optional[str]        = None
-    execution_time_ms:  Optional[int]        = None
-    tables_used:        List[str]            = field(default_factory=list)
+    # dict rows — a ColumnarResult (services/columnar) from the SQL agents
+    results:            Sequence[Dict[str, Any]] = field(default_factory=list)
+    columns:            List[str]                = field(default_factory=list)
+    execution_error:    Optional[str]            = None
+    execution_time_ms:  Optional[int]            = None
+    tables_used:        List[str]                = field(default_factory=list)
 
     # ── Post-processing ───────────────────────────────────────
     profile:      Optional[Dict] = None   # ProfilingAgent
@@ -78,4 +95,11 @@ class AgentState:
     react_actions:     List[str]      = field(default_factory=list)  # actions taken
     react_observations: List[str]     = field(default_factory=list)  # what happened
     react_enabled:     bool           = True      # can be disabled per request
-    previous_sql_errors: List[str]    = field(default_factory=list)  # error history
\ No newline at end of file
+    react_speculative: int            = 0         # >1: race N SQL candidates on attempt 1 (async only)
+    previous_sql_errors: List[str]    = field(default_factory=list)  # error history
+    sql_error: Optional[Dict[str, Any]] = None    # last structured SQL error (services/sql_validator)
+    retry_feedback: Optional[Dict[str, Any]] = None
+    # {sql, error, sql_error, hint} — the failed attempt the next SQL prompt corrects
+
+    # ── Pipeline metrics (caches, timings) ────────────────────────────────
+    metrics: Dict[str, Any] = field(default_factory=dict)
\ No newline at end of file